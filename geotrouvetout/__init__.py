@@ -3,8 +3,18 @@
 from geotrouvetout.__main__ import main
 from geotrouvetout.area import *
 from geotrouvetout.color_analysis import *
+from geotrouvetout.color_cells import *
+from geotrouvetout.color_histograms import *
+from geotrouvetout.color_index import *
+from geotrouvetout.debug import *
 from geotrouvetout.language_detection import *
+from geotrouvetout.models import *
 from geotrouvetout.object_detection import *
+from geotrouvetout.object_stage import *
+from geotrouvetout.ocr import *
+from geotrouvetout.ocr_languages import *
 from geotrouvetout.overpass import *
+from geotrouvetout.resources import *
+from geotrouvetout.sign_quality import *
 from geotrouvetout.util import *
 from geotrouvetout.combination import *
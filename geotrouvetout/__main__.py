@@ -6,6 +6,7 @@ import pathlib
 import uvicorn
 import coloredlogs
 import geotrouvetout
+from geotrouvetout import config
 import pycountry
 from PIL import Image
 from rich_argparse import RichHelpFormatter
@@ -68,6 +69,8 @@ def main():
 
     # start cli image analysis
     if args.image:
+        geotrouvetout.apply_thread_layout()
+
         image_file = pathlib.Path(args.image)
         if not image_file.is_file():
             parser.print_usage()
@@ -97,4 +100,10 @@ def main():
 
     # start daemon
     elif args.daemon:
-        uvicorn.run("rest_api.__main__:app", host="0.0.0.0", port=8000)
+        # every worker applies its thread layout on startup
+        uvicorn.run(
+            "rest_api.__main__:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=config.WORKERS,
+        )
@@ -1,92 +1,257 @@
+import json
 import logging
-from ultralytics import YOLO
+import pathlib
+import numpy as np
+import numpy.typing as npt
+import pycountry
 from PIL import Image
+from geotrouvetout.object_detection import (
+    DETECTOR_WEIGHTS,
+    detect_crops,
+    has_combined_model,
+)
+from geotrouvetout.object_stage import (
+    Likelihood,
+    ObjectStage,
+    classify_crops_cached,
+    get_countries_likelihood,
+    get_stage_likelihood,
+    run_stage,
+)
 
-def car_detection(image: Image.Image) -> dict[str, float]:
+# Weights of the car brand classifier.
+CAR_BRAND_WEIGHTS = "weights/car_brand.pt"
+
+# Sales of the best selling brands of each country.
+CAR_SALES_FILE = "stats/car_sales_stats.json"
+
+# Best selling car model of each country.
+CAR_MODELS_FILE = "stats/carstats.json"
+
+# Spellings of the brands in the statistics that differ from the brand name.
+BRAND_ALIASES = {
+    "vw": "volkswagen",
+    "mercedes-benz": "mercedes",
+    "renault/dacia": "renault",
+}
+
+# Country names of the statistics that pycountry does not know.
+COUNTRY_ALIASES = {
+    "Cote d’Ivoire (Ivory Coast)": "CIV",
+    "Macedonia": "MKD",
+    "Russia": "RUS",
+    "Swaziland (Eswatini)": "SWZ",
+    "Turkey": "TUR",
+}
+
+
+def load_car_likelihood(
+    sales_file: str = CAR_SALES_FILE, models_file: str = CAR_MODELS_FILE
+) -> Likelihood:
+    """
+    Compile the car statistics into a brands x countries likelihood matrix.
+
+    Each column holds the probability of seeing each brand in a country. For
+    the countries with sales figures, the best selling brands get their share
+    of the sales. For the countries where only the best selling model is
+    known, its brand gets the typical share of a best selling brand. The rest
+    of the sales is spread evenly over the other brands, and the countries
+    without statistics give the same probability to every brand.
+
+    @param sales_file The path to the JSON file with the sales of the best
+    selling brands of each country, by ISO alpha-3 code.
+    @param models_file The path to the JSON file with the best selling car
+    model of each country, by country name.
+    @return The likelihood of the car stage.
+    """
+    logging.info("load_car_likelihood")
+
+    with open(sales_file, "r", encoding="utf-8") as file:
+        car_sales = json.load(file)
+    with open(models_file, "r", encoding="utf-8") as file:
+        car_models = json.load(file)
+
+    shares: dict[str, dict[str, float]] = {}
+    best_shares = []
+    for country, sales in car_sales.items():
+        country_shares: dict[str, float] = {}
+        for brands in sales["car"]:
+            for brand, count in brands.items():
+                brand = get_brand_name(brand)
+                country_shares[brand] = (
+                    country_shares.get(brand, 0.0) + count / sales["total"]
+                )
+        if country_shares:
+            shares[country] = country_shares
+            best_shares.append(max(country_shares.values()))
+
+    best_share = float(np.median(best_shares))
+    for car_model in car_models:
+        country = get_country_code(car_model["country"])
+        if country is None or country in shares:
+            continue
+        brand = get_brand_name(car_model["car"].split()[0])
+        shares[country] = {brand: best_share}
+
+    brands = sorted(
+        {brand for country in shares.values() for brand in country}
+    )
+    countries = [country.alpha_3 for country in pycountry.countries]
+    brand_indices = {brand: index for index, brand in enumerate(brands)}
+    country_indices = {
+        country: index for index, country in enumerate(countries)
+    }
+
+    matrix = np.full((len(brands), len(countries)), 1 / len(brands))
+    for country, country_shares in shares.items():
+        if country not in country_indices:
+            continue
+        column = np.zeros(len(brands))
+        for brand, share in country_shares.items():
+            column[brand_indices[brand]] = share
+        unknown = column == 0
+        column[unknown] = max(1 - column.sum(), 0) / max(unknown.sum(), 1)
+        matrix[:, country_indices[country]] = column
+
+    return Likelihood(brands, countries, matrix)
+
+
+def get_brand_name(brand: str) -> str:
+    """
+    Normalize the name of a car brand.
+
+    @param brand The name of the brand as written in the statistics.
+    @return The name of the brand in lower case.
+    """
+    brand = brand.strip().lower()
+    return BRAND_ALIASES.get(brand, brand)
+
+
+def get_country_code(name: str) -> str | None:
+    """
+    Get the ISO alpha-3 code of a country from its name.
+
+    @param name The name of the country.
+    @return The code of the country, None if the country is unknown.
+    """
+    if name in COUNTRY_ALIASES:
+        return COUNTRY_ALIASES[name]
+    try:
+        return pycountry.countries.lookup(name).alpha_3
+    except LookupError:
+        return None
+
+
+# Stage detecting the cars, classifying their brand and mapping the brands to
+# the countries where they are sold.
+CAR_STAGE = ObjectStage(
+    name="car",
+    object_class="car",
+    classifier_weights=CAR_BRAND_WEIGHTS,
+    load_likelihood=load_car_likelihood,
+)
+
+
+def has_car_models() -> bool:
+    """! Check whether the weights needed to analyze the cars are available.
+
+    @return True if the cars can be detected, by the combined model or their
+    own detector, and their brand classifier weights exist.
+    """
+    has_detector = (
+        has_combined_model() or pathlib.Path(DETECTOR_WEIGHTS["car"]).is_file()
+    )
+    return has_detector and pathlib.Path(CAR_BRAND_WEIGHTS).is_file()
+
+
+def car_detection(
+    image: Image.Image,
+    car_images: list[npt.NDArray[np.uint8]] | None = None,
+) -> dict[str, float]:
     """
     Get country from car present on image.
 
     @param image PIL image object.
+    @param car_images Cropped images of the cars already detected in the
+    image, None to detect them here.
     @return A dictionary with the country and a probability associated from the
     cars detected on the image.
     """
     logging.info("car_detection")
 
-    car_images = detect_cars(image)
+    car_images_list = None if car_images is None else [car_images]
 
-    car_brand_total: dict[str, float] = {}
-    car_brand_count: dict[str, int] = {}
+    return car_detection_batch([image], car_images_list)[0]
 
-    for car_image in car_images:
-        car_brand = detect_car_brand(car_image)
 
-        if car_brand:
-            proba = get_proba_car_country(car_brand)
+def car_detection_batch(
+    images: list[Image.Image],
+    car_images_list: list[list[npt.NDArray[np.uint8]]] | None = None,
+) -> list[dict[str, float]]:
+    """
+    Get country from cars present on several images.
 
-            for brand, conf in proba.items():
-                if brand in car_brand_total:
-                    car_brand_total[brand] += conf
-                    car_brand_count[brand] += 1
-                else:
-                    car_brand_total[brand] = conf
-                    car_brand_count[brand] = 1
+    The brands of all the cars of all the images are classified together, in
+    batches, and are then sent back to their source image.
 
-    car_brand_proba = {}
-    for brand, total_conf in car_brand_total.items():
-        car_brand_proba[brand] = (
-            total_conf / car_brand_count[brand]
-        )
+    @param images PIL image objects.
+    @param car_images_list For each image, the cropped images of the cars
+    already detected in it, None to detect them here.
+    @return A list with, for each image, a dictionary with the country and a
+    probability associated from the cars detected on the image.
+    """
+    logging.info("car_detection_batch")
 
-    return car_brand_proba
+    return run_stage(CAR_STAGE, images, car_images_list)
 
 
-def detect_cars(image: Image.Image) -> list[Image.Image]:
+def detect_cars(image: Image.Image) -> list[npt.NDArray[np.uint8]]:
     """
     Uses YOLO to detect cars then return cropped images of the cars.
 
     @param image PIL image to be analyzed.
-    @return A list of PIL image representing cars from the image.
+    @return A list of RGB crops representing cars from the image.
     """
     logging.info("detect_cars")
 
-    model = YOLO("weights/car.pt")
-    model.conf = 0.25
-
-    results = model(image)
-
-    cropped_images = []
-    for result in results:
-        for box in result.boxes:
-            for xyxy in box.xyxy:
-                x1, y1, x2, y2 = xyxy
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                cropped_image = image.crop((x1, y1, x2, y2))
-                cropped_images.append(cropped_image)
+    cropped_images = detect_crops(DETECTOR_WEIGHTS["car"], image)
 
     return cropped_images
 
-def detect_car_brand(image: Image.Image) -> dict[str, float]:
+
+def detect_car_brand(image: npt.NDArray[np.uint8]) -> dict[str, float]:
     """
     Uses computer vision to classify the brand of the car from an image.
 
-    @param image PIL image of a car.
+    @param image RGB crop of a car.
     @return A dict containing brands of cars and the confidence of the guess.
     """
     logging.info("detect_car_brand")
 
-    model = YOLO("weights/car_brand.pt") 
+    return detect_car_brands([image])[0]
 
-    results = model(image)
 
+def detect_car_brands(
+    images: list[npt.NDArray[np.uint8]],
+) -> list[dict[str, float]]:
+    """
+    Classify the brand of several cars at once.
+
+    @param images RGB crops of cars.
+    @return A list with, for each image, a dict containing brands of cars and
+    the confidence of the guess.
+    """
+    logging.info("detect_car_brands")
+
+    return classify_crops_cached(CAR_STAGE, images)
 
-    return results
 
 def get_proba_car_country(car_brand: dict[str, float]) -> dict[str, float]:
     """
     Uses a geodata to guess in which country we might be.
 
-    Uses a json containing frequency of each country of car brands to
-    estimate what country do we have the biggest chance of being in.
+    Uses the brand to country likelihood of the car stage to estimate what
+    country do we have the biggest chance of being in.
 
     @param car_brand Dictionary containing brands of cars and the
     confidence of the guess.
@@ -94,4 +259,11 @@ def get_proba_car_country(car_brand: dict[str, float]) -> dict[str, float]:
     """
     logging.info("get_proba_car_country")
 
-    return {}
+    likelihood = get_stage_likelihood(CAR_STAGE)
+    countries = get_countries_likelihood(likelihood, [car_brand])[0]
+
+    return {
+        country: float(value)
+        for country, value in zip(likelihood.countries, countries)
+        if value > 0
+    }
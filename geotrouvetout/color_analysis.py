@@ -15,18 +15,58 @@ hue, saturation, and value. A 10-bin histogram is created for each channel in
 each zone.
 """
 
+import functools
 import json
 import logging
+import threading
+from typing import Any, NamedTuple
 from PIL import Image
 import numpy as np
+import numpy.typing as npt
 from skimage import color
+from geotrouvetout import config
+from geotrouvetout.color_cells import get_color_cells, get_color_heat_map
+from geotrouvetout.color_histograms import (
+    CHANNELS,
+    HISTOGRAM_BINS,
+    ZONES,
+    get_histogram_distance_weights,
+    get_histogram_weights,
+    histograms_to_array,
+    normalize_histograms,
+)
+from geotrouvetout.color_index import get_color_index, get_neighbour_countries
+
+# Histograms of the color profile of each country.
+COUNTRY_HISTOGRAMS_FILE = "stats/image_histograms_country.json"
+
+# Ways of choosing the pixels counted in the histograms.
+COLOR_SAMPLINGS = ["full", "stride", "random", "downscale"]
+
+
+class CountryProfiles(NamedTuple):
+    """! Normalized color histograms of every country."""
+
+    # ISO alpha-3 codes of the countries, in the order of the histograms.
+    countries: list[str]
+    # Tensor of shape (countries, zones, channels, bins), each histogram
+    # summing to 1.
+    histograms: npt.NDArray[np.float64]
+    # Weight of each zone and channel, of shape (zones, channels).
+    weights: npt.NDArray[np.float64]
+
+
+_profiles: dict[str, CountryProfiles] = {}
+_profiles_lock = threading.Lock()
 
 
 def get_color_analysis(image: Image.Image) -> dict[str, float]:
     """! Compute color analysis for an image.
 
     Compute the color analysis of an input image and compare it to a database
-    of country-specific color profiles.
+    of country-specific color profiles, or to the nearest labelled images of
+    the index of the COLOR_INDEX setting, or to the geohash cells of the
+    COLOR_CELLS setting.
 
     @param image The imput image to be analysed.
 
@@ -34,25 +74,338 @@ def get_color_analysis(image: Image.Image) -> dict[str, float]:
     """
     logging.info("get_color_analysis")
 
-    # compute histograms for the given image
-    zones = create_zone_images(image)
-    image_histograms = {}
-    for zone_name, zone_image in zones.items():
-        histograms = create_histograms(zone_image)
-        image_histograms[zone_name] = histograms
+    # compute the histograms of every zone of the image at once
+    image_histograms = create_zone_histograms(image)
+
+    index = get_color_index()
+    if index is not None:
+        return get_neighbour_countries(index, image_histograms)
+
+    cells = get_color_cells()
+    if cells is not None:
+        return get_color_heat_map(cells, image_histograms).countries
+
+    # compare the image histograms with the histograms of every country at
+    # once
+    profiles = get_country_profiles()
+    distances = get_country_distances(image_histograms, profiles)
+
+    return {
+        country_code: 1.0 - float(distance)
+        for country_code, distance in zip(profiles.countries, distances)
+    }
+
+
+def create_zone_histograms(
+    image: Image.Image, sampling: str | None = None, step: int | None = None
+) -> npt.NDArray[np.int64]:
+    """! Create the histograms of every zone of an image at once.
+
+    With the "full" sampling, gives the same histograms as create_histograms
+    on each zone of create_zone_images, without cropping the zones: the frame
+    is converted to HSV bins once, and the histograms of every zone and
+    channel are counted in a single bincount over a map of the zone of each
+    pixel.
+
+    The other samplings count fewer pixels: one pixel every step pixels on
+    each axis for "stride", as many pixels drawn at random for "random", and
+    every pixel of the image downscaled step times for "downscale". Only the
+    normalized histograms can be compared between samplings.
+
+    @param image The input image.
+    @param sampling The pixels counted, among COLOR_SAMPLINGS, None for the
+    COLOR_SAMPLING setting.
+    @param step The sampling step, None for the COLOR_SAMPLING_STEP setting.
+    @return An array of shape (zones, channels, bins) with the histograms.
+    """
+    logging.info("create_zone_histograms")
+
+    if sampling is None:
+        sampling = config.COLOR_SAMPLING
+    if step is None:
+        step = config.COLOR_SAMPLING_STEP
+    step = max(1, int(step))
+    if sampling not in COLOR_SAMPLINGS:
+        raise ValueError(f"Unknown color sampling {sampling}")
+
+    if sampling == "downscale" and step > 1:
+        # averages each block of step x step pixels
+        image = image.reduce(step)
+    frame = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+    height, width = frame.shape[:2]
+    pixels = frame.reshape(-1, 3)
+    zone_labels = get_zone_labels(height, width)
+
+    if sampling in ["stride", "random"] and step > 1:
+        sample = get_sample_indices(height, width, sampling, step)
+        pixels = pixels[sample]
+        zone_labels = zone_labels[sample]
+
+    # index of the histogram bin of each pixel and channel, the pixels out of
+    # every zone fall in an extra zone
+    indices = get_hsv_bins(pixels)
+    indices += np.arange(len(CHANNELS)) * HISTOGRAM_BINS
+    indices += zone_labels[:, np.newaxis] * (len(CHANNELS) * HISTOGRAM_BINS)
+
+    counts = np.bincount(
+        indices.ravel(),
+        minlength=(len(ZONES) + 1) * len(CHANNELS) * HISTOGRAM_BINS,
+    )
+    return counts.reshape(len(ZONES) + 1, len(CHANNELS), HISTOGRAM_BINS)[
+        : len(ZONES)
+    ]
+
+
+@functools.lru_cache(maxsize=16)
+def get_sample_indices(
+    height: int, width: int, sampling: str, step: int
+) -> npt.NDArray[np.intp]:
+    """! Get the pixels of an image counted by a sampling.
+
+    The indices are computed once per image size, the random pixels are
+    drawn with a fixed seed so that an image always gives the same result.
+
+    @param height The height of the image.
+    @param width The width of the image.
+    @param sampling "stride" or "random".
+    @param step The sampling step.
+    @return The sorted flat indices of the pixels counted.
+    """
+    if sampling == "stride":
+        rows = np.arange(0, height, step)
+        columns = np.arange(0, width, step)
+        sample = (rows[:, np.newaxis] * width + columns).ravel()
+    else:
+        count = -(-height // step) * -(-width // step)
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(height * width, size=count, replace=False)
+        ).astype(np.intp)
+
+    sample.flags.writeable = False
+    return sample
+
+
+@functools.lru_cache(maxsize=16)
+def get_zone_labels(height: int, width: int) -> npt.NDArray[np.intp]:
+    """! Get the zone of each pixel of an image, as in create_zone_images.
+
+    The map is computed once per image size.
+
+    @param height The height of the image.
+    @param width The width of the image.
+    @return A flat array with the index of the zone of each pixel in ZONES,
+    len(ZONES) for the pixels out of every zone.
+    """
+    quarter_height = height // 4
+    middle_third_width = width // 3
+
+    labels = np.full((height, width), len(ZONES), dtype=np.intp)
+    labels[:quarter_height] = ZONES.index("top")
+    labels[quarter_height : 2 * quarter_height] = ZONES.index("middle_top")
+    labels[2 * quarter_height : 3 * quarter_height] = ZONES.index(
+        "middle_bottom"
+    )
+
+    # the side zone only keeps a third of the width on each side, the right
+    # columns beyond are cut when the sides are pasted together
+    bottom = labels[3 * quarter_height :]
+    bottom[:, :middle_third_width] = ZONES.index("side_bottom")
+    bottom[:, middle_third_width : 2 * middle_third_width] = ZONES.index(
+        "center_bottom"
+    )
+    bottom[:, 2 * middle_third_width : 3 * middle_third_width] = ZONES.index(
+        "side_bottom"
+    )
+
+    labels.flags.writeable = False
+    return labels.ravel()
+
+
+def get_hsv_bins(pixels: npt.NDArray[np.uint8]) -> npt.NDArray[np.intp]:
+    """! Get the histogram bin of the HSV channels of RGB pixels.
+
+    The bins are the bins of the skimage HSV values in np.histogram. They are
+    looked up in tables indexed by integers computed from the RGB values, and
+    a float HSV value is only computed for the pixels exactly on the edge of
+    a bin, whose bin depends on the rounding of the float computation.
+
+    @param pixels An array of shape (pixels, 3) of RGB values.
+    @return An array of shape (pixels, 3) with the hue, saturation and value
+    bins of each pixel.
+    """
+    hue_table, saturation_table, value_table = get_bin_tables()
+
+    red, green, blue = (
+        pixels[:, channel].astype(np.int16) for channel in range(3)
+    )
+    maximum = np.maximum(np.maximum(red, green), blue)
+    delta = maximum - np.minimum(np.minimum(red, green), blue)
+
+    # six times the hue times the difference of the channels, as in skimage
+    # the blue channel wins over the green one and the green one over the red
+    # one when they tie
+    hue_numerator = np.where(
+        blue == maximum,
+        4 * delta + red - green,
+        np.where(green == maximum, 2 * delta + blue - red, green - blue),
+    )
+
+    bins = np.empty((len(pixels), 3), dtype=np.intp)
+    bins[:, 0] = hue_table[hue_numerator + 255, delta]
+    bins[:, 1] = saturation_table[delta, maximum]
+    bins[:, 2] = value_table[maximum]
+
+    # the fractions exactly on an edge are binned from the float values
+    on_edge = (bins[:, 0] == HISTOGRAM_BINS) | (bins[:, 1] == HISTOGRAM_BINS)
+    if on_edge.any():
+        hsv = color.rgb2hsv(pixels[on_edge][:, np.newaxis])[:, 0]
+        bins[on_edge] = get_histogram_bins(hsv)
 
-    # load the country histograms dictionary from JSON file
-    countries_histograms = load_country_histograms(
-        "stats/image_histograms_country.json"
+    return bins
+
+
+@functools.lru_cache(maxsize=None)
+def get_bin_tables() -> (
+    tuple[npt.NDArray[np.uint8], npt.NDArray[np.uint8], npt.NDArray[np.uint8]]
+):
+    """! Get the tables of the HSV bins of the integers of get_hsv_bins.
+
+    Ten times the hue and the saturation are fractions of integers, whose
+    bin is their integer part, unless they are exactly on an edge. Those
+    edges are marked with HISTOGRAM_BINS.
+
+    @return The hue bins indexed by the hue numerator plus 255 and the
+    difference of the channels, the saturation bins indexed by the difference
+    and the maximum of the channels, and the value bins indexed by the
+    maximum of the channels.
+    """
+    delta = np.arange(256)
+
+    numerator = HISTOGRAM_BINS * np.arange(-255, 5 * 255 + 1)[:, np.newaxis]
+    denominator = np.maximum(6 * delta, 1)[np.newaxis]
+    hue_table = (numerator // denominator) % HISTOGRAM_BINS
+    hue_table[numerator % denominator == 0] = HISTOGRAM_BINS
+    hue_table[:, 0] = 0
+
+    maximum = np.maximum(np.arange(256), 1)[np.newaxis]
+    numerator = HISTOGRAM_BINS * delta[:, np.newaxis]
+    saturation_table = np.minimum(numerator // maximum, HISTOGRAM_BINS - 1)
+    saturation_table[
+        (numerator % maximum == 0) & (delta[:, np.newaxis] < maximum)
+    ] = HISTOGRAM_BINS
+    saturation_table[0] = 0
+
+    gray = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(256, 1, 3)
+    value_table = get_histogram_bins(color.rgb2hsv(gray)[:, 0, 2])
+
+    tables = (
+        hue_table.astype(np.uint8),
+        saturation_table.astype(np.uint8),
+        value_table.astype(np.uint8),
     )
+    for table in tables:
+        table.flags.writeable = False
+    return tables
+
+
+def get_histogram_bins(
+    values: npt.NDArray[np.float64],
+) -> npt.NDArray[np.intp]:
+    """! Get the bins of values between 0 and 1, as np.histogram does.
+
+    @param values The values.
+    @return The index of the bin of each value, the last bin including 1.
+    """
+    edges = np.linspace(0, 1, HISTOGRAM_BINS + 1)
+    bins = np.searchsorted(edges, values, side="right") - 1
+    return np.minimum(bins, HISTOGRAM_BINS - 1)
+
+
+def get_distance_drift_bound(
+    histograms: npt.NDArray[Any], other_histograms: npt.NDArray[Any]
+) -> float:
+    """! Bound the change of the country distances between two histograms.
+
+    With t = (p - q) / (p + q), the derivative of each term of the
+    chi-square distance in the bin p of the image is t (2 - t) / 2, between
+    -3/2 and 1/2, so the distance to any country changes by at most 3/2 of
+    the L1 distance between the normalized histograms, averaged with the
+    weights of the comparison.
+
+    @param histograms The histograms of an image, such as the full ones, of
+    shape (zones, channels, bins).
+    @param other_histograms Other histograms of the image, such as sampled
+    ones.
+    @return The maximum difference between the distances of the two
+    histograms to any country.
+    """
+    weights = get_histogram_weights()
+    changes = 1.5 * np.abs(
+        normalize_histograms(histograms)
+        - normalize_histograms(other_histograms)
+    ).sum(axis=-1)
+
+    return float((changes * weights).sum() / weights.sum())
+
 
-    # compare the image histograms with the country histograms
-    result = {}
-    for country_code, country_histograms in countries_histograms.items():
-        distance = compare_histograms(image_histograms, country_histograms)
-        result[country_code] = 1.0 - distance
+def get_country_profiles(
+    json_file: str = COUNTRY_HISTOGRAMS_FILE,
+) -> CountryProfiles:
+    """! Get the color profiles of the countries, loading them on first use.
 
-    return result
+    @param json_file The path to the JSON file of the country histograms.
+    @return The normalized histograms of every country, shared by the whole
+    process.
+    """
+    with _profiles_lock:
+        profiles = _profiles.get(json_file)
+        if profiles is None:
+            countries_histograms = load_country_histograms(json_file)
+            countries = list(countries_histograms)
+            histograms = np.stack(
+                [
+                    histograms_to_array(countries_histograms[country])
+                    for country in countries
+                ]
+            )
+            profiles = CountryProfiles(
+                countries,
+                normalize_histograms(histograms),
+                get_histogram_weights(),
+            )
+            _profiles[json_file] = profiles
+
+    return profiles
+
+
+def get_country_distances(
+    image_histograms: npt.NDArray[Any], profiles: CountryProfiles
+) -> npt.NDArray[np.float64]:
+    """! Compute the distance between an image and every country at once.
+
+    Gives the same distances as compare_histograms, with the chi-square
+    distances of every zone, channel and country computed in a single
+    broadcast operation.
+
+    @param image_histograms The histograms of the image, of shape (zones,
+    channels, bins).
+    @param profiles The color profiles of the countries.
+    @return The distance to each country, in the order of the countries of
+    the profiles.
+    """
+    image = normalize_histograms(image_histograms)[np.newaxis]
+    countries = profiles.histograms
+
+    # chi-square distance of every histogram, the bins empty in both
+    # histograms do not count
+    sums = image + countries
+    squares = (image - countries) ** 2
+    terms = np.divide(squares, sums, out=np.zeros_like(sums), where=sums != 0)
+    distances = terms.sum(axis=-1) / 2
+
+    weights = profiles.weights
+    return (distances * weights).sum(axis=(1, 2)) / weights.sum()
 
 
 def load_country_histograms(
@@ -248,55 +601,6 @@ def compare_histograms(
     return distance / total_weights
 
 
-def get_histogram_distance_weights() -> dict[str, dict[str, float]]:
-    """! Return weights for histogram comparison.
-
-    @return A dictionary with keys and values for the weights for each zone of
-    the image.
-    """
-    logging.info("get_histogram_distance_weights")
-
-    # define weights for different zones
-    top_weight = 0.2
-    middle_top_weight = 0.5
-    middle_bottom_weight = 1.0
-    center_bottom_weight = 2.0
-    side_bottom_weight = 1.0
-
-    # define weights for different channels
-    hue_weight = 4.0
-    saturation_weight = 2.0
-    value_weight = 1.0
-
-    return {
-        "top": {
-            "hue": top_weight * hue_weight,
-            "saturation": top_weight * saturation_weight,
-            "value": top_weight * value_weight,
-        },
-        "middle_top": {
-            "hue": middle_top_weight * hue_weight,
-            "saturation": middle_top_weight * saturation_weight,
-            "value": middle_top_weight * value_weight,
-        },
-        "middle_bottom": {
-            "hue": middle_bottom_weight * hue_weight,
-            "saturation": middle_bottom_weight * saturation_weight,
-            "value": middle_bottom_weight * value_weight,
-        },
-        "center_bottom": {
-            "hue": center_bottom_weight * hue_weight,
-            "saturation": center_bottom_weight * saturation_weight,
-            "value": center_bottom_weight * value_weight,
-        },
-        "side_bottom": {
-            "hue": side_bottom_weight * hue_weight,
-            "saturation": side_bottom_weight * saturation_weight,
-            "value": side_bottom_weight * value_weight,
-        },
-    }
-
-
 def chi_square_distance(hist1: list[int], hist2: list[int]) -> float:
     """! Calculate the chi-square distance between two histograms.
 
@@ -0,0 +1,332 @@
+"""! @brief Color profiles of geohash cells.
+
+The color profile of a country is too coarse for the countries spanning many
+landscapes, such as Russia, the USA or Brazil. This module aggregates the
+histograms of the labelled images into geohash cells instead, and compares
+an image with every cell at once.
+
+Each cell keeps the vector of its summed histograms, as in the color index:
+the square root of the normalized histograms scaled by the square root of
+their weights. The squared distance between the image and every cell is then
+a single product of the cells x 150 matrix of vectors with the vector of the
+image, and the score of a cell is 1 minus half its squared distance, between
+0 and 1.
+
+The cells are a directory of numpy files, memory-mapped when loaded:
+
+- vectors.npy and norms.npy, the vectors of the cells and their squared norm,
+- counts.npy, the number of images of each cell,
+- labels.npy, the index of the country of each cell,
+- geohashes.json and countries.json, the geohash of each cell and the ISO
+  alpha-3 codes of the countries.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, NamedTuple
+import numpy as np
+import numpy.typing as npt
+from geotrouvetout import config
+from geotrouvetout.color_histograms import get_histogram_vectors
+
+# Alphabet of the geohashes.
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+class ColorCells(NamedTuple):
+    """! Color vectors of geohash cells."""
+
+    # Geohash of each cell.
+    geohashes: list[str]
+    # ISO alpha-3 codes of the countries of the labels.
+    countries: list[str]
+    # Index in the countries of the country of each cell.
+    labels: npt.NDArray[np.int16]
+    # Number of images of each cell.
+    counts: npt.NDArray[np.int32]
+    # Vectors of the cells, of shape (cells, 150).
+    vectors: npt.NDArray[np.float32]
+    # Squared norm of each vector.
+    norms: npt.NDArray[np.float32]
+    # Latitude of the center of each cell.
+    latitudes: npt.NDArray[np.float64]
+    # Longitude of the center of each cell.
+    longitudes: npt.NDArray[np.float64]
+
+
+class ColorHeatMap(NamedTuple):
+    """! Scores of the colors of an image over the world."""
+
+    # Score of each cell, in the order of the geohashes of the cells.
+    scores: npt.NDArray[np.float64]
+    # Best score of the cells whose center is in each pixel of a latitude x
+    # longitude grid, from the north west corner, NaN without any cell.
+    grid: npt.NDArray[np.float64]
+    # Best score of the cells of each country.
+    countries: dict[str, float]
+
+
+_cells: dict[str, ColorCells] = {}
+_cells_lock = threading.Lock()
+
+
+def encode_geohashes(
+    latitudes: npt.ArrayLike, longitudes: npt.ArrayLike, precision: int
+) -> list[str]:
+    """! Encode coordinates as geohashes.
+
+    @param latitudes The latitudes, in degrees.
+    @param longitudes The longitudes, in degrees.
+    @param precision The number of characters of the geohashes.
+    @return The geohash of each coordinate.
+    """
+    bits = 5 * precision
+    longitude_bits = (bits + 1) // 2
+    latitude_bits = bits // 2
+
+    # position of each coordinate on a grid of 2^bits cells per axis
+    latitude_cells = np.clip(
+        (
+            (np.asarray(latitudes, dtype=np.float64) + 90)
+            / 180
+            * 2**latitude_bits
+        ),
+        0,
+        2**latitude_bits - 1,
+    ).astype(np.int64)
+    longitude_cells = np.clip(
+        (
+            (np.asarray(longitudes, dtype=np.float64) + 180)
+            / 360
+            * 2**longitude_bits
+        ),
+        0,
+        2**longitude_bits - 1,
+    ).astype(np.int64)
+
+    # interleave the bits, starting with the longitude
+    codes = np.zeros(latitude_cells.shape, dtype=np.int64)
+    for bit in range(bits):
+        if bit % 2 == 0:
+            value = longitude_cells >> (longitude_bits - 1 - bit // 2)
+        else:
+            value = latitude_cells >> (latitude_bits - 1 - bit // 2)
+        codes = (codes << 1) | (value & 1)
+
+    characters = [
+        (codes >> (5 * (precision - 1 - index))) & 31
+        for index in range(precision)
+    ]
+    return [
+        "".join(GEOHASH_ALPHABET[value] for value in row)
+        for row in np.stack(characters, axis=-1)
+        .reshape(-1, precision)
+        .tolist()
+    ]
+
+
+def decode_geohash(geohash: str) -> tuple[float, float]:
+    """! Decode the center of a geohash.
+
+    @param geohash The geohash.
+    @return The latitude and longitude of the center of the cell, in degrees.
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    is_longitude = True
+    for character in geohash:
+        value = GEOHASH_ALPHABET.index(character)
+        for shift in range(4, -1, -1):
+            bounds = longitude_range if is_longitude else latitude_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if (value >> shift) & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            is_longitude = not is_longitude
+
+    return (
+        (latitude_range[0] + latitude_range[1]) / 2,
+        (longitude_range[0] + longitude_range[1]) / 2,
+    )
+
+
+def build_color_cells(
+    histograms: npt.NDArray[Any],
+    latitudes: npt.ArrayLike,
+    longitudes: npt.ArrayLike,
+    countries: list[str],
+    directory: str,
+    precision: int = 3,
+) -> None:
+    """! Build the color cells from the histograms of located images.
+
+    The histograms of the images of each geohash cell are summed, and the
+    country of a cell is the most common country of its images.
+
+    @param histograms The histograms of the images, of shape (images, zones,
+    channels, bins).
+    @param latitudes The latitude of each image.
+    @param longitudes The longitude of each image.
+    @param countries The ISO alpha-3 code of the country of each image.
+    @param directory The directory where the cells are written.
+    @param precision The number of characters of the geohashes of the cells.
+    """
+    logging.info("build_color_cells")
+
+    geohashes = encode_geohashes(latitudes, longitudes, precision)
+    cell_names, cells = np.unique(geohashes, return_inverse=True)
+    country_names, country_labels = np.unique(countries, return_inverse=True)
+
+    # sum the histograms of each cell
+    summed = np.zeros((len(cell_names),) + histograms.shape[1:])
+    np.add.at(summed, cells, histograms)
+    counts = np.bincount(cells, minlength=len(cell_names))
+
+    # most common country of each cell
+    votes = np.zeros((len(cell_names), len(country_names)), dtype=np.int64)
+    np.add.at(votes, (cells, country_labels), 1)
+    labels = votes.argmax(axis=1)
+
+    vectors = get_histogram_vectors(summed)
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "vectors.npy"), vectors)
+    np.save(os.path.join(directory, "norms.npy"), (vectors**2).sum(axis=1))
+    np.save(os.path.join(directory, "counts.npy"), counts.astype(np.int32))
+    np.save(os.path.join(directory, "labels.npy"), labels.astype(np.int16))
+    with open(
+        os.path.join(directory, "geohashes.json"), "w", encoding="utf-8"
+    ) as file:
+        json.dump(cell_names.tolist(), file)
+    with open(
+        os.path.join(directory, "countries.json"), "w", encoding="utf-8"
+    ) as file:
+        json.dump(country_names.tolist(), file)
+
+
+def get_color_cells(directory: str | None = None) -> ColorCells | None:
+    """! Get the color cells, loading them on first use.
+
+    @param directory The directory of the cells, None for the COLOR_CELLS
+    setting.
+    @return The cells, shared by the whole process, None if there are no
+    cells in the directory.
+    """
+    if directory is None:
+        directory = config.COLOR_CELLS
+    if not directory or not os.path.isfile(
+        os.path.join(directory, "vectors.npy")
+    ):
+        return None
+
+    with _cells_lock:
+        cells = _cells.get(directory)
+        if cells is None:
+            cells = load_color_cells(directory)
+            _cells[directory] = cells
+
+    return cells
+
+
+def load_color_cells(directory: str) -> ColorCells:
+    """! Load the color cells, memory-mapping their vectors.
+
+    @param directory The directory of the cells.
+    @return The cells.
+    """
+    logging.info(f"load_color_cells {directory}")
+
+    with open(
+        os.path.join(directory, "geohashes.json"), "r", encoding="utf-8"
+    ) as file:
+        geohashes = json.load(file)
+    with open(
+        os.path.join(directory, "countries.json"), "r", encoding="utf-8"
+    ) as file:
+        countries = json.load(file)
+    centers = np.array([decode_geohash(geohash) for geohash in geohashes])
+    centers = centers.reshape(-1, 2)
+
+    return ColorCells(
+        geohashes,
+        countries,
+        np.load(os.path.join(directory, "labels.npy"), mmap_mode="r"),
+        np.load(os.path.join(directory, "counts.npy"), mmap_mode="r"),
+        np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r"),
+        np.load(os.path.join(directory, "norms.npy"), mmap_mode="r"),
+        np.ascontiguousarray(centers[:, 0]),
+        np.ascontiguousarray(centers[:, 1]),
+    )
+
+
+def score_color_cells(
+    cells: ColorCells, histograms: npt.NDArray[Any]
+) -> npt.NDArray[np.float64]:
+    """! Score every cell against the histograms of an image at once.
+
+    @param cells The color cells.
+    @param histograms The histograms of the image, of shape (zones, channels,
+    bins).
+    @return The score of each cell, 1 minus half the squared weighted
+    Hellinger distance between the image and the cell, between 0 and 1.
+    """
+    vector = get_histogram_vectors(histograms)
+    distances = cells.norms - 2 * (cells.vectors @ vector) + vector @ vector
+
+    return np.clip(1.0 - distances.astype(np.float64) / 2, 0.0, 1.0)
+
+
+def get_color_heat_map(
+    cells: ColorCells,
+    histograms: npt.NDArray[Any],
+    resolution: float | None = None,
+) -> ColorHeatMap:
+    """! Score the cells and the countries of an image.
+
+    @param cells The color cells.
+    @param histograms The histograms of the image, of shape (zones, channels,
+    bins).
+    @param resolution The size of the pixels of the heat grid, in degrees,
+    None for the COLOR_HEAT_GRID_DEGREES setting.
+    @return The scores of the cells, the heat grid, and the best score of the
+    cells of each country.
+    """
+    logging.info("get_color_heat_map")
+
+    if resolution is None:
+        resolution = config.COLOR_HEAT_GRID_DEGREES
+
+    scores = score_color_cells(cells, histograms)
+
+    # best cell of each pixel of the grid, the offsets from the north west
+    # corner are positive so that truncating them is flooring them
+    rows = int(np.ceil(180 / resolution))
+    columns = int(np.ceil(360 / resolution))
+    row = np.minimum(
+        ((90 - cells.latitudes) / resolution).astype(np.intp), rows - 1
+    )
+    column = np.minimum(
+        ((cells.longitudes + 180) / resolution).astype(np.intp), columns - 1
+    )
+    grid = np.full(rows * columns, -np.inf)
+    np.maximum.at(grid, row * columns + column, scores)
+    grid[np.isinf(grid)] = np.nan
+
+    # best cell of each country
+    country_scores = np.full(len(cells.countries), -np.inf)
+    np.maximum.at(country_scores, cells.labels, scores)
+    found = np.flatnonzero(np.isfinite(country_scores))
+
+    return ColorHeatMap(
+        scores,
+        grid.reshape(rows, columns),
+        dict(
+            zip(
+                [cells.countries[i] for i in found],
+                country_scores[found].tolist(),
+            )
+        ),
+    )
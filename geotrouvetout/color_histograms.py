@@ -0,0 +1,133 @@
+"""! @brief Arrays of the zone color histograms of images.
+
+The color analysis, the color index and the color cells all compare the same
+hue, saturation and value histograms of the five zones of an image. This
+module holds what they share: the order of the zones and channels of the
+arrays of histograms, the weights of their comparison, and their conversion
+to the vectors whose euclidean distance is a weighted Hellinger distance.
+"""
+
+import logging
+from typing import Any
+import numpy as np
+import numpy.typing as npt
+
+# Zones of the image, in the order of the profile tensor.
+ZONES = ["top", "middle_top", "middle_bottom", "center_bottom", "side_bottom"]
+
+# Channels of each zone, in the order of the profile tensor.
+CHANNELS = ["hue", "saturation", "value"]
+
+# Number of bins of the histograms of each channel.
+HISTOGRAM_BINS = 10
+
+
+def histograms_to_array(
+    histograms: dict[str, dict[str, list[int]]],
+) -> npt.NDArray[np.float64]:
+    """! Convert the histograms of the zones of an image to an array.
+
+    @param histograms A dict containing the histograms for HSV of the five
+    zones.
+    @return An array of shape (zones, channels, bins).
+    """
+    return np.array(
+        [
+            [histograms[zone][channel] for channel in CHANNELS]
+            for zone in ZONES
+        ],
+        dtype=np.float64,
+    )
+
+
+def normalize_histograms(
+    histograms: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """! Normalize histograms so that each of them sums to 1.
+
+    @param histograms An array whose last axis is the bins of the histograms.
+    @return The normalized histograms, with the empty histograms left at 0.
+    """
+    histograms = np.asarray(histograms, dtype=np.float64)
+    totals = histograms.sum(axis=-1, keepdims=True)
+    return np.divide(
+        histograms, totals, out=np.zeros_like(histograms), where=totals != 0
+    )
+
+
+def get_histogram_weights() -> npt.NDArray[np.float64]:
+    """! Get the weights of the histogram comparison as an array.
+
+    @return An array of shape (zones, channels).
+    """
+    weights = get_histogram_distance_weights()
+    return np.array(
+        [[weights[zone][channel] for channel in CHANNELS] for zone in ZONES]
+    )
+
+
+def get_histogram_vectors(
+    histograms: npt.NDArray[Any],
+) -> npt.NDArray[np.float32]:
+    """! Convert zone histograms to the vectors of the index.
+
+    @param histograms The histograms of one or several images, of shape
+    (..., zones, channels, bins).
+    @return The vectors, of shape (..., zones * channels * bins).
+    """
+    weights = get_histogram_weights()
+    vectors = (
+        np.sqrt(normalize_histograms(histograms))
+        * np.sqrt(weights / weights.sum())[..., np.newaxis]
+    )
+
+    return vectors.reshape(*vectors.shape[:-3], -1).astype(np.float32)
+
+
+def get_histogram_distance_weights() -> dict[str, dict[str, float]]:
+    """! Return weights for histogram comparison.
+
+    @return A dictionary with keys and values for the weights for each zone of
+    the image.
+    """
+    logging.info("get_histogram_distance_weights")
+
+    # define weights for different zones
+    top_weight = 0.2
+    middle_top_weight = 0.5
+    middle_bottom_weight = 1.0
+    center_bottom_weight = 2.0
+    side_bottom_weight = 1.0
+
+    # define weights for different channels
+    hue_weight = 4.0
+    saturation_weight = 2.0
+    value_weight = 1.0
+
+    return {
+        "top": {
+            "hue": top_weight * hue_weight,
+            "saturation": top_weight * saturation_weight,
+            "value": top_weight * value_weight,
+        },
+        "middle_top": {
+            "hue": middle_top_weight * hue_weight,
+            "saturation": middle_top_weight * saturation_weight,
+            "value": middle_top_weight * value_weight,
+        },
+        "middle_bottom": {
+            "hue": middle_bottom_weight * hue_weight,
+            "saturation": middle_bottom_weight * saturation_weight,
+            "value": middle_bottom_weight * value_weight,
+        },
+        "center_bottom": {
+            "hue": center_bottom_weight * hue_weight,
+            "saturation": center_bottom_weight * saturation_weight,
+            "value": center_bottom_weight * value_weight,
+        },
+        "side_bottom": {
+            "hue": side_bottom_weight * hue_weight,
+            "saturation": side_bottom_weight * saturation_weight,
+            "value": side_bottom_weight * value_weight,
+        },
+    }
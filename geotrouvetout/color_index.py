@@ -0,0 +1,262 @@
+"""! @brief Nearest neighbour index of the color histograms of labelled images.
+
+The color profile of a country is the average of the histograms of its
+images, which loses most of what tells countries apart. This index keeps the
+histograms of every labelled image instead, and scores the countries of a
+new image by the votes of its nearest neighbours.
+
+Each image is a 150 dimensional vector: the square root of each normalized
+zone and channel histogram, scaled by the square root of its weight in the
+color comparison, so that the euclidean distance between two vectors is the
+weighted Hellinger distance between their histograms.
+
+The index is a directory of numpy files, memory-mapped when loaded, so that
+a large index is not read into memory and is shared by the workers:
+
+- vectors.npy, the vectors of the images,
+- norms.npy, the squared norm of each vector,
+- labels.npy, the index of the country of each image,
+- countries.json, the ISO alpha-3 codes of the countries,
+- and, for an approximate index, mean.npy, projection.npy and reduced.npy,
+  the principal component projection of the vectors, searched with a k-d
+  tree.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, NamedTuple
+import numpy as np
+import numpy.typing as npt
+from scipy.spatial import cKDTree
+from geotrouvetout import config
+from geotrouvetout.color_histograms import get_histogram_vectors
+
+# Number of vectors compared at once by the exact search.
+SEARCH_CHUNK_SIZE = 65536
+
+# Distance added to the neighbours before weighting their vote by the
+# inverse of their distance.
+VOTE_EPSILON = 1e-6
+
+
+class ColorIndex(NamedTuple):
+    """! Histogram vectors of labelled images."""
+
+    # ISO alpha-3 codes of the countries of the labels.
+    countries: list[str]
+    # Index in the countries of the label of each image.
+    labels: npt.NDArray[np.int16]
+    # Vectors of the images, of shape (images, 150).
+    vectors: npt.NDArray[np.float32]
+    # Squared norm of each vector.
+    norms: npt.NDArray[np.float32]
+    # Mean of the vectors, None for an exact index.
+    mean: npt.NDArray[np.float32] | None
+    # Projection on the principal components, None for an exact index.
+    projection: npt.NDArray[np.float32] | None
+    # K-d tree of the projected vectors, None for an exact index.
+    tree: Any
+
+
+_indexes: dict[str, ColorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def build_color_index(
+    histograms: npt.NDArray[Any],
+    countries: list[str],
+    directory: str,
+    components: int = 0,
+) -> None:
+    """! Build an index from the histograms of labelled images.
+
+    @param histograms The histograms of the images, of shape (images, zones,
+    channels, bins).
+    @param countries The ISO alpha-3 code of the country of each image.
+    @param directory The directory where the index is written.
+    @param components The number of principal components of an approximate
+    index, 0 for an exact index.
+    """
+    logging.info("build_color_index")
+
+    os.makedirs(directory, exist_ok=True)
+    vectors = get_histogram_vectors(histograms)
+    names = sorted(set(countries))
+    indices = {name: index for index, name in enumerate(names)}
+    labels = np.array(
+        [indices[country] for country in countries], dtype=np.int16
+    )
+
+    np.save(os.path.join(directory, "vectors.npy"), vectors)
+    np.save(os.path.join(directory, "norms.npy"), (vectors**2).sum(axis=1))
+    np.save(os.path.join(directory, "labels.npy"), labels)
+    with open(
+        os.path.join(directory, "countries.json"), "w", encoding="utf-8"
+    ) as file:
+        json.dump(names, file)
+
+    reduced_files = ["mean.npy", "projection.npy", "reduced.npy"]
+    if components <= 0:
+        for name in reduced_files:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        return
+
+    # principal components from the covariance of the vectors
+    mean = vectors.mean(axis=0, dtype=np.float64)
+    covariance = np.zeros((vectors.shape[1], vectors.shape[1]))
+    for start in range(0, len(vectors), SEARCH_CHUNK_SIZE):
+        centered = vectors[start : start + SEARCH_CHUNK_SIZE] - mean
+        covariance += centered.T @ centered
+    _, eigenvectors = np.linalg.eigh(covariance)
+    projection = eigenvectors[:, ::-1][:, :components]
+
+    reduced = (vectors - mean) @ projection
+    for name, array in zip(reduced_files, [mean, projection, reduced]):
+        np.save(os.path.join(directory, name), array.astype(np.float32))
+
+
+def get_color_index(directory: str | None = None) -> ColorIndex | None:
+    """! Get an index, loading it on first use.
+
+    @param directory The directory of the index, None for the COLOR_INDEX
+    setting.
+    @return The index, shared by the whole process, None if there is no
+    index in the directory.
+    """
+    if directory is None:
+        directory = config.COLOR_INDEX
+    if not directory or not os.path.isfile(
+        os.path.join(directory, "vectors.npy")
+    ):
+        return None
+
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = load_color_index(directory)
+            _indexes[directory] = index
+
+    return index
+
+
+def load_color_index(directory: str) -> ColorIndex:
+    """! Load an index, memory-mapping its vectors.
+
+    @param directory The directory of the index.
+    @return The index.
+    """
+    logging.info(f"load_color_index {directory}")
+
+    vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+    norms = np.load(os.path.join(directory, "norms.npy"), mmap_mode="r")
+    labels = np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+    with open(
+        os.path.join(directory, "countries.json"), "r", encoding="utf-8"
+    ) as file:
+        countries = json.load(file)
+
+    mean, projection, tree = None, None, None
+    if os.path.isfile(os.path.join(directory, "reduced.npy")):
+        mean = np.load(os.path.join(directory, "mean.npy"))
+        projection = np.load(os.path.join(directory, "projection.npy"))
+        reduced = np.load(
+            os.path.join(directory, "reduced.npy"), mmap_mode="r"
+        )
+        tree = cKDTree(reduced)
+
+    return ColorIndex(
+        countries, labels, vectors, norms, mean, projection, tree
+    )
+
+
+def search_color_index(
+    index: ColorIndex, vector: npt.NDArray[np.float32], count: int
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.intp]]:
+    """! Find the nearest images of a vector.
+
+    An exact index compares the vector with every image, by chunks of the
+    memory-mapped vectors, with a single product per chunk. An approximate
+    index searches the k-d tree of the projected vectors.
+
+    @param index The index.
+    @param vector The vector of an image.
+    @param count The number of neighbours.
+    @return The distances and the indices of the nearest images, from the
+    nearest.
+    """
+    count = min(count, len(index.labels))
+    if count <= 0:
+        return np.zeros(0), np.zeros(0, dtype=np.intp)
+
+    if index.tree is not None:
+        distances, indices = index.tree.query(
+            (vector - index.mean) @ index.projection, k=count
+        )
+        return np.atleast_1d(distances), np.atleast_1d(indices)
+
+    best_distances = np.zeros(0)
+    best_indices = np.zeros(0, dtype=np.intp)
+    for start in range(0, len(index.vectors), SEARCH_CHUNK_SIZE):
+        chunk = index.vectors[start : start + SEARCH_CHUNK_SIZE]
+        distances = index.norms[start : start + SEARCH_CHUNK_SIZE] - 2 * (
+            chunk @ vector
+        )
+        nearest = np.argpartition(distances, min(count, len(chunk)) - 1)[
+            :count
+        ]
+        best_distances = np.concatenate([best_distances, distances[nearest]])
+        best_indices = np.concatenate([best_indices, nearest + start])
+        if len(best_distances) > count:
+            keep = np.argpartition(best_distances, count - 1)[:count]
+            best_distances, best_indices = (
+                best_distances[keep],
+                best_indices[keep],
+            )
+
+    # the squared norm of the vector is the same for every image
+    best_distances = np.maximum(best_distances + vector @ vector, 0)
+    order = np.argsort(best_distances, kind="stable")
+    return np.sqrt(best_distances[order]), best_indices[order]
+
+
+def get_neighbour_countries(
+    index: ColorIndex, histograms: npt.NDArray[Any], count: int | None = None
+) -> dict[str, float]:
+    """! Score the countries of an image by the votes of its neighbours.
+
+    @param index The index.
+    @param histograms The histograms of the image, of shape (zones,
+    channels, bins).
+    @param count The number of neighbours, None for the COLOR_INDEX_NEIGHBOURS
+    setting.
+    @return A dictionary with the countries of the neighbours as keys and
+    their share of the votes, weighted by the inverse of the distance of
+    each neighbour, as values.
+    """
+    logging.info("get_neighbour_countries")
+
+    if count is None:
+        count = config.COLOR_INDEX_NEIGHBOURS
+
+    distances, indices = search_color_index(
+        index, get_histogram_vectors(histograms), count
+    )
+    if len(indices) == 0:
+        return {}
+
+    votes = np.bincount(
+        index.labels[indices],
+        weights=1.0 / (distances + VOTE_EPSILON),
+        minlength=len(index.countries),
+    )
+    votes /= votes.sum()
+
+    return {
+        country: float(vote)
+        for country, vote in zip(index.countries, votes)
+        if vote > 0
+    }
@@ -10,9 +10,12 @@ probability.
 from collections import defaultdict
 import json
 import logging
+import numpy as np
+import numpy.typing as npt
 import pycountry
 from PIL import Image
 import geotrouvetout
+from geotrouvetout.car_detection import car_detection_batch, has_car_models
 
 
 def get_country(image: Image.Image) -> dict[str, float]:
@@ -25,6 +28,23 @@ def get_country(image: Image.Image) -> dict[str, float]:
     """
     logging.info("get_country")
 
+    return get_countries([image])[0]
+
+
+def get_countries(images: list[Image.Image]) -> list[dict[str, float]]:
+    """
+    Get the most likely countries for each image of a list.
+
+    The detectors run once over batches of images, and each image is then
+    analyzed with its own detections. The result is the same as calling
+    get_country on each image.
+
+    @param images A list of PIL images.
+    @return A list with, for each image, a dictionary with the countries as
+    keys and the probability of the image belonging to each country as values.
+    """
+    logging.info("get_countries")
+
     country_codes = [c.alpha_3 for c in pycountry.countries]
 
     areas = geotrouvetout.get_country_areas()
@@ -41,6 +61,61 @@ def get_country(image: Image.Image) -> dict[str, float]:
     else:
         area_dict = empty_dict(country_codes)
 
+    # the cars are only analyzed when their weights are deployed
+    classes = ["traffic_sign"]
+    analyze_cars = has_car_models()
+    if analyze_cars:
+        classes.append("car")
+    else:
+        logging.info("No car weights, the cars are not analyzed")
+
+    # detect every object of every image once, the combined model hands the
+    # crops of each class to its consumer
+    objects_list = geotrouvetout.detect_objects_batch(images, classes)
+
+    # classify the cars of every image at once
+    if analyze_cars:
+        car_countries_list = car_detection_batch(
+            images, [objects["car"] for objects in objects_list]
+        )
+    else:
+        car_countries_list = [{} for _ in images]
+
+    # each image is a request of its own for the debug images
+    results = []
+    for image, objects, car_countries in zip(
+        images, objects_list, car_countries_list
+    ):
+        with geotrouvetout.debug_request():
+            results.append(
+                combine_image_evidence(
+                    image, objects, area_dict, country_codes, car_countries
+                )
+            )
+
+    return results
+
+
+def combine_image_evidence(
+    image: Image.Image,
+    objects: dict[str, list[npt.NDArray[np.uint8]]],
+    area_dict: dict[str, float],
+    country_codes: list[str],
+    car_countries: dict[str, float] | None = None,
+) -> dict[str, float]:
+    """
+    Combine the evidence of every method for a single image.
+
+    @param image A PIL image.
+    @param objects A dictionary with the object classes as keys and the crops
+    of the objects detected in the image as values.
+    @param area_dict The prior probability of each country from its area.
+    @param country_codes A list of country codes.
+    @param car_countries The likelihood of each country from the brands of
+    the cars of the image, None or empty when no car brand was recognized.
+    @return A dictionary with the countries as keys and the probability of the
+    image belonging to each country as values.
+    """
     color_analysis = geotrouvetout.get_color_analysis(image)
     if color_analysis:
         color_analysis = amplify_probs(color_analysis, 2)
@@ -48,7 +123,13 @@ def get_country(image: Image.Image) -> dict[str, float]:
     else:
         color_dict = empty_dict(country_codes)
 
-    languages = geotrouvetout.get_languages(image)
+    # read the signs with the scripts of the countries already likely
+    ocr_lang = geotrouvetout.select_ocr_languages(
+        {key: area_dict[key] * color_dict[key] for key in country_codes}
+    )
+    languages = geotrouvetout.get_languages(
+        image, objects["traffic_sign"], ocr_lang
+    )
     if languages:
         language_dict = get_countries_dict(
             get_country_languages(languages, "stats/country_metadata.json"),
@@ -57,8 +138,18 @@ def get_country(image: Image.Image) -> dict[str, float]:
     else:
         language_dict = empty_dict(country_codes)
 
+    if car_countries:
+        car_dict = get_countries_dict(car_countries, country_codes)
+    else:
+        car_dict = empty_dict(country_codes)
+
     evidence = {
-        key: (area_dict[key] * color_dict[key] * language_dict[key])
+        key: (
+            area_dict[key]
+            * color_dict[key]
+            * language_dict[key]
+            * car_dict[key]
+        )
         for key in country_codes
     }
     total_evidence = sum(evidence.values())
@@ -66,7 +157,7 @@ def get_country(image: Image.Image) -> dict[str, float]:
     combined_dict = {
         key: bayesian_update(
             area_dict[key],
-            color_dict[key] * language_dict[key],
+            color_dict[key] * language_dict[key] * car_dict[key],
             total_evidence,
         )
         for key in country_codes
@@ -115,7 +206,7 @@ def get_country_languages(languages: dict[str, float],
         lang_countries = [
             key
             for key, value in country_metadata.items()
-            if lang in value["languages"]
+            if lang.upper() in value["languages"]
         ]
         for country in lang_countries:
             country_prob[country] += prob
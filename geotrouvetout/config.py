@@ -0,0 +1,156 @@
+"""! @brief Configuration of geotrouvetout.
+
+Every setting has a default value and can be overridden with the environment
+variable of the same name prefixed with GEOTROUVETOUT_, for instance
+GEOTROUVETOUT_DETECTION_BACKEND=onnx.
+"""
+
+import os
+
+
+def get_setting(name: str, default: str) -> str:
+    """! Get the value of a setting from the environment.
+
+    @param name The name of the setting.
+    @param default The value of the setting when it is not in the environment.
+    @return The value of the setting.
+    """
+    return os.environ.get(f"GEOTROUVETOUT_{name}", default)
+
+
+# Inference backend of the detectors, "torch" or "onnx". The onnx backend
+# is only used for the models that have been converted.
+DETECTION_BACKEND = get_setting("DETECTION_BACKEND", "torch")
+
+# Quantization of the converted onnx models to load, "" for the float
+# models, "dynamic" or "static" for the int8 models.
+ONNX_QUANTIZATION = get_setting("ONNX_QUANTIZATION", "")
+
+# Maximum number of images stacked in a single detector batch.
+BATCH_SIZE = int(get_setting("BATCH_SIZE", "8"))
+
+# Maximum number of crops stacked in a single classifier batch.
+CLASSIFICATION_BATCH_SIZE = int(get_setting("CLASSIFICATION_BATCH_SIZE", "32"))
+
+# Whether to detect the road signs with tiled inference, "1" to enable it.
+SIGN_TILING = get_setting("SIGN_TILING", "0") == "1"
+
+# Maximum number of detector inputs per image with tiled inference,
+# including the full image.
+TILE_BUDGET = int(get_setting("TILE_BUDGET", "5"))
+
+# Side of the tiles at native resolution, in pixels.
+TILE_SIZE = int(get_setting("TILE_SIZE", "640"))
+
+# Fraction of a tile that overlaps its neighbours.
+TILE_OVERLAP = float(get_setting("TILE_OVERLAP", "0.2"))
+
+# Number of crop classifications kept in the cache of each object stage, 0
+# to disable the cache.
+STAGE_CACHE_SIZE = int(get_setting("STAGE_CACHE_SIZE", "1024"))
+
+# Number of worker processes of the daemon.
+WORKERS = int(get_setting("WORKERS", "1"))
+
+# Number of CPU cores shared by the workers, 0 to use every core available
+# to the process.
+CPU_CORES = int(get_setting("CPU_CORES", "0"))
+
+# Threads of torch, OpenCV and Tesseract in each worker, 0 to derive them
+# from the number of cores and workers.
+TORCH_THREADS = int(get_setting("TORCH_THREADS", "0"))
+OPENCV_THREADS = int(get_setting("OPENCV_THREADS", "0"))
+TESSERACT_THREADS = int(get_setting("TESSERACT_THREADS", "0"))
+
+# OCR engine of the road signs, "tesserocr" to keep Tesseract loaded in the
+# process, "pytesseract" to start a tesseract process per sign, or "auto" to
+# use tesserocr when it is installed.
+OCR_BACKEND = get_setting("OCR_BACKEND", "auto")
+
+# Tesseract languages used to read the road signs, such as "eng+fra".
+OCR_LANGUAGES = get_setting("OCR_LANGUAGES", "eng")
+
+# Directory of the Tesseract language data used by tesserocr, "" for the
+# default directory of Tesseract.
+TESSDATA_PATH = get_setting("TESSDATA_PATH", "")
+
+# Whether to read all the road signs of an image with a single OCR call on a
+# montage of the signs, "1" to enable it.
+OCR_MONTAGE = get_setting("OCR_MONTAGE", "0") == "1"
+
+# Executor analyzing the road signs of an image, "serial", "thread" or
+# "process".
+SIGN_EXECUTOR = get_setting("SIGN_EXECUTOR", "serial")
+
+# Number of threads or processes analyzing the road signs of an image, 0 to
+# use the cores of the worker.
+SIGN_WORKERS = int(get_setting("SIGN_WORKERS", "0"))
+
+# Fraction of the smaller of two road sign boxes that they must share to be
+# merged into a single sign before reading it, 0 to keep every box.
+SIGN_MERGE_OVERLAP = float(get_setting("SIGN_MERGE_OVERLAP", "0.5"))
+
+# Number of road signs whose languages are kept in the cache, 0 to disable
+# the cache.
+SIGN_CACHE_SIZE = int(get_setting("SIGN_CACHE_SIZE", "256"))
+
+# Thresholds of the quality gate of the road sign crops, a crop below one of
+# them is not read, 0 to disable a threshold: size of the smaller side in
+# pixels, variance of the Laplacian, and fraction of the pixels on an edge.
+SIGN_MIN_SIZE = int(get_setting("SIGN_MIN_SIZE", "12"))
+SIGN_MIN_SHARPNESS = float(get_setting("SIGN_MIN_SHARPNESS", "20"))
+SIGN_MIN_EDGE_DENSITY = float(get_setting("SIGN_MIN_EDGE_DENSITY", "0.01"))
+
+# Whether to read only the text lines of the road signs, without their
+# pictograms and borders, "1" to enable it.
+TEXT_REGIONS = get_setting("TEXT_REGIONS", "0") == "1"
+
+# Whether to read the road signs with the Tesseract languages of the most
+# likely countries only, "1" to enable it.
+OCR_SCRIPT_SELECTION = get_setting("OCR_SCRIPT_SELECTION", "0") == "1"
+
+# Number of most likely countries whose languages are read by the OCR.
+OCR_TOP_COUNTRIES = int(get_setting("OCR_TOP_COUNTRIES", "5"))
+
+# Minimum share of the probability held by the most likely countries for
+# their languages to be used.
+OCR_SCRIPT_CONFIDENCE = float(get_setting("OCR_SCRIPT_CONFIDENCE", "0.5"))
+
+# Maximum number of Tesseract languages chosen from the countries.
+OCR_MAX_LANGUAGES = int(get_setting("OCR_MAX_LANGUAGES", "3"))
+
+# Average confidence, between 0 and 100, below which a sign read with the
+# languages of the countries is read again with OCR_LANGUAGES.
+OCR_MIN_CONFIDENCE = float(get_setting("OCR_MIN_CONFIDENCE", "60"))
+
+# Directory where the intermediate images of a sample of the requests are
+# written, in a directory per request, empty to write none.
+DEBUG_DIRECTORY = get_setting("DEBUG_DIRECTORY", "")
+
+# Fraction of the requests whose intermediate images are written.
+DEBUG_SAMPLE_RATE = float(get_setting("DEBUG_SAMPLE_RATE", "1"))
+
+# Pixels counted in the color histograms: "full" for every pixel, "stride"
+# for one pixel every COLOR_SAMPLING_STEP on each axis, "random" for as many
+# random pixels, "downscale" for the image downscaled COLOR_SAMPLING_STEP
+# times.
+COLOR_SAMPLING = get_setting("COLOR_SAMPLING", "full")
+
+# Step of the sampling of the pixels of the color histograms.
+COLOR_SAMPLING_STEP = int(get_setting("COLOR_SAMPLING_STEP", "4"))
+
+# Directory of the nearest neighbour index of the color histograms of
+# labelled images, built by tools/build_color_index, empty to compare the
+# images with the average profile of each country.
+COLOR_INDEX = get_setting("COLOR_INDEX", "")
+
+# Number of nearest images voting for their country in the color index.
+COLOR_INDEX_NEIGHBOURS = int(get_setting("COLOR_INDEX_NEIGHBOURS", "25"))
+
+# Directory of the color profiles of geohash cells, built by
+# tools/build_color_cells, empty to compare the images with the average
+# profile of each country. Not used when COLOR_INDEX is set.
+COLOR_CELLS = get_setting("COLOR_CELLS", "")
+
+# Size of the pixels of the heat grid of the color cells, in degrees.
+COLOR_HEAT_GRID_DEGREES = float(get_setting("COLOR_HEAT_GRID_DEGREES", "5"))
@@ -0,0 +1,199 @@
+"""! @brief Debug images of the intermediate steps of the analysis.
+
+The intermediate images of the preprocessing of the road signs help to
+understand why a sign was misread, but writing them in the analysis would
+slow every request down. When the DEBUG_DIRECTORY setting is set, a sample of
+the requests, chosen with the DEBUG_SAMPLE_RATE setting, get their own
+directory, and their images are handed to a background thread that writes
+them to disk. When the queue of the thread is full, the images are dropped
+instead of waiting.
+
+A request is opened with debug_request, and the images of each road sign are
+written with the prefix of its debug scope:
+
+    with debug_request():
+        save_debug_image("stretched", image)
+"""
+
+import contextlib
+import contextvars
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Iterator, NamedTuple
+import cv2
+import numpy as np
+import numpy.typing as npt
+from geotrouvetout import config
+
+# Maximum number of images waiting to be written.
+DEBUG_QUEUE_SIZE = 256
+
+
+class DebugScope(NamedTuple):
+    """! Where the debug images of a part of a request are written."""
+
+    # Directory of the request.
+    directory: str
+    # Prefix of the names of the images, such as "sign_00_".
+    prefix: str
+
+
+_scope: contextvars.ContextVar[DebugScope | None] = contextvars.ContextVar(
+    "debug_scope", default=None
+)
+
+_queue: "queue.Queue[tuple[str, npt.NDArray[Any]]]" = queue.Queue(
+    DEBUG_QUEUE_SIZE
+)
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+_counters = {"written": 0, "dropped": 0}
+
+
+@contextlib.contextmanager
+def debug_request(name: str | None = None) -> Iterator[DebugScope | None]:
+    """! Open a request whose debug images may be written.
+
+    The request is kept with a probability of DEBUG_SAMPLE_RATE, and its
+    images are written to a new directory of DEBUG_DIRECTORY.
+
+    @param name The name of the request, appended to its directory.
+    @return The scope of the request, None if its images are not written.
+    """
+    if not config.DEBUG_DIRECTORY or random.random() >= float(
+        config.DEBUG_SAMPLE_RATE
+    ):
+        yield None
+        return
+
+    directory_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    if name:
+        directory_name += f"-{name}"
+    scope = DebugScope(
+        os.path.join(config.DEBUG_DIRECTORY, directory_name), ""
+    )
+
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def get_debug_scopes(count: int, name: str) -> list[DebugScope | None]:
+    """! Create a scope for each part of the current request.
+
+    @param count The number of parts, such as the road signs of the image.
+    @param name The name of the parts, used in the prefix of their images.
+    @return A list with the scope of each part, None if the images of the
+    current request are not written.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return [None] * count
+
+    return [
+        scope._replace(prefix=f"{scope.prefix}{name}_{index:02}_")
+        for index in range(count)
+    ]
+
+
+def call_in_debug_scope(
+    function: Callable[[Any], Any], item: tuple[DebugScope | None, Any]
+) -> Any:
+    """! Call a function in a debug scope.
+
+    The scope is given with the item so that the function can run in a pool
+    of threads or processes, which do not share the context of the request.
+
+    @param function The function, taking a single argument.
+    @param item The scope and the argument of the function.
+    @return The result of the function.
+    """
+    scope, argument = item
+    token = _scope.set(scope)
+    try:
+        return function(argument)
+    finally:
+        _scope.reset(token)
+        # the workers of a process pool exit without running the handlers
+        # that would write the images left in the queue
+        if scope is not None and multiprocessing.parent_process() is not None:
+            flush_debug_images()
+
+
+def save_debug_image(name: str, image: npt.NDArray[Any]) -> None:
+    """! Write an intermediate image of the current request in the background.
+
+    Does nothing when the images of the current request are not written.
+
+    @param name The name of the image, such as "edges".
+    @param image A grayscale or RGB numpy image, of integers or of floats
+    between 0 and 1.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return
+
+    _start_writer()
+    path = os.path.join(scope.directory, f"{scope.prefix}{name}.png")
+    try:
+        # the analysis may go on modifying the image
+        _queue.put_nowait((path, np.array(image)))
+    except queue.Full:
+        _counters["dropped"] += 1
+
+
+def flush_debug_images() -> None:
+    """! Wait until every debug image of the queue is written."""
+    if _writer is not None:
+        _queue.join()
+
+
+def get_debug_stats() -> dict[str, int]:
+    """! Get the counters of the debug images.
+
+    @return A dictionary with the number of images written, dropped because
+    the queue was full, and waiting in the queue.
+    """
+    return {**_counters, "queued": _queue.qsize()}
+
+
+def _start_writer() -> None:
+    """! Start the thread writing the debug images, once per process."""
+    global _writer
+
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(
+                target=_write_images, name="debug-writer", daemon=True
+            )
+            _writer.start()
+
+
+def _write_images() -> None:
+    """! Write the images of the queue, forever."""
+    while True:
+        path, image = _queue.get()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if image.dtype.kind == "f":
+                image = np.clip(image * 255, 0, 255).astype(np.uint8)
+            elif image.dtype == bool:
+                image = image.astype(np.uint8) * 255
+            if image.ndim == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            if cv2.imwrite(path, image):
+                _counters["written"] += 1
+            else:
+                logging.info(f"Cannot write the debug image {path}")
+        except (OSError, cv2.error) as e:
+            logging.info(f"Cannot write the debug image {path}: {e}")
+        finally:
+            _queue.task_done()
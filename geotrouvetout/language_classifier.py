@@ -0,0 +1,232 @@
+"""! @brief Character n-gram language classifier of the road sign texts.
+
+langdetect scores the 55 languages of its profiles by sampling random
+n-grams of the text, which is slow and gives different results from one run
+to the next. This classifier is built once from the same profiles, limited
+to the languages spoken in the countries of stats/country_metadata.json, and
+scores every n-gram of a batch of texts at once, so its output is
+deterministic.
+
+The score of a language is the naive Bayes log-likelihood of the n-grams of
+the text, with the smoothing of langdetect, and the probabilities are the
+softmax of the scores.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import NamedTuple
+import numpy as np
+import numpy.typing as npt
+import langdetect
+from langdetect.utils.ngram import NGram
+from langdetect.utils.unicode_block import unicode_block
+
+# Metadata of the countries, with the languages spoken in each of them.
+COUNTRY_METADATA_FILE = "stats/country_metadata.json"
+
+# Directory of the langdetect profiles.
+PROFILES_DIRECTORY = os.path.join(
+    os.path.dirname(langdetect.__file__), "profiles"
+)
+
+# Profiles merged into a single language of the metadata.
+PROFILE_LANGUAGES = {"zh-cn": "zh", "zh-tw": "zh"}
+
+# Smoothing of the probability of an n-gram, as in langdetect.
+SMOOTHING = 0.5 / 10000
+
+# Minimum probability of a language to be returned, as in langdetect.
+PROBABILITY_THRESHOLD = 0.1
+
+_URL_RE = re.compile(r"https?://[-_.?&~;+=/#0-9A-Za-z]{1,2076}")
+_MAIL_RE = re.compile(
+    r"[-_.0-9A-Za-z]{1,64}@[-_0-9A-Za-z]{1,255}[-_.0-9A-Za-z]{1,255}"
+)
+
+
+class LanguageModel(NamedTuple):
+    """! N-gram log-likelihoods of the languages of the classifier."""
+
+    # Lower case ISO 639-1 codes of the languages.
+    languages: list[str]
+    # Index of each n-gram in the rows of the log-likelihoods.
+    ngrams: dict[str, int]
+    # Matrix of shape (n-grams, languages).
+    log_likelihoods: npt.NDArray[np.float32]
+
+
+_model: LanguageModel | None = None
+_model_lock = threading.Lock()
+
+
+def get_language_model() -> LanguageModel:
+    """! Get the language model, building it on first use.
+
+    @return The language model, shared by the whole process.
+    """
+    global _model
+
+    with _model_lock:
+        if _model is None:
+            _model = build_language_model()
+
+    return _model
+
+
+def build_language_model(
+    country_metadata_file: str = COUNTRY_METADATA_FILE,
+    profiles_directory: str = PROFILES_DIRECTORY,
+) -> LanguageModel:
+    """! Build the language model from the langdetect profiles.
+
+    Only the profiles of the languages spoken in the countries of the
+    metadata are loaded.
+
+    @param country_metadata_file The path to the JSON file with the languages
+    of each country.
+    @param profiles_directory The directory of the langdetect profiles.
+    @return The language model.
+    """
+    logging.info("build_language_model")
+
+    with open(country_metadata_file, "r", encoding="utf-8") as file:
+        country_metadata = json.load(file)
+    spoken = {
+        language.lower()
+        for metadata in country_metadata.values()
+        for language in metadata["languages"]
+    }
+
+    # merge the frequencies of the profiles of each language
+    frequencies: dict[str, dict[str, int]] = {}
+    totals: dict[str, npt.NDArray[np.int64]] = {}
+    for profile in sorted(os.listdir(profiles_directory)):
+        language = PROFILE_LANGUAGES.get(profile, profile)
+        if language not in spoken:
+            continue
+        with open(
+            os.path.join(profiles_directory, profile), "r", encoding="utf-8"
+        ) as file:
+            data = json.load(file)
+        language_frequencies = frequencies.setdefault(language, {})
+        for ngram, count in data["freq"].items():
+            language_frequencies[ngram] = (
+                language_frequencies.get(ngram, 0) + count
+            )
+        totals[language] = totals.get(language, 0) + np.array(
+            data["n_words"], dtype=np.int64
+        )
+
+    languages = sorted(frequencies)
+    ngrams = sorted({ngram for item in frequencies.values() for ngram in item})
+    ngram_indices = {ngram: index for index, ngram in enumerate(ngrams)}
+
+    # probability of each n-gram among the n-grams of the same length
+    probabilities = np.zeros((len(ngrams), len(languages)))
+    for column, language in enumerate(languages):
+        for ngram, count in frequencies[language].items():
+            probabilities[ngram_indices[ngram], column] = (
+                count / totals[language][len(ngram) - 1]
+            )
+
+    log_likelihoods = np.log(probabilities + SMOOTHING).astype(np.float32)
+
+    return LanguageModel(languages, ngram_indices, log_likelihoods)
+
+
+def classify_languages(texts: list[str]) -> list[dict[str, float]]:
+    """! Detect the languages of several texts at once.
+
+    @param texts The texts to classify.
+    @return A list with, for each text, a dictionary with the languages of
+    probability above PROBABILITY_THRESHOLD and their probability, empty for
+    a text without any known n-gram.
+    """
+    logging.info("classify_languages")
+
+    model = get_language_model()
+
+    # index of the n-grams of every text, with the text they belong to
+    rows = []
+    columns = []
+    for row, text in enumerate(texts):
+        for ngram in extract_ngrams(text):
+            index = model.ngrams.get(ngram)
+            if index is not None:
+                rows.append(row)
+                columns.append(index)
+
+    # sum the log-likelihoods of the n-grams of each text in a single pass
+    scores = np.zeros((len(texts), len(model.languages)))
+    np.add.at(
+        scores, np.array(rows, dtype=np.intp), model.log_likelihoods[columns]
+    )
+
+    # softmax of the scores of each text
+    scores -= scores.max(axis=1, keepdims=True)
+    probabilities = np.exp(scores)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+    has_ngrams = np.bincount(rows, minlength=len(texts)) > 0
+    results = []
+    for row_probabilities, known in zip(probabilities, has_ngrams):
+        if not known:
+            results.append({})
+            continue
+        results.append(
+            {
+                language: float(probability)
+                for language, probability in zip(
+                    model.languages, row_probabilities
+                )
+                if probability > PROBABILITY_THRESHOLD
+            }
+        )
+
+    return results
+
+
+def extract_ngrams(text: str) -> list[str]:
+    """! Extract the character n-grams of a text, as langdetect does.
+
+    Words written in capital letters, which are common on road signs, are
+    lowered, since langdetect skips the n-grams of capitalized words.
+
+    @param text The text.
+    @return The 1, 2 and 3-grams of the text.
+    """
+    text = _URL_RE.sub(" ", text)
+    text = _MAIL_RE.sub(" ", text)
+    text = " ".join(
+        word.lower() if len(word) > 1 and word.isupper() else word
+        for word in text.split()
+    )
+    text = NGram.normalize_vi(text)
+
+    # remove the latin characters of a text mostly in another alphabet
+    latin_count = sum(1 for char in text if "A" <= char <= "z")
+    non_latin_count = sum(
+        1
+        for char in text
+        if char >= "̀" and unicode_block(char) != "Latin Extended Additional"
+    )
+    if latin_count * 2 < non_latin_count:
+        text = "".join(char for char in text if char < "A" or "z" < char)
+
+    ngrams = []
+    ngram = NGram()
+    for char in text:
+        ngram.add_char(char)
+        if ngram.capitalword:
+            continue
+        for length in range(1, NGram.N_GRAM + 1):
+            if len(ngram.grams) < length:
+                break
+            gram = ngram.grams[-length:]
+            if gram and gram != " ":
+                ngrams.append(gram)
+
+    return ngrams
@@ -4,19 +4,73 @@ Module.
 Module.
 """
 
+import functools
+import hashlib
 import logging
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict
 import numpy as np
 import numpy.typing as npt
 import cv2
-import pytesseract
-from langdetect import detect_langs
 from PIL import Image
-from ultralytics import YOLO
-from typing import Any
-
-
-def get_languages(image: Image.Image) -> dict[str, float]:
+from typing import Any, Callable
+from geotrouvetout import config
+from geotrouvetout.debug import (
+    call_in_debug_scope,
+    get_debug_scopes,
+    save_debug_image,
+)
+from geotrouvetout.language_classifier import classify_languages
+from geotrouvetout.object_detection import (
+    DETECTOR_WEIGHTS,
+    detect_crops_batch,
+)
+from geotrouvetout.ocr import Word, recognize_montage, recognize_words
+from geotrouvetout.resources import get_thread_layout, map_executor
+from geotrouvetout.sign_quality import (
+    add_analyzed_signs,
+    filter_readable_signs,
+)
+
+# Height range of a character, in pixels and as a fraction of the height of
+# the processed sign.
+TEXT_CHARACTER_MIN_HEIGHT = 6
+TEXT_CHARACTER_MAX_HEIGHT = 0.8
+
+# Maximum width of a character, as a fraction of the width of the processed
+# sign and as a multiple of its height.
+TEXT_CHARACTER_MAX_WIDTH = 0.5
+TEXT_CHARACTER_MAX_ASPECT = 3
+
+# Range of the fraction of the box of a character covered by its pixels.
+TEXT_CHARACTER_FILL = (0.1, 0.9)
+
+# Minimum number of characters of a text line.
+TEXT_LINE_MIN_CHARACTERS = 2
+
+# White space kept around a text line, in pixels.
+TEXT_LINE_MARGIN = 4
+
+# Size (width, height) of the grayscale thumbnail identifying a road sign
+# in the cache, and number of its gray levels.
+SIGN_KEY_SIZE = (32, 8)
+SIGN_KEY_LEVELS = 3
+
+# Step of the buckets of the sizes of the road sign crops in the cache keys,
+# in pixels.
+SIGN_KEY_SHAPE_STEP = 8
+
+_sign_cache: "OrderedDict[str, dict[str, float]]" = OrderedDict()
+_sign_cache_lock = threading.Lock()
+_sign_cache_counters = {"hits": 0, "misses": 0}
+
+
+def get_languages(
+    image: Image.Image,
+    sign_images: list[npt.NDArray[np.uint8]] | None = None,
+    ocr_lang: str | None = None,
+) -> dict[str, float]:
     """
     Get information about language present in an image.
 
@@ -24,14 +78,23 @@ def get_languages(image: Image.Image) -> dict[str, float]:
     their average confidence.
 
     @param image PIL Image object representing the image to be analyzed
+    @param sign_images Cropped images of the road signs already detected in
+    the image, None to detect them here.
+    @param ocr_lang The Tesseract languages to read the signs with, such as
+    the ones chosen by select_ocr_languages, None for the OCR_LANGUAGES
+    setting.
     @return A dictionary with the detected languages and their average
     confidence in the image. They keys are 2 letter language codes and the
     values are between 0 and 1.
     """
     logging.info("get_languages")
 
-    # detect road signs in the image using YOLO
-    detected_signs = detect_road_signs(image)
+    # detect road signs in the image using YOLO, unless they were already
+    # detected by the combined detection
+    if sign_images is None:
+        detected_signs = detect_road_signs(image)
+    else:
+        detected_signs = sign_images
 
     # initialize dictionaries to keep track of total confidence of count for
     # each detected language
@@ -43,33 +106,51 @@ def get_languages(image: Image.Image) -> dict[str, float]:
 starting analysis"
     )
 
-    # iterate through each detected sign and analyze the text in each
-    for sign_image in detected_signs:
-        try:
-            # process the sign image to prepare it for text detection
-            processed_image = process_image(sign_image)
-
-            # detect text and confidences in the processed image
-            text_and_confidences = detect_text(processed_image)
-
-            # log the text detected for debugging purposes
-            for text, conf in text_and_confidences.items():
-                logging.info(f"Text detected : {text}, {int(conf)}%")
-
-            # detect the languages in the text and their respective confidences
-            language_detected = detect_languages(text_and_confidences)
-
-            # combine the detected languages and compute the toatl confidence
-            # and count for each
-            for lang, conf in language_detected.items():
-                if lang in detected_languages_total_conf:
-                    detected_languages_total_conf[lang] += conf
-                    detected_languages_count[lang] += 1
-                else:
-                    detected_languages_total_conf[lang] = conf
-                    detected_languages_count[lang] = 1
-        except ValueError as e:
-            logging.info(e)
+    # skip the signs too small, blurred or flat to be read
+    readable = filter_readable_signs(detected_signs)
+    readable_signs = [
+        sign_image
+        for sign_image, is_readable in zip(detected_signs, readable)
+        if is_readable
+    ]
+
+    # the signs already seen are read from the cache, the others are analyzed
+    # together, and the results keep the order of the signs so that the
+    # averages do not depend on the cache
+    # the signs read with other languages may give other results
+    keys = [
+        (
+            get_sign_key(sign_image)
+            if ocr_lang is None
+            else f"{ocr_lang}:{get_sign_key(sign_image)}"
+        )
+        for sign_image in readable_signs
+    ]
+    languages_detected = get_cached_signs(keys)
+    missing = [
+        index
+        for index, language_detected in enumerate(languages_detected)
+        if language_detected is None
+    ]
+    start = time.perf_counter()
+    missing_languages = analyze_signs(
+        [readable_signs[index] for index in missing], ocr_lang
+    )
+    add_analyzed_signs(len(missing), time.perf_counter() - start)
+    for index, language_detected in zip(missing, missing_languages):
+        languages_detected[index] = language_detected
+    set_cached_signs([keys[index] for index in missing], missing_languages)
+
+    # combine the detected languages and compute the toatl confidence and
+    # count for each
+    for language_detected in languages_detected:
+        for lang, conf in (language_detected or {}).items():
+            if lang in detected_languages_total_conf:
+                detected_languages_total_conf[lang] += conf
+                detected_languages_count[lang] += 1
+            else:
+                detected_languages_total_conf[lang] = conf
+                detected_languages_count[lang] = 1
 
     # calculate the average confidence for each detected language
     detected_languages_avg_conf = {}
@@ -81,6 +162,236 @@ starting analysis"
     return detected_languages_avg_conf
 
 
+def analyze_signs(
+    sign_images: list[npt.NDArray[np.uint8]], lang: str | None = None
+) -> list[dict[str, float]]:
+    """
+    Detect the languages of several road signs.
+
+    The signs are analyzed with the executor of the configuration, and read
+    with a single OCR call in the montage mode.
+
+    @param sign_images Numpy images of road signs.
+    @param lang The Tesseract languages, None for the OCR_LANGUAGES setting.
+    @return A list with, for each sign, a dictionary with the detected
+    languages and their confidence, in the order of the signs.
+    """
+    workers = get_thread_layout().sign_workers
+    if not config.OCR_MONTAGE:
+        function = analyze_sign
+        if lang is not None:
+            function = functools.partial(analyze_sign, lang=lang)
+        return map_sign_executor(workers, function, sign_images)
+
+    # the processed signs are read together on a montage
+    processed_images = map_sign_executor(workers, process_sign, sign_images)
+    processed = [
+        index
+        for index, processed_image in enumerate(processed_images)
+        if processed_image is not None
+    ]
+    texts = detect_texts(
+        [processed_images[index] for index in processed], lang
+    )
+
+    languages_detected: list[dict[str, float]] = [{} for _ in sign_images]
+    for index, text_and_confidences in zip(processed, texts):
+        languages_detected[index] = get_text_languages(text_and_confidences)
+
+    return languages_detected
+
+
+def map_sign_executor(
+    workers: int,
+    function: Callable[[npt.NDArray[np.uint8]], Any],
+    sign_images: list[npt.NDArray[np.uint8]],
+) -> list[Any]:
+    """
+    Apply a function to every road sign with the executor of the configuration.
+
+    When the debug images of the request are written, each sign is given its
+    own debug scope, so that its images are named after its index.
+
+    @param workers The number of workers of the pool.
+    @param function The function, taking a numpy image of a road sign.
+    @param sign_images Numpy images of road signs.
+    @return The results, in the order of the signs.
+    """
+    scopes = get_debug_scopes(len(sign_images), "sign")
+    if scopes and scopes[0] is not None:
+        return map_executor(
+            config.SIGN_EXECUTOR,
+            workers,
+            functools.partial(call_in_debug_scope, function),
+            list(zip(scopes, sign_images)),
+        )
+
+    return map_executor(config.SIGN_EXECUTOR, workers, function, sign_images)
+
+
+def get_sign_key(sign_image: npt.NDArray[np.uint8]) -> str:
+    """
+    Compute a key identifying the content of a road sign image.
+
+    The crop is normalized as the first step of the sign processing does it,
+    converted to grayscale and stretched, then reduced to a small thumbnail
+    with a few gray levels. Crops of the same sign in consecutive frames or
+    requests, which differ by some noise, thus usually share a key, while the
+    text of another sign changes the thumbnail. The size of the crop, rounded
+    to SIGN_KEY_SHAPE_STEP pixels, is part of the key, so that signs of very
+    different sizes never share a key.
+
+    @param sign_image A numpy image of a road sign.
+    @return A hash of the size bucket and of the thumbnail of the image.
+    """
+    gray = sign_image
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, SIGN_KEY_SIZE, interpolation=cv2.INTER_AREA)
+    thumbnail = cv2.normalize(thumbnail, None, 0, 255, cv2.NORM_MINMAX)
+    levels = (thumbnail.astype(np.int32) * (SIGN_KEY_LEVELS - 1) + 127) // 255
+
+    height, width = sign_image.shape[:2]
+    shape_bucket = (
+        round(height / SIGN_KEY_SHAPE_STEP),
+        round(width / SIGN_KEY_SHAPE_STEP),
+    )
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(shape_bucket).encode())
+    digest.update(levels.astype(np.uint8).tobytes())
+    return digest.hexdigest()
+
+
+def get_cached_signs(keys: list[str]) -> list[dict[str, float] | None]:
+    """
+    Get the languages of the road signs from the cache.
+
+    @param keys The keys of the signs.
+    @return A list with, for each sign, the languages detected in it, or None
+    if it is not in the cache.
+    """
+    if int(config.SIGN_CACHE_SIZE) <= 0:
+        return [None] * len(keys)
+
+    languages_detected: list[dict[str, float] | None] = []
+    with _sign_cache_lock:
+        for key in keys:
+            language_detected = _sign_cache.get(key)
+            if language_detected is None:
+                _sign_cache_counters["misses"] += 1
+            else:
+                _sign_cache.move_to_end(key)
+                _sign_cache_counters["hits"] += 1
+            languages_detected.append(language_detected)
+
+    return languages_detected
+
+
+def set_cached_signs(
+    keys: list[str], languages_detected: list[dict[str, float]]
+) -> None:
+    """
+    Store the languages of road signs in the cache.
+
+    The least recently used signs are removed beyond SIGN_CACHE_SIZE.
+
+    @param keys The keys of the signs.
+    @param languages_detected For each sign, the languages detected in it.
+    """
+    cache_size = int(config.SIGN_CACHE_SIZE)
+    if cache_size <= 0:
+        return
+
+    with _sign_cache_lock:
+        for key, language_detected in zip(keys, languages_detected):
+            _sign_cache[key] = language_detected
+            _sign_cache.move_to_end(key)
+        while len(_sign_cache) > cache_size:
+            _sign_cache.popitem(last=False)
+
+
+def get_sign_cache_stats() -> dict[str, int]:
+    """
+    Get the counters of the road sign cache.
+
+    @return A dictionary with the number of hits and misses since the start
+    of the process, and the number of signs in the cache.
+    """
+    with _sign_cache_lock:
+        return {**_sign_cache_counters, "size": len(_sign_cache)}
+
+
+def clear_sign_cache() -> None:
+    """
+    Remove every road sign from the cache and reset its counters.
+    """
+    with _sign_cache_lock:
+        _sign_cache.clear()
+        _sign_cache_counters["hits"] = 0
+        _sign_cache_counters["misses"] = 0
+
+
+def analyze_sign(
+    sign_image: npt.NDArray[np.uint8], lang: str | None = None
+) -> dict[str, float]:
+    """
+    Detect the languages of a single road sign.
+
+    A sign that cannot be processed is logged and gives no language, so that
+    it does not prevent the analysis of the other signs.
+
+    @param sign_image A numpy image of a road sign.
+    @param lang The Tesseract languages, None for the OCR_LANGUAGES setting.
+    @return A dictionary with the detected languages and their confidence.
+    """
+    try:
+        # process the sign image to prepare it for text detection
+        processed_image = process_image(sign_image)
+
+        # detect text and confidences in the processed image
+        text_and_confidences = detect_text(processed_image, lang)
+
+        return get_text_languages(text_and_confidences)
+    except ValueError as e:
+        logging.info(e)
+        return {}
+
+
+def process_sign(
+    sign_image: npt.NDArray[np.uint8],
+) -> npt.NDArray[np.uint8] | None:
+    """
+    Process a road sign image, logging the failures.
+
+    @param sign_image A numpy image of a road sign.
+    @return The processed image, None if the sign could not be processed.
+    """
+    try:
+        return process_image(sign_image)
+    except ValueError as e:
+        logging.info(e)
+        return None
+
+
+def get_text_languages(
+    text_and_confidences: dict[str, float],
+) -> dict[str, float]:
+    """
+    Detect the languages of the text read on a road sign.
+
+    @param text_and_confidences A dictionary with the text read on the sign
+    and its confidence.
+    @return A dictionary with the detected languages and their confidence.
+    """
+    # log the text detected for debugging purposes
+    for text, conf in text_and_confidences.items():
+        logging.info(f"Text detected : {text}, {int(conf)}%")
+
+    # detect the languages in the text and their respective confidences
+    return detect_languages(text_and_confidences)
+
+
 def detect_road_signs(image: Image.Image) -> list[npt.NDArray[np.uint8]]:
     """
     Get list of road signs image present on the image.
@@ -93,22 +404,13 @@ def detect_road_signs(image: Image.Image) -> list[npt.NDArray[np.uint8]]:
     """
     logging.info("detect_road_signs")
 
-    # load YOLO model and set confidence threshold
-    model = YOLO("weights/traffic_sign.pt")
-    model.conf = 0.25
-
-    # detect road signs in the image
-    results = model(image)
-
-    # crop each sign into its own image
-    cropped_images = []
-    for result in results:
-        for box in result.boxes:
-            for xyxy in box.xyxy:
-                x1, y1, x2, y2 = xyxy
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                cropped_image = image.crop((x1, y1, x2, y2))
-                cropped_images.append(np.array(cropped_image))
+    # detect road signs in the image, each sign is a view of the image
+    cropped_images = detect_crops_batch(
+        DETECTOR_WEIGHTS["traffic_sign"],
+        [image],
+        tiled=config.SIGN_TILING,
+        merge=True,
+    )[0]
 
     return cropped_images
 
@@ -127,15 +429,19 @@ def process_image(image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
     # TODO: this still needs to be fixed for mypy
     logging.info("preprocess_images")
 
+    save_debug_image("sign", image)
+
     # stretched_image
     stretched_image = first_process(image)
-    cv2.imwrite("img/1.png", stretched_image)
+    save_debug_image("stretched", stretched_image)
 
     # get edges
     edges = get_edges(stretched_image)
+    save_debug_image("edges", edges)
 
     # get large connected component image
     component_image = get_component_images(edges)
+    save_debug_image("components", component_image)
 
     # get contour for shape approximation
     contour_image = get_contour(component_image)
@@ -148,9 +454,16 @@ def process_image(image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
         warped_image, warped_background = correct_perspective(
             stretched_image, component_image, quad
         )
+        save_debug_image("warped", warped_image)
 
         # final processing to clean up the image
         final = final_process(warped_image, warped_background)
+        save_debug_image("final", final)
+
+        # keep only the text lines, without the pictograms and the borders
+        if config.TEXT_REGIONS:
+            final = crop_text_regions(final)
+            save_debug_image("text", final)
 
         return final
 
@@ -230,37 +543,16 @@ def get_component_images(
     # get the connected components
     _, labels, stats, _ = cv2.connectedComponentsWithStats(inverted_image)
 
-    # ensure stats is a list of tuples of integers
-    # assert isinstance(stats, np.ndarray)
-    # assert stats.ndim == 2
-    # assert stats.shape[1] >= 5
-    stats = stats.tolist()
-    stats = [(i,) + tuple(x) for i, x in enumerate(stats)]
-
-    # sort connected component
-    stats = sorted(
-        stats[1:], key=lambda x: x[cv2.CC_STAT_AREA + 1], reverse=True
-    )
-
-    # find largest connected component
-    largest_area = stats[0][cv2.CC_STAT_AREA + 1]
+    # the first component is the background
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    if len(areas) == 0:
+        raise ValueError("No connected component found.")
 
     # create new connected component image that contain all connected component
-    # bigger than 50% of the biggest
-    component_image = np.zeros_like(inverted_image, dtype=np.uint8)
-    for stat in stats:
-        label = stat[0]
-        area = stat[cv2.CC_STAT_AREA + 1]
-        if area >= largest_area * 0.5:
-            component_image[labels == label] = 255
-
-    # find small holes
-    kernel = np.ones((5, 5), np.uint8)
-    filled = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
-    filled = fill_holes(filled)
-
-    # assert for type safety
-    # assert isinstance(filled, np.ndarray) and filled.dtype == np.uint8, "filled must be of type ndarray[Any, dtype[unsignedinteger[_8Bit]]]"
+    # bigger than 50% of the biggest, with a lookup of the labels to keep
+    keep = np.zeros(len(stats), dtype=bool)
+    keep[1:] = areas >= areas.max() * 0.5
+    component_image = np.where(keep[labels], 255, 0).astype(np.uint8)
 
     return component_image
 
@@ -417,26 +709,201 @@ def final_process(
     return text
 
 
-def detect_text(image: npt.NDArray[np.uint8]) -> dict[str, float]:
+def crop_text_regions(image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    """
+    Keep only the text lines of a processed road sign image.
+
+    The pixels outside of the text lines, such as the pictograms and the
+    borders of the sign, are cleared and the image is cropped around the
+    lines, so that the OCR reads a smaller image with less noise.
+
+    @param image A numpy image with black text on a white background.
+    @raise ValueError If no text line is found.
+    @return The numpy image of the text lines, with black text on a white
+    background.
+    """
+    logging.info("crop_text_regions")
+
+    lines = locate_text_lines(image)
+    if len(lines) == 0:
+        raise ValueError("No text line found.")
+
+    # clear everything outside of the lines
+    text = np.full_like(image, 255)
+    for left, top, right, bottom in lines:
+        text[top:bottom, left:right] = image[top:bottom, left:right]
+
+    left, top = lines[:, :2].min(axis=0)
+    right, bottom = lines[:, 2:].max(axis=0)
+    return text[top:bottom, left:right]
+
+
+def locate_text_lines(image: npt.NDArray[np.uint8]) -> npt.NDArray[np.int64]:
+    """
+    Locate the text lines of a processed road sign image.
+
+    The connected components the size and shape of a character are grouped
+    into lines by a horizontal closing, and the lines of at least
+    TEXT_LINE_MIN_CHARACTERS characters are kept.
+
+    @param image A numpy image with black text on a white background.
+    @return An array of shape (lines, 4) with the boxes of the lines, as
+    (left, top, right, bottom), with a margin of TEXT_LINE_MARGIN pixels.
+    """
+    logging.info("locate_text_lines")
+
+    height, width = image.shape[:2]
+    ink = (image < 128).astype(np.uint8)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(ink)
+
+    # characters are neither tiny, nor as large as the sign, nor filled like
+    # a pictogram, nor thin like a border
+    stats = stats[1:]
+    widths = stats[:, cv2.CC_STAT_WIDTH]
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    fill = stats[:, cv2.CC_STAT_AREA] / (widths * heights)
+    characters = (
+        (heights >= TEXT_CHARACTER_MIN_HEIGHT)
+        & (heights <= height * TEXT_CHARACTER_MAX_HEIGHT)
+        & (widths <= width * TEXT_CHARACTER_MAX_WIDTH)
+        & (widths <= heights * TEXT_CHARACTER_MAX_ASPECT)
+        & (fill >= TEXT_CHARACTER_FILL[0])
+        & (fill <= TEXT_CHARACTER_FILL[1])
+    )
+    if not characters.any():
+        return np.zeros((0, 4), dtype=np.int64)
+
+    keep = np.zeros(count, dtype=bool)
+    keep[1:] = characters
+    character_image = keep[labels].astype(np.uint8)
+
+    # join the characters of a line, spaced by less than a character height
+    character_height = int(np.median(heights[characters]))
+    kernel = np.ones((1, max(1, character_height)), dtype=np.uint8)
+    line_image = cv2.morphologyEx(character_image, cv2.MORPH_CLOSE, kernel)
+    _, line_labels, line_stats, _ = cv2.connectedComponentsWithStats(
+        line_image
+    )
+
+    # the closing keeps every pixel of the characters, so all the pixels of a
+    # character are in the same line
+    character_pixels = character_image.astype(bool)
+    character_lines = np.zeros(count, dtype=np.int64)
+    character_lines[labels[character_pixels]] = line_labels[character_pixels]
+    character_counts = np.bincount(
+        character_lines[1:][characters], minlength=len(line_stats)
+    )
+
+    lines = line_stats[1:][character_counts[1:] >= TEXT_LINE_MIN_CHARACTERS]
+    left = np.maximum(lines[:, cv2.CC_STAT_LEFT] - TEXT_LINE_MARGIN, 0)
+    top = np.maximum(lines[:, cv2.CC_STAT_TOP] - TEXT_LINE_MARGIN, 0)
+    right = np.minimum(
+        lines[:, cv2.CC_STAT_LEFT]
+        + lines[:, cv2.CC_STAT_WIDTH]
+        + TEXT_LINE_MARGIN,
+        width,
+    )
+    bottom = np.minimum(
+        lines[:, cv2.CC_STAT_TOP]
+        + lines[:, cv2.CC_STAT_HEIGHT]
+        + TEXT_LINE_MARGIN,
+        height,
+    )
+
+    return np.stack([left, top, right, bottom], axis=1).astype(np.int64)
+
+
+def detect_text(
+    image: npt.NDArray[np.uint8], lang: str | None = None
+) -> dict[str, float]:
     """
     Detect the text in the given image.
 
     Detects the text in the given image and returns the text and corresponding
-    confidence values.
+    confidence values. A text read with restricted languages and a low
+    confidence is read again with the OCR_LANGUAGES setting.
 
     @param image A numpy array representing the image in the format of a 2D
     array of pixels.
+    @param lang The Tesseract languages, None for the OCR_LANGUAGES setting.
     """
     logging.info("detect_text")
 
-    # use pytesseract to get detected text
-    data = pytesseract.image_to_data(
-        image, output_type=pytesseract.Output.DICT
+    # read the words with the ocr engine of the thread, or tesseract
+    words = recognize_words(image, lang)
+    text_and_confidences = get_text_and_confidences(words)
+
+    if needs_broad_reading(text_and_confidences, lang):
+        logging.info(f"Low confidence with {lang}, reading the text again")
+        text_and_confidences = get_text_and_confidences(recognize_words(image))
+
+    return text_and_confidences
+
+
+def detect_texts(
+    images: list[npt.NDArray[np.uint8]], lang: str | None = None
+) -> list[dict[str, float]]:
+    """
+    Detect the text in several images.
+
+    With the OCR_MONTAGE setting, the images are read with a single OCR call
+    on a montage of all of them, otherwise each image is read on its own.
+
+    @param images Numpy arrays representing the images in the format of 2D
+    arrays of pixels.
+    @param lang The Tesseract languages, None for the OCR_LANGUAGES setting.
+    @return A list with, for each image, the text and corresponding
+    confidence values.
+    """
+    logging.info("detect_texts")
+
+    if not config.OCR_MONTAGE or len(images) < 2:
+        return [detect_text(image, lang) for image in images]
+
+    texts = [
+        get_text_and_confidences(words)
+        for words in recognize_montage(images, lang)
+    ]
+
+    # the images read with a low confidence are read again on their own
+    return [
+        detect_text(image) if needs_broad_reading(text, lang) else text
+        for image, text in zip(images, texts)
+    ]
+
+
+def needs_broad_reading(
+    text_and_confidences: dict[str, float], lang: str | None
+) -> bool:
+    """
+    Check whether a text read with restricted languages must be read again.
+
+    @param text_and_confidences The text read and its confidence.
+    @param lang The Tesseract languages the text was read with.
+    @return True if the text was read with other languages than the
+    OCR_LANGUAGES setting, and is empty or has an average confidence below
+    OCR_MIN_CONFIDENCE.
+    """
+    if lang is None or lang == config.OCR_LANGUAGES:
+        return False
+    if not text_and_confidences:
+        return True
+
+    confidences = list(text_and_confidences.values())
+    return sum(confidences) / len(confidences) < float(
+        config.OCR_MIN_CONFIDENCE
     )
 
-    # create a dictionary from the resulting list
+
+def get_text_and_confidences(words: list[Word]) -> dict[str, float]:
+    """
+    Keep the words read with a confidence.
+
+    @param words The words read by the OCR.
+    @return A dictionary with the text of the words and their confidence.
+    """
     text_and_confidences = {}
-    for text, conf in zip(data["text"], data["conf"]):
+    for text, conf, _ in words:
         if int(conf) > 0 and text.strip():
             text_and_confidences[text] = float(conf)
 
@@ -450,34 +917,34 @@ def detect_languages(
     Detect the language present in the list of texts.
 
     Detects the language present in the list of texts and returns the language
-    confidences as a dictionary.
+    confidences as a dictionary. Every text is classified at once by the
+    n-gram classifier of the languages of the country metadata.
 
     @param text_and_confidences A list of tuples containing the text ot detect
     the languages from and its confidence.
-    @raise Exception An error occured during language detection.
     @return A dictionary where the jeys are the detected languages and the
     values are the confidence scores.
     """
     logging.info("detect_languages")
 
-    # iterate trhough the images to get the languages
-    language_confidences: dict[str, float] = defaultdict(int)
+    # if the text is too small then we just skip it
     min_text_length = 3
-    for text, conf in text_and_confidences.items():
-        # if the text is too small then we just skip it
+    texts = []
+    for text in text_and_confidences:
         if len(text) < min_text_length:
             logging.debug(
                 f"Skipping '{text}' as its length \
                     is below the minimum threshold"
             )
             continue
-        try:
-            # get language
-            lang_detection = detect_langs(text)
-            for lang in lang_detection:
-                language_confidences[lang.lang] += lang.prob * conf * len(text)
-        except Exception as e:
-            logging.info(f"Skipping '{text}' as it caused lang_detect to fail")
+        texts.append(text)
+
+    # get the languages of every text
+    language_confidences: dict[str, float] = defaultdict(int)
+    for text, lang_detection in zip(texts, classify_languages(texts)):
+        conf = text_and_confidences[text]
+        for lang, prob in lang_detection.items():
+            language_confidences[lang] += prob * conf * len(text)
 
     # compute total weight, if we didnt get anything return an empty directory
     total_weight = sum(language_confidences.values())
@@ -492,37 +959,31 @@ def detect_languages(
 
 
 def extract_text(
-    image: npt.NDArray[np.float32], mask: npt.NDArray[np.uint8]
+    image: npt.NDArray[np.uint8], mask: npt.NDArray[np.uint8]
 ) -> npt.NDArray[np.uint8]:
     """
     Extract text from an image using a given mask.
 
     @param image A numpy image representing the input image.
     @param mask A numpy image representing the binary mask.
+    @raise ValueError If the mask is empty.
     @return A numpy image representing the binary image with extracted text.
     """
-    # compute the mean value of the image inside the mask
-    mean = 0
-    total = 0
-    for j in range(image.shape[0]):
-        for i in range(image.shape[1]):
-            if mask[j, i] != 255:
-                continue
-            mean = mean + image[j, i]
-            total = total + 1
-
-    mean = int(np.rint(mean / total))
-
-    # create a binary image by thresholding the image based on the mean value
-    binary = np.zeros_like(image, dtype=np.uint8)
-    for j in range(image.shape[0]):
-        for i in range(image.shape[1]):
-            if mask[j, i] == 255:
-                continue
-            if abs(image[j, i] - mean) > 50:
-                binary[j, i] = 255
-
-    binary = 255 - binary
+    inside = mask == 255
+    total = np.count_nonzero(inside)
+    if total == 0:
+        raise ValueError("Empty mask, no text to extract.")
+
+    # compute the mean value of the image inside the mask, the sum wraps
+    # around in uint8 as in the loops this replaces, so that the signs are
+    # read as before
+    mean = int(np.rint(int(image[inside].sum(dtype=np.int64)) % 256 / total))
+
+    # create a binary image, black for the pixels outside the mask that are
+    # far from the mean value and white elsewhere, the difference wraps
+    # around in uint8 too
+    distance = image.astype(np.uint8) - np.uint8(mean)
+    binary = np.where(~inside & (distance > 50), 0, 255).astype(np.uint8)
 
     # apply morphological closing to the binary image
     kernel = np.ones((3, 3), np.uint8)
@@ -538,39 +999,39 @@ def fill_holes(image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
     """
     Fill holes in a binary image.
 
-    Fills in holes in a binary image by ieterating throught the rows and
-    columns of the image and filling in any white space found between two
-    non-white spaces.
+    Fills in holes in a binary image by filling, on every row and every
+    column, the space between its first and last white pixels.
 
     @param A numpy image containing the binary image.
     @return A numpy image containing the filled binary image.
     """
     logging.info("fill_holes")
 
-    # creating returned image
-    filled = np.zeros_like(image, dtype=np.uint8)
-
-    # Fill holes horizontally
-    for row in range(image.shape[0]):
-        first_white = np.argmax(image[row, :] == 255)
-        last_white = image.shape[1] - np.argmax(image[row, ::-1] == 255) - 1
-        if (
-            first_white < last_white
-            and image[row, first_white] == 255
-            and image[row, last_white] == 255
-        ):
-            filled[row, first_white:last_white] = 255
-
-    # Fill holes vertically
-    for col in range(image.shape[1]):
-        first_white = np.argmax(image[:, col] == 255)
-        last_white = image.shape[0] - np.argmax(image[::-1, col] == 255) - 1
-        if (
-            first_white < last_white
-            and image[first_white, col] == 255
-            and image[last_white, col] == 255
-        ):
-            filled[first_white:last_white, col] = 255
+    white = image == 255
+    height, width = image.shape
+
+    # fill holes horizontally, from the first white pixel of each row up to,
+    # but excluding, its last white pixel
+    first_white = np.argmax(white, axis=1)
+    last_white = width - np.argmax(white[:, ::-1], axis=1) - 1
+    columns = np.arange(width)
+    horizontal = (
+        white.any(axis=1)[:, None]
+        & (columns >= first_white[:, None])
+        & (columns < last_white[:, None])
+    )
+
+    # fill holes vertically, the same way on each column
+    first_white = np.argmax(white, axis=0)
+    last_white = height - np.argmax(white[::-1, :], axis=0) - 1
+    rows = np.arange(height)
+    vertical = (
+        white.any(axis=0)[None, :]
+        & (rows[:, None] >= first_white[None, :])
+        & (rows[:, None] < last_white[None, :])
+    )
+
+    filled = np.where(horizontal | vertical, 255, 0).astype(np.uint8)
 
     # assert for type safety
     # assert isinstance(filled, np.ndarray) and filled.dtype == np.uint8, "filled must be of type ndarray[Any, dtype[unsignedinteger[_8Bit]]]"
@@ -0,0 +1,281 @@
+"""! @brief Process-wide registry of the YOLO models.
+
+Loading a YOLO model deserializes its torch weights from disk, which is
+usually slower than running the inference itself. This module keeps every
+model loaded once per process, behind a lock so that concurrent requests can
+share them, and allows to evict or reload a model explicitly.
+
+The models can also be exported to ONNX, optionally quantized to int8. When
+the onnx backend is selected in the configuration and a converted model
+exists next to the torch weights, the converted model is loaded instead and
+the inference runs through ONNX Runtime.
+"""
+
+import logging
+import os
+import pathlib
+import threading
+from typing import Any, Iterator
+import numpy as np
+from PIL import Image
+from ultralytics import YOLO
+from geotrouvetout import config
+
+# Weights of every model used by the detection methods.
+MODEL_WEIGHTS = [
+    "weights/traffic_sign.pt",
+    "weights/car.pt",
+    "weights/car_brand.pt",
+    "weights/tree.pt",
+]
+
+_models: dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(weights: str) -> Any:
+    """! Get the model for the given weights, loading it on first use.
+
+    @param weights The path to the weights of the model.
+    @return The loaded YOLO model, shared by the whole process.
+    """
+    with _models_lock:
+        model = _models.get(weights)
+        if model is None:
+            model = load_model(weights)
+            _models[weights] = model
+
+    return model
+
+
+def load_model(weights: str) -> Any:
+    """! Load a model from disk with the configured backend.
+
+    @param weights The path to the torch weights of the model.
+    @return The loaded YOLO model, running on ONNX Runtime if the onnx backend
+    is selected and a converted model exists, on torch otherwise.
+    """
+    if config.DETECTION_BACKEND == "onnx":
+        onnx_weights = get_onnx_weights(weights, config.ONNX_QUANTIZATION)
+        if pathlib.Path(onnx_weights).is_file():
+            logging.info(f"loading model {onnx_weights}")
+            return YOLO(onnx_weights)
+        logging.warning(f"No converted model {onnx_weights}, using torch")
+
+    logging.info(f"loading model {weights}")
+    return YOLO(weights)
+
+
+def evict_model(weights: str | None = None) -> None:
+    """! Remove a model from the registry.
+
+    The model will be loaded again from disk the next time it is requested.
+
+    @param weights The path to the weights of the model to evict, None to
+    evict every model.
+    """
+    logging.info("evict_model")
+    with _models_lock:
+        if weights is None:
+            _models.clear()
+        else:
+            _models.pop(weights, None)
+
+
+def reload_model(weights: str) -> Any:
+    """! Reload a model from disk, for instance after its weights changed.
+
+    @param weights The path to the weights of the model.
+    @return The newly loaded YOLO model.
+    """
+    logging.info(f"reloading model {weights}")
+    model = load_model(weights)
+    with _models_lock:
+        _models[weights] = model
+
+    return model
+
+
+def loaded_models() -> list[str]:
+    """! Get the weights of the models currently loaded.
+
+    @return A list with the path to the weights of each loaded model.
+    """
+    with _models_lock:
+        return list(_models)
+
+
+def warm_up_models(weights_list: list[str] | None = None) -> None:
+    """! Load the models and run one dummy inference on each of them.
+
+    The first inference of a model is slower than the following ones, as
+    it has to set up its predictor. Running it once at startup avoids
+    making the first request pay for it. Missing weights are skipped.
+
+    @param weights_list The path to the weights of the models to warm up,
+    None to warm up every model in MODEL_WEIGHTS.
+    """
+    logging.info("warm_up_models")
+
+    if weights_list is None:
+        weights_list = MODEL_WEIGHTS
+
+    dummy_image = Image.new("RGB", (640, 640))
+    for weights in weights_list:
+        if not pathlib.Path(weights).is_file():
+            logging.warning(f"Skipping warm up of {weights}: file not found")
+            continue
+        model = get_model(weights)
+        model(dummy_image, verbose=False)
+
+
+def get_onnx_weights(weights: str, quantization: str = "") -> str:
+    """! Get the path of the converted onnx model for the given weights.
+
+    @param weights The path to the torch weights, for instance
+    "weights/car.pt".
+    @param quantization "" for the float model, "dynamic" or "static" for the
+    int8 models.
+    @return The path to the onnx model, for instance "weights/car.onnx" or
+    "weights/car.dynamic.onnx".
+    """
+    path = pathlib.Path(weights)
+    if quantization:
+        return str(path.with_suffix(f".{quantization}.onnx"))
+    return str(path.with_suffix(".onnx"))
+
+
+def export_onnx(
+    weights: str,
+    quantization: str = "",
+    calibration_images: list[Image.Image] | None = None,
+) -> str:
+    """! Convert torch weights to an onnx model, optionally quantized to int8.
+
+    The model is exported with dynamic input shapes, so that it letterboxes
+    the images like the torch model and accepts batches.
+
+    @param weights The path to the torch weights.
+    @param quantization "" for a float model, "dynamic" for an int8 model with
+    dynamic activation quantization, "static" for an int8 model with
+    activation ranges calibrated on calibration_images.
+    @param calibration_images Representative images used to calibrate the
+    static quantization.
+    @raise ValueError If the quantization is unknown, or if no calibration
+    image is given for the static quantization.
+    @return The path to the exported onnx model.
+    """
+    logging.info(f"export_onnx {weights}")
+
+    if quantization not in ["", "dynamic", "static"]:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+    if quantization == "static" and not calibration_images:
+        raise ValueError("Static quantization needs calibration images")
+
+    model = YOLO(weights)
+    exported = model.export(format="onnx", dynamic=True, simplify=True)
+    output = get_onnx_weights(weights, "")
+    if os.path.abspath(exported) != os.path.abspath(output):
+        os.replace(exported, output)
+
+    if not quantization:
+        return output
+
+    # pylint: disable=import-outside-toplevel
+    from onnxruntime import quantization as ort_quantization
+
+    quantized_output = get_onnx_weights(weights, quantization)
+    if quantization == "dynamic":
+        ort_quantization.quantize_dynamic(
+            output,
+            quantized_output,
+            weight_type=ort_quantization.QuantType.QUInt8,
+        )
+    else:
+        reader = _CalibrationReader(output, calibration_images or [])
+        ort_quantization.quantize_static(
+            output,
+            quantized_output,
+            reader,
+            weight_type=ort_quantization.QuantType.QInt8,
+            activation_type=ort_quantization.QuantType.QUInt8,
+        )
+
+    # the exported model keeps the metadata ultralytics needs to load it
+    _copy_onnx_metadata(output, quantized_output)
+
+    return quantized_output
+
+
+def _letterbox(image: Image.Image, size: int = 640) -> np.ndarray:
+    """! Resize an image in a square keeping its aspect ratio, as YOLO does.
+
+    @param image The image to resize.
+    @param size The side of the square.
+    @return A float32 array of shape (1, 3, size, size) with values between 0
+    and 1, ready to be fed to an exported model.
+    """
+    image = image.convert("RGB")
+    ratio = min(size / image.width, size / image.height)
+    width = int(round(image.width * ratio))
+    height = int(round(image.height * ratio))
+    resized = image.resize((width, height), Image.BILINEAR)
+
+    padded = Image.new("RGB", (size, size), (114, 114, 114))
+    padded.paste(resized, ((size - width) // 2, (size - height) // 2))
+
+    array = np.asarray(padded, dtype=np.float32) / 255.0
+    return array.transpose(2, 0, 1)[np.newaxis]
+
+
+def _copy_onnx_metadata(source: str, destination: str) -> None:
+    """! Copy the metadata properties of an onnx model to another one.
+
+    @param source The path to the onnx model to copy the metadata from.
+    @param destination The path to the onnx model to copy the metadata to.
+    """
+    # pylint: disable=import-outside-toplevel
+    import onnx
+
+    source_model = onnx.load(source)
+    destination_model = onnx.load(destination)
+    del destination_model.metadata_props[:]
+    destination_model.metadata_props.extend(source_model.metadata_props)
+    onnx.save(destination_model, destination)
+
+
+class _CalibrationReader:
+    """! Feed calibration images to the onnx static quantization."""
+
+    def __init__(self, model: str, images: list[Image.Image]):
+        """! Create a reader for the given model and images.
+
+        @param model The path to the float onnx model.
+        @param images The calibration images.
+        """
+        # pylint: disable=import-outside-toplevel
+        import onnxruntime
+
+        session = onnxruntime.InferenceSession(
+            model, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = session.get_inputs()[0].name
+        self.images = images
+        self.iterator: Iterator[Image.Image] | None = None
+
+    def get_next(self) -> dict[str, np.ndarray] | None:
+        """! Get the next calibration input.
+
+        @return A dictionary with the model input, None once every image has
+        been read.
+        """
+        if self.iterator is None:
+            self.iterator = iter(self.images)
+        image = next(self.iterator, None)
+        if image is None:
+            return None
+        return {self.input_name: _letterbox(image)}
+
+    def rewind(self) -> None:
+        """! Restart reading the calibration images from the first one."""
+        self.iterator = None
@@ -0,0 +1,531 @@
+"""! @brief Detection of the objects used by the other methods.
+
+Road signs, cars and trees can either be detected by three separate YOLO
+models, or by a single combined model trained on the three classes. The
+combined model only runs one letterbox resize, one forward pass and one NMS
+for the whole image, and its boxes are then filtered by class for each
+consumer. When no combined weights exist, the per-model detectors are used
+instead.
+
+Several images can be detected at once: they are grouped by size, stacked in
+batches for each detector, and the crops are then fanned back to their source
+image. Images of the same size are letterboxed exactly as they would be
+alone, so the batched detections match the per-image ones.
+
+Crops are not copied: each image is decoded once to an RGB array, shared by
+every detector, and the crops are views of this array, sliced with clipped
+box coordinates.
+
+Small objects, such as distant road signs, can also be detected with tiled
+inference: the image is cut into overlapping tiles that are detected in a
+single batch along with the full image, and the boxes of every tile are
+merged with a non-maximum suppression. The number of tiles is bounded by a
+budget, so that the cost of the detection stays predictable.
+"""
+
+import logging
+import math
+import pathlib
+from typing import Any
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+from geotrouvetout import config
+from geotrouvetout.models import get_model
+
+# Weights of the model detecting every object class in a single pass.
+COMBINED_WEIGHTS = "weights/combined.pt"
+
+# Weights of the per-class models, used when no combined weights exist.
+DETECTOR_WEIGHTS = {
+    "traffic_sign": "weights/traffic_sign.pt",
+    "car": "weights/car.pt",
+    "tree": "weights/tree.pt",
+}
+
+# Confidence threshold of the detectors.
+DETECTION_CONFIDENCE = 0.25
+
+# Intersection over union above which boxes of different tiles are merged.
+TILE_IOU_THRESHOLD = 0.5
+
+
+def has_combined_model() -> bool:
+    """! Check whether the combined detection weights are available.
+
+    @return True if the combined weights exist, False otherwise.
+    """
+    return pathlib.Path(COMBINED_WEIGHTS).is_file()
+
+
+def detect_objects(
+    image: Image.Image, classes: list[str] | None = None
+) -> dict[str, list[npt.NDArray[np.uint8]]]:
+    """! Detect objects of the given classes and crop them from the image.
+
+    Uses the combined model when it is available, and falls back to one
+    model per class otherwise.
+
+    @param image PIL image to be analyzed.
+    @param classes The classes to detect, among the keys of DETECTOR_WEIGHTS,
+    None for every class.
+    @return A dictionary with the classes as keys and the list of RGB crops of
+    the detected objects as values.
+    """
+    logging.info("detect_objects")
+
+    return detect_objects_batch([image], classes)[0]
+
+
+def detect_objects_batch(
+    images: list[Image.Image], classes: list[str] | None = None
+) -> list[dict[str, list[npt.NDArray[np.uint8]]]]:
+    """! Detect objects of the given classes in several images at once.
+
+    @param images PIL images to be analyzed.
+    @param classes The classes to detect, among the keys of DETECTOR_WEIGHTS,
+    None for every class.
+    @return A list with, for each image, a dictionary with the classes as keys
+    and the list of RGB crops of the detected objects as values.
+    """
+    logging.info("detect_objects_batch")
+
+    if classes is None:
+        classes = list(DETECTOR_WEIGHTS)
+
+    # decode each image once for every detector
+    frames = [image_to_array(image) for image in images]
+
+    if has_combined_model():
+        return detect_objects_combined_batch(images, classes, frames)
+
+    objects: list[dict[str, list[npt.NDArray[np.uint8]]]] = [
+        {} for _ in images
+    ]
+    for object_class in classes:
+        crops = detect_crops_batch(
+            DETECTOR_WEIGHTS[object_class],
+            images,
+            frames,
+            tiled=object_class == "traffic_sign" and config.SIGN_TILING,
+            merge=object_class == "traffic_sign",
+        )
+        for image_objects, image_crops in zip(objects, crops):
+            image_objects[object_class] = image_crops
+
+    return objects
+
+
+def detect_objects_combined(
+    image: Image.Image, classes: list[str]
+) -> dict[str, list[npt.NDArray[np.uint8]]]:
+    """! Detect objects of the given classes with the combined model.
+
+    @param image PIL image to be analyzed.
+    @param classes The classes to keep from the detection.
+    @return A dictionary with the classes as keys and the list of RGB crops of
+    the detected objects as values.
+    """
+    logging.info("detect_objects_combined")
+
+    return detect_objects_combined_batch([image], classes)[0]
+
+
+def detect_objects_combined_batch(
+    images: list[Image.Image],
+    classes: list[str],
+    frames: list[npt.NDArray[np.uint8]] | None = None,
+) -> list[dict[str, list[npt.NDArray[np.uint8]]]]:
+    """! Detect objects of the given classes in several images at once.
+
+    @param images PIL images to be analyzed.
+    @param classes The classes to keep from the detection.
+    @param frames The images already decoded by image_to_array, None to
+    decode them here.
+    @return A list with, for each image, a dictionary with the classes as keys
+    and the list of RGB crops of the detected objects as values.
+    """
+    logging.info("detect_objects_combined_batch")
+
+    if frames is None:
+        frames = [image_to_array(image) for image in images]
+
+    objects = []
+    results = predict_batch(COMBINED_WEIGHTS, frames)
+    for frame, result in zip(frames, results):
+        boxes = result.boxes.xyxy.cpu().numpy()
+        box_classes = np.array(
+            [
+                class_key(result.names[int(cls)])
+                for cls in result.boxes.cls.tolist()
+            ],
+            dtype=object,
+        )
+        cropped_images: dict[str, list[npt.NDArray[np.uint8]]] = {}
+        for object_class in classes:
+            class_boxes = boxes[box_classes == object_class]
+            # the overlapping boxes of a road sign are read once
+            if object_class == "traffic_sign":
+                class_boxes = merge_overlapping_boxes(
+                    class_boxes, float(config.SIGN_MERGE_OVERLAP)
+                )
+            cropped_images[object_class] = [
+                crop
+                for crop in crop_boxes(frame, class_boxes)
+                if crop is not None
+            ]
+        objects.append(cropped_images)
+
+    return objects
+
+
+def detect_crops(
+    weights: str, image: Image.Image
+) -> list[npt.NDArray[np.uint8]]:
+    """! Detect objects with a single class model and crop them.
+
+    @param weights The path to the weights of the detection model.
+    @param image PIL image to be analyzed.
+    @return A list of RGB crops representing the detected objects.
+    """
+    logging.info("detect_crops")
+
+    return detect_crops_batch(weights, [image])[0]
+
+
+def detect_crops_batch(
+    weights: str,
+    images: list[Image.Image],
+    frames: list[npt.NDArray[np.uint8]] | None = None,
+    tiled: bool = False,
+    merge: bool = False,
+) -> list[list[npt.NDArray[np.uint8]]]:
+    """! Detect objects with a single class model in several images at once.
+
+    @param weights The path to the weights of the detection model.
+    @param images PIL images to be analyzed.
+    @param frames The images already decoded by image_to_array, None to
+    decode them here.
+    @param tiled Whether to use tiled inference to find small objects.
+    @param merge Whether to merge the overlapping boxes of an object into a
+    single crop.
+    @return A list with, for each image, the list of RGB crops representing
+    the objects detected in it.
+    """
+    logging.info("detect_crops_batch")
+
+    if frames is None:
+        frames = [image_to_array(image) for image in images]
+
+    if tiled:
+        boxes_list = [
+            boxes for boxes, _ in detect_tiled_batch(weights, frames)
+        ]
+    else:
+        boxes_list = [
+            result.boxes.xyxy.cpu().numpy()
+            for result in predict_batch(weights, frames)
+        ]
+
+    crops = []
+    for frame, boxes in zip(frames, boxes_list):
+        if merge:
+            boxes = merge_overlapping_boxes(
+                boxes, float(config.SIGN_MERGE_OVERLAP)
+            )
+        crops.append(
+            [crop for crop in crop_boxes(frame, boxes) if crop is not None]
+        )
+
+    return crops
+
+
+def detect_tiled_batch(
+    weights: str, frames: list[npt.NDArray[np.uint8]]
+) -> list[tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]]:
+    """! Detect objects on the full images and on overlapping tiles of them.
+
+    The full images and all their tiles are detected in batches, then the
+    boxes of each tile are moved back to the image coordinates and merged
+    with those of the full image by a non-maximum suppression.
+
+    @param weights The path to the weights of the detection model.
+    @param frames RGB arrays of the images to be analyzed.
+    @return A list with, for each image, a tuple with the (n, 4) array of the
+    x1, y1, x2, y2 coordinates of the boxes and the (n,) array of their
+    confidences.
+    """
+    logging.info("detect_tiled_batch")
+
+    # the full images come first, then the tiles of every image
+    inputs = list(frames)
+    origins = [(index, 0, 0) for index in range(len(frames))]
+    for index, frame in enumerate(frames):
+        height, width = frame.shape[:2]
+        tiles = get_tiles(
+            width,
+            height,
+            int(config.TILE_BUDGET),
+            int(config.TILE_SIZE),
+            float(config.TILE_OVERLAP),
+        )
+        for x1, y1, x2, y2 in tiles:
+            inputs.append(frame[y1:y2, x1:x2])
+            origins.append((index, x1, y1))
+
+    boxes_list: list[list[npt.NDArray[np.float32]]] = [[] for _ in frames]
+    scores_list: list[list[npt.NDArray[np.float32]]] = [[] for _ in frames]
+    for (index, x, y), result in zip(origins, predict_batch(weights, inputs)):
+        boxes = result.boxes.xyxy.cpu().numpy().astype(np.float32)
+        boxes_list[index].append(boxes + np.array([x, y, x, y], np.float32))
+        scores_list[index].append(
+            result.boxes.conf.cpu().numpy().astype(np.float32)
+        )
+
+    detections = []
+    for boxes_parts, scores_parts in zip(boxes_list, scores_list):
+        boxes = np.concatenate(boxes_parts).reshape(-1, 4)
+        scores = np.concatenate(scores_parts).reshape(-1)
+        keep = non_max_suppression(boxes, scores, TILE_IOU_THRESHOLD)
+        detections.append((boxes[keep], scores[keep]))
+
+    return detections
+
+
+def get_tiles(
+    width: int,
+    height: int,
+    budget: int,
+    tile_size: int = 640,
+    overlap: float = 0.2,
+) -> list[tuple[int, int, int, int]]:
+    """! Cut an image into a grid of overlapping tiles of the same size.
+
+    The grid has as many tiles as needed to detect the image at its native
+    resolution with tiles of tile_size pixels, but is shrunk so that the
+    tiles and the full image fit in the budget.
+
+    @param width The width of the image.
+    @param height The height of the image.
+    @param budget The maximum number of detector inputs for the image,
+    including the full image.
+    @param tile_size The side of the tiles at native resolution.
+    @param overlap The fraction of a tile that overlaps its neighbours.
+    @return A list of x1, y1, x2, y2 tiles, empty when tiling is useless or
+    does not fit in the budget.
+    """
+    step = tile_size * (1.0 - overlap)
+    columns = max(1, math.ceil((width - tile_size) / step) + 1)
+    rows = max(1, math.ceil((height - tile_size) / step) + 1)
+
+    # shrink the grid, one slot of the budget is used by the full image, and
+    # keep the tiles as square as possible
+    while columns * rows > budget - 1 and columns * rows > 1:
+        candidates = [
+            (columns - 1, rows) if columns > 1 else None,
+            (columns, rows - 1) if rows > 1 else None,
+        ]
+        columns, rows = min(
+            (candidate for candidate in candidates if candidate is not None),
+            key=lambda grid: _tile_elongation(width, height, *grid, overlap),
+        )
+
+    # a single tile would be the full image
+    if columns * rows <= 1:
+        return []
+
+    tile_width = math.ceil(width / (1 + (columns - 1) * (1.0 - overlap)))
+    tile_height = math.ceil(height / (1 + (rows - 1) * (1.0 - overlap)))
+    xs = np.linspace(0, width - tile_width, columns).round().astype(int)
+    ys = np.linspace(0, height - tile_height, rows).round().astype(int)
+
+    return [
+        (x, y, x + tile_width, y + tile_height)
+        for y in ys.tolist()
+        for x in xs.tolist()
+    ]
+
+
+def _tile_elongation(
+    width: int, height: int, columns: int, rows: int, overlap: float
+) -> float:
+    """! Compute how elongated the tiles of a grid are.
+
+    @param width The width of the image.
+    @param height The height of the image.
+    @param columns The number of columns of the grid.
+    @param rows The number of rows of the grid.
+    @param overlap The fraction of a tile that overlaps its neighbours.
+    @return The ratio between the longest and the shortest side of a tile.
+    """
+    tile_width = width / (1 + (columns - 1) * (1.0 - overlap))
+    tile_height = height / (1 + (rows - 1) * (1.0 - overlap))
+    return max(tile_width, tile_height) / min(tile_width, tile_height)
+
+
+def non_max_suppression(
+    boxes: npt.NDArray[np.float32],
+    scores: npt.NDArray[np.float32],
+    iou_threshold: float,
+) -> npt.NDArray[np.int64]:
+    """! Keep the best boxes among the ones that overlap.
+
+    @param boxes A (n, 4) array of x1, y1, x2, y2 boxes.
+    @param scores A (n,) array with the confidence of each box.
+    @param iou_threshold The intersection over union above which the box with
+    the lower confidence is removed.
+    @return The indices of the boxes to keep, by decreasing confidence.
+    """
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    keep = []
+    while order.size > 0:
+        best = order[0]
+        keep.append(best)
+        others = order[1:]
+        x1 = np.maximum(boxes[best, 0], boxes[others, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[others, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[others, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[others, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = intersection / (
+            areas[best] + areas[others] - intersection + 1e-9
+        )
+        order = others[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def merge_overlapping_boxes(
+    boxes: npt.NDArray[np.float32], overlap_threshold: float
+) -> npt.NDArray[np.float32]:
+    """! Merge the boxes that overlap into the box containing all of them.
+
+    Two boxes overlap when their intersection covers more than the threshold
+    of the smaller one, and the boxes linked by overlaps are merged together.
+
+    @param boxes A (n, 4) array of x1, y1, x2, y2 boxes.
+    @param overlap_threshold The fraction of the smaller box above which two
+    boxes are merged, 0 to keep every box.
+    @return A (m, 4) array of the merged boxes, in the order of their first
+    box.
+    """
+    if len(boxes) < 2 or overlap_threshold <= 0:
+        return boxes
+
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    smaller = np.minimum(areas[:, None], areas[None, :])
+    linked = intersection > overlap_threshold * smaller
+
+    # label the groups of linked boxes, each box takes the smallest label of
+    # its neighbours until nothing changes
+    labels = np.arange(len(boxes))
+    while True:
+        new_labels = np.where(linked, labels[None, :], len(boxes)).min(axis=1)
+        new_labels = np.minimum(new_labels, labels)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    groups = np.unique(labels)
+    merged = np.empty((len(groups), 4), dtype=boxes.dtype)
+    for index, group in enumerate(groups):
+        members = boxes[labels == group]
+        merged[index, :2] = members[:, :2].min(axis=0)
+        merged[index, 2:] = members[:, 2:].max(axis=0)
+
+    return merged
+
+
+def image_to_array(image: Image.Image) -> npt.NDArray[np.uint8]:
+    """! Decode an image to an RGB array.
+
+    @param image PIL image to decode.
+    @return A numpy array of shape (height, width, 3).
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+def crop_boxes(
+    frame: npt.NDArray[np.uint8], boxes: npt.NDArray[Any]
+) -> list[npt.NDArray[np.uint8] | None]:
+    """! Crop boxes from a frame without copying the pixels.
+
+    The box coordinates are truncated and clipped to the frame all at once,
+    and each crop is a view of the frame.
+
+    @param frame A numpy image of shape (height, width, channels).
+    @param boxes A numpy array of shape (n, 4) with the x1, y1, x2, y2
+    coordinates of each box.
+    @return A list with a view of the frame for each box, or None for the
+    boxes that are empty once clipped.
+    """
+    if len(boxes) == 0:
+        return []
+
+    height, width = frame.shape[:2]
+    coordinates = np.asarray(boxes).astype(np.int64)
+    coordinates = np.clip(coordinates, 0, [width, height, width, height])
+    valid = (coordinates[:, 2] > coordinates[:, 0]) & (
+        coordinates[:, 3] > coordinates[:, 1]
+    )
+
+    return [
+        frame[y1:y2, x1:x2] if is_valid else None
+        for (x1, y1, x2, y2), is_valid in zip(coordinates.tolist(), valid)
+    ]
+
+
+def predict_batch(
+    weights: str, frames: list[npt.NDArray[np.uint8]]
+) -> list[Any]:
+    """! Run a detection model on several images, in batches.
+
+    Images are grouped by size before being batched, so that each of them is
+    letterboxed as if it was detected alone.
+
+    @param weights The path to the weights of the detection model.
+    @param frames RGB arrays of the images to be analyzed.
+    @return A list with the YOLO result of each image, in the same order as
+    the images.
+    """
+    model = get_model(weights)
+    batch_size = max(1, int(config.BATCH_SIZE))
+
+    # group the images by size
+    groups: dict[tuple[int, ...], list[int]] = {}
+    for index, frame in enumerate(frames):
+        groups.setdefault(frame.shape, []).append(index)
+
+    # run each group in batches and put the results back in order, YOLO reads
+    # arrays as BGR, the reversed view of the frame is still copied by its
+    # preprocessing
+    results: list[Any] = [None] * len(frames)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start : start + batch_size]
+            batch_results = model(
+                [frames[index][..., ::-1] for index in batch],
+                conf=DETECTION_CONFIDENCE,
+            )
+            for index, result in zip(batch, batch_results):
+                results[index] = result
+
+    return results
+
+
+def class_key(name: str) -> str:
+    """! Convert a class name of a model to the key used by the detectors.
+
+    @param name The class name, for instance "Traffic sign".
+    @return The class key, for instance "traffic_sign".
+    """
+    return name.strip().lower().replace(" ", "_")
@@ -0,0 +1,356 @@
+"""! @brief Generic detector, classifier and country likelihood stage.
+
+Object based evidence, such as car brands or tree species, always follows the
+same steps: detect the objects, classify each crop, map the classes to the
+countries where they are common, and average over the objects of the image.
+An ObjectStage describes these steps for one kind of object, and run_stage
+executes them for a batch of images:
+
+- the objects of every image are detected in batches,
+- every crop of every image is classified in batches, with a per-stage cache
+  of the classifications,
+- the class confidences are turned into country likelihoods with a single
+  product against a precomputed classes x countries matrix.
+
+Timing hooks can be registered to measure each step of every stage.
+"""
+
+import hashlib
+import logging
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, NamedTuple
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+from geotrouvetout import config
+from geotrouvetout.models import get_model
+from geotrouvetout.object_detection import DETECTOR_WEIGHTS, detect_crops_batch
+
+
+class Likelihood(NamedTuple):
+    """! Likelihood of each country given each class of a classifier."""
+
+    # Names of the classes, in lower case, one per row of the matrix.
+    classes: list[str]
+    # ISO alpha-3 codes of the countries, one per column of the matrix.
+    countries: list[str]
+    # Matrix of shape (classes, countries).
+    matrix: npt.NDArray[np.float64]
+
+
+@dataclass(frozen=True)
+class ObjectStage:
+    """! Configuration of a detector, classifier and likelihood stage."""
+
+    # Name of the stage, used for the cache and the timing hooks.
+    name: str
+    # Class of the objects, among the keys of DETECTOR_WEIGHTS.
+    object_class: str
+    # Path to the weights of the classifier of the crops.
+    classifier_weights: str
+    # Function loading the classes x countries likelihood, called once.
+    load_likelihood: Callable[[], Likelihood]
+
+
+# A timing hook receives the stage name, the step name, the duration in
+# seconds and the number of items processed by the step.
+TimingHook = Callable[[str, str, float, int], None]
+
+_timing_hooks: list[TimingHook] = []
+
+_caches: dict[str, "OrderedDict[str, dict[str, float]]"] = {}
+_caches_lock = threading.Lock()
+
+_likelihoods: dict[str, Likelihood] = {}
+_likelihoods_lock = threading.Lock()
+
+
+def empty_likelihood() -> Likelihood:
+    """! Create a likelihood without any class nor country.
+
+    @return A likelihood for which every classification gives no country.
+    """
+    return Likelihood([], [], np.zeros((0, 0)))
+
+
+def run_stage(
+    stage: ObjectStage,
+    images: list[Image.Image],
+    crops_list: list[list[npt.NDArray[np.uint8]]] | None = None,
+) -> list[dict[str, float]]:
+    """! Run a stage on several images.
+
+    @param stage The stage to run.
+    @param images PIL images to be analyzed.
+    @param crops_list For each image, the crops of the objects already
+    detected in it, None to detect them here.
+    @return A list with, for each image, a dictionary with the countries as
+    keys and their average likelihood over the objects of the image as
+    values.
+    """
+    logging.info(f"run_stage {stage.name}")
+
+    if crops_list is None:
+        start = time.perf_counter()
+        crops_list = detect_crops_batch(
+            DETECTOR_WEIGHTS[stage.object_class], images
+        )
+        _call_timing_hooks(
+            stage.name, "detect", time.perf_counter() - start, len(images)
+        )
+
+    # classify every crop of every image at once
+    all_crops = [crop for crops in crops_list for crop in crops]
+    start = time.perf_counter()
+    all_classes = classify_crops_cached(stage, all_crops)
+    _call_timing_hooks(
+        stage.name, "classify", time.perf_counter() - start, len(all_crops)
+    )
+
+    # map the classes of every crop to the countries
+    start = time.perf_counter()
+    likelihood = get_stage_likelihood(stage)
+    all_countries = get_countries_likelihood(likelihood, all_classes)
+    results = []
+    first = 0
+    for crops in crops_list:
+        image_countries = all_countries[first : first + len(crops)]
+        first += len(crops)
+        results.append(average_countries(likelihood, image_countries))
+    _call_timing_hooks(
+        stage.name, "likelihood", time.perf_counter() - start, len(all_crops)
+    )
+
+    return results
+
+
+def classify_crops(
+    weights: str, crops: list[npt.NDArray[np.uint8]]
+) -> list[dict[str, float]]:
+    """! Classify several crops at once.
+
+    The crops are resized by the classifier to its input size and stacked,
+    so that each batch runs a single forward pass.
+
+    @param weights The path to the weights of the classifier.
+    @param crops RGB crops to classify.
+    @return A list with, for each crop, a dict containing the classes and
+    their confidence.
+    """
+    logging.info("classify_crops")
+
+    if not crops:
+        return []
+
+    model = get_model(weights)
+    batch_size = max(1, int(config.CLASSIFICATION_BATCH_SIZE))
+
+    # YOLO reads arrays as BGR, the reversed view of the crop is still copied
+    # by its preprocessing
+    bgr_crops = [crop[..., ::-1] for crop in crops]
+
+    classes = []
+    for start in range(0, len(crops), batch_size):
+        results = model(bgr_crops[start : start + batch_size])
+        for result in results:
+            classes.append(get_class_confidences(result))
+
+    return classes
+
+
+def classify_crops_cached(
+    stage: ObjectStage, crops: list[npt.NDArray[np.uint8]]
+) -> list[dict[str, float]]:
+    """! Classify crops with the classifier of a stage, using its cache.
+
+    Crops already classified by the stage are not classified again. A stage
+    whose classifier weights do not exist gives no class.
+
+    @param stage The stage to classify the crops for.
+    @param crops RGB crops to classify.
+    @return A list with, for each crop, a dict containing the classes and
+    their confidence.
+    """
+    if not crops:
+        return []
+    if not pathlib.Path(stage.classifier_weights).is_file():
+        logging.info(f"No classifier {stage.classifier_weights}")
+        return [{} for _ in crops]
+
+    cache_size = int(config.STAGE_CACHE_SIZE)
+    if cache_size <= 0:
+        return classify_crops(stage.classifier_weights, crops)
+
+    keys = [crop_key(crop) for crop in crops]
+    classes: list[dict[str, float] | None] = [None] * len(crops)
+    with _caches_lock:
+        cache = _caches.setdefault(stage.name, OrderedDict())
+        for index, key in enumerate(keys):
+            if key in cache:
+                cache.move_to_end(key)
+                classes[index] = cache[key]
+
+    # classify the crops missing from the cache in a single call
+    missing = [index for index, item in enumerate(classes) if item is None]
+    missing_classes = classify_crops(
+        stage.classifier_weights, [crops[index] for index in missing]
+    )
+
+    with _caches_lock:
+        for index, item in zip(missing, missing_classes):
+            classes[index] = item
+            cache[keys[index]] = item
+        while len(cache) > cache_size:
+            cache.popitem(last=False)
+
+    return [item or {} for item in classes]
+
+
+def crop_key(crop: npt.NDArray[np.uint8]) -> str:
+    """! Compute a key identifying the content of a crop.
+
+    @param crop A numpy image.
+    @return A hash of the shape and pixels of the crop.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(crop.shape).encode())
+    digest.update(np.ascontiguousarray(crop).data)
+    return digest.hexdigest()
+
+
+def clear_stage_cache(stage_name: str | None = None) -> None:
+    """! Clear the classification cache of a stage.
+
+    @param stage_name The name of the stage, None to clear every stage.
+    """
+    with _caches_lock:
+        if stage_name is None:
+            _caches.clear()
+        else:
+            _caches.pop(stage_name, None)
+
+
+def get_stage_likelihood(stage: ObjectStage) -> Likelihood:
+    """! Get the likelihood of a stage, loading it on first use.
+
+    @param stage The stage.
+    @return The classes x countries likelihood of the stage.
+    """
+    with _likelihoods_lock:
+        likelihood = _likelihoods.get(stage.name)
+        if likelihood is None:
+            likelihood = stage.load_likelihood()
+            _likelihoods[stage.name] = likelihood
+
+    return likelihood
+
+
+def get_countries_likelihood(
+    likelihood: Likelihood, classes_list: list[dict[str, float]]
+) -> npt.NDArray[np.float64]:
+    """! Compute the country likelihood of several classifications at once.
+
+    @param likelihood The classes x countries likelihood.
+    @param classes_list A list of dicts containing classes and their
+    confidence.
+    @return A matrix of shape (classifications, countries), with a row of
+    zeros for the classifications without any known class.
+    """
+    class_indices = {
+        name: index for index, name in enumerate(likelihood.classes)
+    }
+    confidences = np.zeros((len(classes_list), len(likelihood.classes)))
+    for row, classes in enumerate(classes_list):
+        for name, confidence in classes.items():
+            index = class_indices.get(name.lower())
+            if index is not None:
+                confidences[row, index] = confidence
+
+    return confidences @ likelihood.matrix
+
+
+def average_countries(
+    likelihood: Likelihood, countries: npt.NDArray[np.float64]
+) -> dict[str, float]:
+    """! Average the country likelihoods of the objects of an image.
+
+    @param likelihood The classes x countries likelihood.
+    @param countries A matrix of shape (objects, countries).
+    @return A dictionary with the countries as keys and their average
+    likelihood over the objects with a known class as values.
+    """
+    known = countries.sum(axis=1) > 0
+    if not known.any():
+        return {}
+
+    average = countries[known].mean(axis=0)
+    return {
+        country: float(value)
+        for country, value in zip(likelihood.countries, average)
+        if value > 0
+    }
+
+
+def get_class_confidences(result: Any) -> dict[str, float]:
+    """! Convert a YOLO result to a dictionary of class confidences.
+
+    Classification models give a probability for each class. Detection models
+    give boxes, in which case the confidence of a class is the confidence of
+    its best box.
+
+    @param result A YOLO result for a single image.
+    @return A dict containing the class names and their confidence.
+    """
+    if result.probs is not None:
+        probs = getattr(result.probs, "data", result.probs)
+        return {
+            result.names[index]: float(prob)
+            for index, prob in enumerate(probs.tolist())
+        }
+
+    confidences: dict[str, float] = {}
+    for cls, conf in zip(
+        result.boxes.cls.tolist(), result.boxes.conf.tolist()
+    ):
+        name = result.names[int(cls)]
+        confidences[name] = max(confidences.get(name, 0.0), float(conf))
+
+    return confidences
+
+
+def add_timing_hook(hook: TimingHook) -> None:
+    """! Register a function called with the duration of each stage step.
+
+    @param hook A function taking the stage name, the step name ("detect",
+    "classify" or "likelihood"), the duration in seconds and the number of
+    items processed.
+    """
+    _timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook: TimingHook) -> None:
+    """! Unregister a timing hook.
+
+    @param hook The function to unregister.
+    """
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+
+def _call_timing_hooks(
+    stage_name: str, step: str, duration: float, count: int
+) -> None:
+    """! Call every timing hook for a step of a stage.
+
+    @param stage_name The name of the stage.
+    @param step The name of the step.
+    @param duration The duration of the step in seconds.
+    @param count The number of items processed by the step.
+    """
+    logging.debug(f"{stage_name} {step}: {count} items in {duration:.3f}s")
+    for hook in list(_timing_hooks):
+        hook(stage_name, step, duration, count)
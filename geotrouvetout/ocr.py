@@ -0,0 +1,356 @@
+"""! @brief OCR engines used to read the text of the road signs.
+
+pytesseract writes every image to a temporary file and starts a new
+tesseract process for it, which loads the language data again for each
+sign. When tesserocr is installed, this module instead keeps initialized
+Tesseract API handles, one per thread and per language, and passes the image
+buffers to them in memory. The pytesseract path stays as a fallback.
+"""
+
+import importlib.util
+import logging
+import threading
+from typing import Any, NamedTuple
+import numpy as np
+import numpy.typing as npt
+import pytesseract
+from geotrouvetout import config
+
+
+class Word(NamedTuple):
+    """! A word read by the OCR."""
+
+    # Text of the word.
+    text: str
+    # Confidence of the OCR in the word, between 0 and 100.
+    confidence: float
+    # Bounding box of the word in the image, as (left, top, width, height).
+    box: tuple[int, int, int, int]
+
+
+# White space around and between the images of a montage, in pixels.
+MONTAGE_PADDING = 20
+
+_local = threading.local()
+_apis: list[Any] = []
+_apis_lock = threading.Lock()
+_generation = 0
+_installed_languages: list[str] | None = None
+_failed_languages: set[str] = set()
+
+
+def has_tesserocr() -> bool:
+    """! Check whether the in-process Tesseract API is installed.
+
+    @return True if tesserocr can be imported.
+    """
+    return importlib.util.find_spec("tesserocr") is not None
+
+
+def use_tesserocr() -> bool:
+    """! Check whether the OCR should run through the in-process API.
+
+    @return True if the OCR_BACKEND setting selects tesserocr, or is "auto"
+    and tesserocr is installed.
+    """
+    if config.OCR_BACKEND == "tesserocr":
+        return True
+    if config.OCR_BACKEND == "auto":
+        return has_tesserocr()
+    return False
+
+
+def recognize_words(
+    image: npt.NDArray[np.uint8], lang: str | None = None
+) -> list[Word]:
+    """! Read the words of an image.
+
+    @param image A grayscale or RGB numpy image.
+    @param lang The Tesseract languages, such as "eng+fra", None for the
+    OCR_LANGUAGES setting.
+    @return The words read in the image, in reading order, including the
+    words with no confidence.
+    """
+    logging.info("recognize_words")
+
+    if lang is None:
+        lang = config.OCR_LANGUAGES
+
+    if use_tesserocr() and can_start_ocr_engine(lang):
+        return recognize_words_tesserocr(image, lang)
+
+    return recognize_words_pytesseract(image, lang)
+
+
+def can_start_ocr_engine(lang: str) -> bool:
+    """! Check whether the Tesseract API of the thread starts for languages.
+
+    With the "auto" OCR_BACKEND setting, an API that fails to start, for
+    instance without language data, is logged once and its languages are
+    read by pytesseract instead.
+
+    @param lang The Tesseract languages.
+    @raise RuntimeError If the API fails to start and the OCR_BACKEND setting
+    is "tesserocr".
+    @return True if the API is started.
+    """
+    if lang in _failed_languages:
+        return False
+
+    try:
+        get_ocr_engine(lang)
+    except RuntimeError as e:
+        if config.OCR_BACKEND != "auto":
+            raise
+        logging.warning(
+            f"Cannot start the Tesseract API for {lang}, using pytesseract: "
+            f"{e}"
+        )
+        _failed_languages.add(lang)
+        return False
+
+    return True
+
+
+def recognize_words_tesserocr(
+    image: npt.NDArray[np.uint8], lang: str
+) -> list[Word]:
+    """! Read the words of an image with the Tesseract API of the thread.
+
+    @param image A grayscale or RGB numpy image.
+    @param lang The Tesseract languages.
+    @return The words read in the image.
+    """
+    import tesserocr
+
+    api = get_ocr_engine(lang)
+
+    # the API is given a copy of the pixels, as the bytes of a contiguous
+    # buffer
+    buffer = np.ascontiguousarray(image)
+    height, width = buffer.shape[:2]
+    bytes_per_pixel = 1 if buffer.ndim == 2 else buffer.shape[2]
+    api.SetImageBytes(
+        buffer.tobytes(),
+        width,
+        height,
+        bytes_per_pixel,
+        width * bytes_per_pixel,
+    )
+    api.Recognize()
+
+    words = []
+    iterator = api.GetIterator()
+    level = tesserocr.RIL.WORD
+    for word in tesserocr.iterate_level(iterator, level):
+        # the iterator of a page without any text raises instead of giving
+        # an empty word
+        try:
+            text = word.GetUTF8Text(level)
+        except RuntimeError:
+            continue
+        if text is None:
+            continue
+        bounding_box = word.BoundingBox(level)
+        if bounding_box is None:
+            continue
+        left, top, right, bottom = bounding_box
+        words.append(
+            Word(
+                text,
+                float(word.Confidence(level)),
+                (left, top, right - left, bottom - top),
+            )
+        )
+
+    return words
+
+
+def recognize_words_pytesseract(
+    image: npt.NDArray[np.uint8], lang: str
+) -> list[Word]:
+    """! Read the words of an image with a tesseract process.
+
+    @param image A grayscale or RGB numpy image.
+    @param lang The Tesseract languages.
+    @return The words read in the image.
+    """
+    data = pytesseract.image_to_data(
+        image, lang=lang, output_type=pytesseract.Output.DICT
+    )
+
+    return [
+        Word(text, float(conf), (left, top, width, height))
+        for text, conf, left, top, width, height in zip(
+            data["text"],
+            data["conf"],
+            data["left"],
+            data["top"],
+            data["width"],
+            data["height"],
+        )
+    ]
+
+
+def get_installed_languages() -> list[str]:
+    """! Get the Tesseract languages whose data is installed.
+
+    The list is read once per process.
+
+    @return The names of the installed traineddata, such as "eng", empty if
+    Tesseract cannot be queried.
+    """
+    global _installed_languages
+
+    if _installed_languages is None:
+        try:
+            if use_tesserocr():
+                import tesserocr
+
+                if config.TESSDATA_PATH:
+                    _, languages = tesserocr.get_languages(
+                        config.TESSDATA_PATH
+                    )
+                else:
+                    _, languages = tesserocr.get_languages()
+            else:
+                languages = pytesseract.get_languages()
+        except (
+            RuntimeError,
+            OSError,
+            pytesseract.TesseractNotFoundError,
+        ) as e:
+            logging.info(f"Cannot list the Tesseract languages: {e}")
+            languages = []
+        _installed_languages = list(languages)
+
+    return _installed_languages
+
+
+def recognize_montage(
+    images: list[npt.NDArray[np.uint8]], lang: str | None = None
+) -> list[list[Word]]:
+    """! Read the words of several images with a single OCR call.
+
+    The images are stacked vertically on a white montage, separated by
+    padding, and the OCR runs once on the montage. Each word is then given
+    back to the image containing the center of its box, with its box in the
+    coordinates of that image.
+
+    @param images Grayscale numpy images, with dark text on a white
+    background.
+    @param lang The Tesseract languages, None for the OCR_LANGUAGES setting.
+    @return A list with, for each image, the words read in it.
+    """
+    logging.info("recognize_montage")
+
+    montage, offsets = create_montage(images)
+    if montage is None:
+        return [[] for _ in images]
+
+    words = recognize_words(montage, lang)
+
+    # find the image of each word from the center of its box
+    tops = np.array([top for _, top in offsets])
+    image_words: list[list[Word]] = [[] for _ in images]
+    for word in words:
+        left, top, width, height = word.box
+        center_x, center_y = left + width / 2, top + height / 2
+        index = int(np.searchsorted(tops, center_y, side="right")) - 1
+        if index < 0:
+            continue
+        image_left, image_top = offsets[index]
+        image_height, image_width = images[index].shape[:2]
+        if not (
+            image_left <= center_x < image_left + image_width
+            and image_top <= center_y < image_top + image_height
+        ):
+            continue
+        image_words[index].append(
+            word._replace(
+                box=(left - image_left, top - image_top, width, height)
+            )
+        )
+
+    return image_words
+
+
+def create_montage(
+    images: list[npt.NDArray[np.uint8]],
+) -> tuple[npt.NDArray[np.uint8] | None, list[tuple[int, int]]]:
+    """! Stack images vertically on a white montage.
+
+    @param images Grayscale numpy images.
+    @return The montage, None if every image is empty, and the offsets
+    (left, top) of each image in the montage.
+    """
+    width = max((image.shape[1] for image in images), default=0)
+    height = MONTAGE_PADDING
+    offsets = []
+    for image in images:
+        offsets.append((MONTAGE_PADDING, height))
+        if image.size:
+            height += image.shape[0] + MONTAGE_PADDING
+
+    if height == MONTAGE_PADDING:
+        return None, offsets
+
+    montage = np.full(
+        (height, width + 2 * MONTAGE_PADDING), 255, dtype=np.uint8
+    )
+    for image, (left, top) in zip(images, offsets):
+        if image.size:
+            montage[
+                top : top + image.shape[0], left : left + image.shape[1]
+            ] = image
+
+    return montage, offsets
+
+
+def get_ocr_engine(lang: str) -> Any:
+    """! Get the Tesseract API of the current thread for some languages.
+
+    The API is created and initialized on first use, then reused by every
+    later call of the same thread.
+
+    @param lang The Tesseract languages.
+    @raise RuntimeError If the language data cannot be loaded.
+    @return An initialized tesserocr API.
+    """
+    import tesserocr
+
+    # the APIs of the thread are dropped when close_ocr_engines was called
+    if getattr(_local, "generation", None) != _generation:
+        _local.apis = {}
+        _local.generation = _generation
+    apis = _local.apis
+
+    api = apis.get(lang)
+    if api is None:
+        logging.info(f"Initializing a Tesseract API for {lang}")
+        if config.TESSDATA_PATH:
+            api = tesserocr.PyTessBaseAPI(path=config.TESSDATA_PATH, lang=lang)
+        else:
+            api = tesserocr.PyTessBaseAPI(lang=lang)
+        apis[lang] = api
+        with _apis_lock:
+            _apis.append(api)
+
+    return api
+
+
+def close_ocr_engines() -> None:
+    """! Release the Tesseract APIs of every thread.
+
+    Must not be called while a recognition is running. The threads create new
+    APIs on their next recognition.
+    """
+    global _generation
+    logging.info("close_ocr_engines")
+
+    with _apis_lock:
+        for api in _apis:
+            api.End()
+        _apis.clear()
+        _failed_languages.clear()
+        _generation += 1
@@ -0,0 +1,239 @@
+"""! @brief Choice of the Tesseract languages from the likely countries.
+
+Tesseract reads the road signs with the languages of the OCR_LANGUAGES
+setting, whatever the country of the image. Once the area prior and the
+color analysis have narrowed the likely countries, the scripts of their
+languages are known, and Tesseract can read the signs with a few traineddata
+of these scripts only, which is faster and more accurate on the non-Latin
+signs.
+
+The restricted languages are only used when the most likely countries hold
+enough of the probability. The signs read with too low a confidence are read
+again with the broad OCR_LANGUAGES.
+"""
+
+import functools
+import json
+import logging
+from geotrouvetout import config
+from geotrouvetout.language_classifier import COUNTRY_METADATA_FILE
+from geotrouvetout.ocr import get_installed_languages
+
+# Tesseract traineddata of the ISO 639-1 languages of the country metadata.
+TESSERACT_LANGUAGES = {
+    "AF": "afr",
+    "AM": "amh",
+    "AR": "ara",
+    "AZ": "aze",
+    "BE": "bel",
+    "BG": "bul",
+    "BN": "ben",
+    "BS": "bos",
+    "CS": "ces",
+    "DA": "dan",
+    "DE": "deu",
+    "DV": "div",
+    "DZ": "dzo",
+    "EL": "ell",
+    "EN": "eng",
+    "ES": "spa",
+    "ET": "est",
+    "FA": "fas",
+    "FI": "fin",
+    "FO": "fao",
+    "FR": "fra",
+    "GA": "gle",
+    "HE": "heb",
+    "HI": "hin",
+    "HR": "hrv",
+    "HT": "hat",
+    "HU": "hun",
+    "HY": "hye",
+    "ID": "ind",
+    "IS": "isl",
+    "IT": "ita",
+    "JA": "jpn",
+    "KA": "kat",
+    "KK": "kaz",
+    "KM": "khm",
+    "KO": "kor",
+    "KU": "kmr",
+    "KY": "kir",
+    "LB": "ltz",
+    "LO": "lao",
+    "LT": "lit",
+    "LV": "lav",
+    "MI": "mri",
+    "MK": "mkd",
+    "MN": "mon",
+    "MS": "msa",
+    "MT": "mlt",
+    "NB": "nor",
+    "NE": "nep",
+    "NL": "nld",
+    "NN": "nor",
+    "NO": "nor",
+    "PL": "pol",
+    "PS": "pus",
+    "PT": "por",
+    "QU": "que",
+    "RO": "ron",
+    "RU": "rus",
+    "SI": "sin",
+    "SK": "slk",
+    "SL": "slv",
+    "SQ": "sqi",
+    "SR": "srp",
+    "SV": "swe",
+    "SW": "swa",
+    "TA": "tam",
+    "TG": "tgk",
+    "TH": "tha",
+    "TI": "tir",
+    "TO": "ton",
+    "TR": "tur",
+    "UK": "ukr",
+    "UR": "urd",
+    "UZ": "uzb",
+    "VI": "vie",
+    "ZH": "chi_sim",
+}
+
+# Script of the languages not written in the Latin script.
+LANGUAGE_SCRIPTS = {
+    "AM": "Ethiopic",
+    "AR": "Arabic",
+    "BE": "Cyrillic",
+    "BG": "Cyrillic",
+    "BN": "Bengali",
+    "DV": "Thaana",
+    "DZ": "Tibetan",
+    "EL": "Greek",
+    "FA": "Arabic",
+    "HE": "Hebrew",
+    "HI": "Devanagari",
+    "HY": "Armenian",
+    "JA": "Japanese",
+    "KA": "Georgian",
+    "KK": "Cyrillic",
+    "KM": "Khmer",
+    "KO": "Hangul",
+    "KY": "Cyrillic",
+    "LO": "Lao",
+    "MK": "Cyrillic",
+    "MN": "Cyrillic",
+    "NE": "Devanagari",
+    "PS": "Arabic",
+    "RU": "Cyrillic",
+    "SI": "Sinhala",
+    "SR": "Cyrillic",
+    "TA": "Tamil",
+    "TG": "Cyrillic",
+    "TH": "Thai",
+    "TI": "Ethiopic",
+    "UK": "Cyrillic",
+    "UR": "Arabic",
+    "ZH": "Han",
+}
+
+# Traineddata reading a script, used for the languages without their own.
+SCRIPT_LANGUAGES = {
+    "Latin": "eng",
+    "Cyrillic": "rus",
+    "Arabic": "ara",
+    "Greek": "ell",
+    "Hebrew": "heb",
+    "Devanagari": "hin",
+    "Bengali": "ben",
+    "Tamil": "tam",
+    "Sinhala": "sin",
+    "Thai": "tha",
+    "Lao": "lao",
+    "Khmer": "khm",
+    "Georgian": "kat",
+    "Armenian": "hye",
+    "Ethiopic": "amh",
+    "Thaana": "div",
+    "Tibetan": "bod",
+    "Han": "chi_sim",
+    "Japanese": "jpn",
+    "Hangul": "kor",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_country_language_codes(
+    country_metadata_file: str = COUNTRY_METADATA_FILE,
+) -> dict[str, list[str]]:
+    """! Get the languages spoken in each country.
+
+    @param country_metadata_file The path to the JSON file with the languages
+    of each country.
+    @return A dictionary with the ISO alpha-3 codes of the countries as keys
+    and their upper case ISO 639-1 languages as values.
+    """
+    with open(country_metadata_file, "r", encoding="utf-8") as file:
+        country_metadata = json.load(file)
+
+    return {
+        country: metadata["languages"]
+        for country, metadata in country_metadata.items()
+    }
+
+
+def select_ocr_languages(countries: dict[str, float]) -> str | None:
+    """! Choose the Tesseract languages from the likely countries.
+
+    The languages of the OCR_TOP_COUNTRIES most likely countries are weighted
+    by the probability of these countries, and the OCR_MAX_LANGUAGES heaviest
+    installed traineddata are kept. A language without installed traineddata
+    is read with the traineddata of its script.
+
+    @param countries A dictionary with the ISO alpha-3 codes of the countries
+    as keys and their probability as values.
+    @return The Tesseract languages, such as "deu+eng", None to read with the
+    broad OCR_LANGUAGES, when the selection is disabled, when the most likely
+    countries hold less than OCR_SCRIPT_CONFIDENCE of the probability, or
+    when none of their traineddata is installed.
+    """
+    logging.info("select_ocr_languages")
+
+    if not config.OCR_SCRIPT_SELECTION:
+        return None
+
+    total = sum(countries.values())
+    if total <= 0:
+        return None
+
+    top_countries = sorted(countries, key=countries.get, reverse=True)[
+        : max(1, int(config.OCR_TOP_COUNTRIES))
+    ]
+    if sum(countries[country] for country in top_countries) / total < float(
+        config.OCR_SCRIPT_CONFIDENCE
+    ):
+        return None
+
+    country_languages = get_country_language_codes()
+    installed = set(get_installed_languages())
+
+    weights: dict[str, float] = {}
+    for country in top_countries:
+        for language in country_languages.get(country, []):
+            traineddata = TESSERACT_LANGUAGES.get(language)
+            if traineddata not in installed:
+                script = LANGUAGE_SCRIPTS.get(language, "Latin")
+                traineddata = SCRIPT_LANGUAGES[script]
+            if traineddata in installed:
+                weights[traineddata] = (
+                    weights.get(traineddata, 0.0) + countries[country]
+                )
+
+    if not weights:
+        return None
+
+    selected = sorted(weights, key=lambda name: (-weights[name], name))[
+        : max(1, int(config.OCR_MAX_LANGUAGES))
+    ]
+    logging.info(f"OCR languages selected: {'+'.join(selected)}")
+
+    return "+".join(selected)
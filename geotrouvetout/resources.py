@@ -0,0 +1,247 @@
+"""! @brief CPU thread budget of the inference libraries.
+
+torch, OpenCV and Tesseract each start a thread pool as large as the machine
+by default. With several workers, or several libraries running at the same
+time, the pools oversubscribe the CPU and every request becomes slower. This
+module splits the cores between the workers and decides the number of threads
+of each library, then applies the layout in the current process.
+
+Each worker handles one request at a time, and the libraries run one after
+the other within a request, so torch and OpenCV share the cores of the
+worker. Tesseract scales poorly with OpenMP and runs single threaded unless
+configured otherwise. When the road signs are analyzed by a pool of threads
+or processes, the threads of OpenCV and Tesseract are split between the
+workers of the pool.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Iterable, NamedTuple
+import cv2
+import torch
+from geotrouvetout import config
+
+
+class ThreadLayout(NamedTuple):
+    """! Number of threads given to each library in a worker."""
+
+    # Number of cores shared by the workers.
+    cores: int
+    # Number of worker processes.
+    workers: int
+    # Intra-op threads of torch.
+    torch_threads: int
+    # Inter-op threads of torch.
+    torch_interop_threads: int
+    # Threads of the OpenCV pool.
+    opencv_threads: int
+    # OpenMP threads of Tesseract.
+    tesseract_threads: int
+    # Threads or processes analyzing the road signs of an image in parallel.
+    sign_workers: int
+
+
+_applied_layout: ThreadLayout | None = None
+_applied_lock = threading.Lock()
+
+_executors: dict[tuple[str, int], Executor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_available_cores() -> int:
+    """! Get the number of cores the process is allowed to run on.
+
+    @return The number of cores, at least 1.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def get_thread_layout(
+    workers: int | None = None, cores: int | None = None
+) -> ThreadLayout:
+    """! Decide the number of threads of each library.
+
+    The cores are split evenly between the workers. The settings
+    TORCH_THREADS, OPENCV_THREADS, TESSERACT_THREADS and SIGN_WORKERS
+    override the computed values when they are not 0. When the road signs
+    are analyzed by a pool of threads, which share the OpenCV pool and the
+    environment of the process, the OpenCV and Tesseract threads are split
+    between the sign workers.
+
+    @param workers The number of worker processes, None for the WORKERS
+    setting.
+    @param cores The number of cores, None for the CPU_CORES setting or every
+    available core.
+    @return The layout of the threads in each worker.
+    """
+    if workers is None:
+        workers = config.WORKERS
+    if cores is None:
+        cores = config.CPU_CORES or get_available_cores()
+    workers = max(1, workers)
+    cores = max(1, cores)
+
+    worker_cores = max(1, cores // workers)
+    sign_workers = config.SIGN_WORKERS or worker_cores
+    sign_threads = sign_workers if config.SIGN_EXECUTOR == "thread" else 1
+
+    return ThreadLayout(
+        cores=cores,
+        workers=workers,
+        torch_threads=config.TORCH_THREADS or worker_cores,
+        torch_interop_threads=1,
+        opencv_threads=split_threads(
+            config.OPENCV_THREADS or worker_cores, sign_threads
+        ),
+        tesseract_threads=split_threads(
+            config.TESSERACT_THREADS or 1, sign_threads
+        ),
+        sign_workers=sign_workers,
+    )
+
+
+def get_pool_thread_layout(layout: ThreadLayout, workers: int) -> ThreadLayout:
+    """! Decide the number of threads of each library in a pool of processes.
+
+    The processes of the pool run at the same time, so the threads of each
+    library in the worker starting the pool are split between them.
+
+    @param layout The layout of the worker starting the pool.
+    @param workers The number of processes of the pool.
+    @return The layout of the threads in each process of the pool.
+    """
+    return layout._replace(
+        workers=layout.workers * workers,
+        torch_threads=split_threads(layout.torch_threads, workers),
+        opencv_threads=split_threads(layout.opencv_threads, workers),
+        tesseract_threads=split_threads(layout.tesseract_threads, workers),
+        sign_workers=1,
+    )
+
+
+def split_threads(threads: int, workers: int) -> int:
+    """! Split a number of threads between workers running at the same time.
+
+    @param threads The number of threads.
+    @param workers The number of workers.
+    @return The number of threads of each worker, at least 1.
+    """
+    return max(1, threads // max(1, workers))
+
+
+def apply_thread_layout(layout: ThreadLayout | None = None) -> ThreadLayout:
+    """! Apply a thread layout in the current process.
+
+    Must be called in every worker process, before the first inference, since
+    torch only accepts a change of its inter-op threads before it starts
+    using them.
+
+    @param layout The layout to apply, None to compute it from the settings.
+    @return The applied layout.
+    """
+    global _applied_layout
+    logging.info("apply_thread_layout")
+
+    if layout is None:
+        layout = get_thread_layout()
+
+    with _applied_lock:
+        torch.set_num_threads(layout.torch_threads)
+        try:
+            torch.set_num_interop_threads(layout.torch_interop_threads)
+        except RuntimeError:
+            logging.warning("torch inter-op threads already started")
+        cv2.setNumThreads(layout.opencv_threads)
+        # read by the tesseract processes started after this point
+        os.environ["OMP_THREAD_LIMIT"] = str(layout.tesseract_threads)
+
+        _applied_layout = layout
+
+    logging.info(f"Thread layout: {layout._asdict()}")
+
+    return layout
+
+
+def get_applied_thread_layout() -> ThreadLayout | None:
+    """! Get the thread layout applied in the current process.
+
+    @return The applied layout, None if no layout has been applied.
+    """
+    return _applied_layout
+
+
+def get_executor(kind: str, workers: int) -> Executor | None:
+    """! Get a shared pool of threads or processes, creating it on first use.
+
+    The process pools start their processes with spawn, since forking a
+    process running torch threads can deadlock, and apply in each of them the
+    thread layout of the current process split between the processes.
+
+    @param kind "serial", "thread" or "process".
+    @param workers The number of threads or processes of the pool.
+    @raise ValueError If the kind is unknown.
+    @return The pool, None for serial execution.
+    """
+    if kind == "serial" or workers <= 1:
+        return None
+    if kind not in ("thread", "process"):
+        raise ValueError(f"Unknown executor {kind}")
+
+    with _executors_lock:
+        executor = _executors.get((kind, workers))
+        if executor is None:
+            logging.info(f"Starting a {kind} pool of {workers} workers")
+            if kind == "thread":
+                executor = ThreadPoolExecutor(workers)
+            else:
+                layout = get_applied_thread_layout() or get_thread_layout()
+                executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=apply_thread_layout,
+                    initargs=(get_pool_thread_layout(layout, workers),),
+                )
+            _executors[(kind, workers)] = executor
+
+    return executor
+
+
+def map_executor(
+    kind: str,
+    workers: int,
+    function: Callable[[Any], Any],
+    items: Iterable[Any],
+) -> list[Any]:
+    """! Apply a function to every item, in a pool or serially.
+
+    @param kind "serial", "thread" or "process".
+    @param workers The number of threads or processes of the pool.
+    @param function The function, which must be picklable for a process pool.
+    @param items The items to apply the function to.
+    @return The results, in the order of the items.
+    """
+    items = list(items)
+    executor = get_executor(kind, workers)
+    if executor is None or len(items) < 2:
+        return [function(item) for item in items]
+
+    return list(executor.map(function, items))
+
+
+def shutdown_executors() -> None:
+    """! Stop every shared pool, waiting for their running tasks."""
+    logging.info("shutdown_executors")
+
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
@@ -0,0 +1,160 @@
+"""! @brief Quality gate of the road sign crops.
+
+Many crops of the sign detector are too small, too blurred or too flat to be
+read, and still go through the whole preprocessing and the OCR before giving
+nothing. This module scores a crop with a few cheap measures and rejects the
+hopeless ones before the expensive work:
+
+- the size of its smaller side,
+- its sharpness, the variance of the Laplacian of its grayscale image,
+- its edge density, the fraction of its pixels on a Canny edge.
+
+Each threshold can be tuned, or disabled by setting it to 0. The gate counts
+the skipped crops and estimates the time saved from the average time taken
+by the analyzed ones.
+"""
+
+import logging
+import threading
+from typing import NamedTuple
+import cv2
+import numpy as np
+import numpy.typing as npt
+from geotrouvetout import config
+
+# Longest side of the grayscale image on which the sharpness and the edge
+# density are measured, so that the cost of the gate stays bounded.
+QUALITY_SIDE = 128
+
+# Hysteresis thresholds of the Canny edge detector.
+CANNY_THRESHOLDS = (50, 150)
+
+
+class SignQuality(NamedTuple):
+    """! Cheap measures of the readability of a road sign crop."""
+
+    # Size of the smaller side of the crop, in pixels.
+    min_side: int
+    # Variance of the Laplacian of the grayscale crop.
+    sharpness: float
+    # Fraction of the pixels of the crop on an edge.
+    edge_density: float
+
+
+_counters = {"checked": 0, "skipped": 0, "analyzed": 0}
+_analyzed_seconds = 0.0
+_counters_lock = threading.Lock()
+
+
+def get_sign_quality(sign_image: npt.NDArray[np.uint8]) -> SignQuality:
+    """! Measure the readability of a road sign crop.
+
+    @param sign_image An RGB numpy image of a road sign.
+    @return The measures of the crop.
+    """
+    height, width = sign_image.shape[:2]
+    min_side = min(height, width)
+    if min_side == 0:
+        return SignQuality(0, 0.0, 0.0)
+
+    gray = sign_image
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(np.ascontiguousarray(gray), cv2.COLOR_RGB2GRAY)
+
+    # measure large crops on a downscaled image
+    scale = QUALITY_SIDE / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(
+            gray,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    edges = cv2.Canny(gray, *CANNY_THRESHOLDS)
+    edge_density = float(np.count_nonzero(edges)) / edges.size
+
+    return SignQuality(min_side, sharpness, edge_density)
+
+
+def is_readable_sign(sign_image: npt.NDArray[np.uint8]) -> bool:
+    """! Check whether a road sign crop is worth reading.
+
+    @param sign_image An RGB numpy image of a road sign.
+    @return False if the crop is below one of the SIGN_MIN_SIZE,
+    SIGN_MIN_SHARPNESS and SIGN_MIN_EDGE_DENSITY thresholds.
+    """
+    # the size is checked first, as it does not need any measure
+    if min(sign_image.shape[:2]) < int(config.SIGN_MIN_SIZE):
+        return False
+    if not config.SIGN_MIN_SHARPNESS and not config.SIGN_MIN_EDGE_DENSITY:
+        return True
+
+    quality = get_sign_quality(sign_image)
+    return quality.sharpness >= float(
+        config.SIGN_MIN_SHARPNESS
+    ) and quality.edge_density >= float(config.SIGN_MIN_EDGE_DENSITY)
+
+
+def filter_readable_signs(
+    sign_images: list[npt.NDArray[np.uint8]],
+) -> list[bool]:
+    """! Apply the quality gate to the road signs of an image.
+
+    @param sign_images RGB numpy images of road signs.
+    @return A list with, for each sign, whether it is worth reading.
+    """
+    readable = [is_readable_sign(sign_image) for sign_image in sign_images]
+
+    skipped = readable.count(False)
+    with _counters_lock:
+        _counters["checked"] += len(readable)
+        _counters["skipped"] += skipped
+        average = _analyzed_seconds / max(_counters["analyzed"], 1)
+
+    if skipped:
+        logging.info(
+            f"{skipped} of {len(readable)} road signs skipped by the quality \
+gate, about {skipped * average * 1000:.0f} ms saved"
+        )
+
+    return readable
+
+
+def add_analyzed_signs(count: int, seconds: float) -> None:
+    """! Record the time taken to analyze road signs that passed the gate.
+
+    @param count The number of signs analyzed.
+    @param seconds The time taken to analyze them.
+    """
+    global _analyzed_seconds
+
+    with _counters_lock:
+        _counters["analyzed"] += count
+        _analyzed_seconds += seconds
+
+
+def get_sign_gate_stats() -> dict[str, float]:
+    """! Get the counters of the quality gate.
+
+    @return A dictionary with the number of signs checked, skipped and
+    analyzed since the start of the process, the average time to analyze a
+    sign and the estimated time saved by the skipped signs, in seconds.
+    """
+    with _counters_lock:
+        average = _analyzed_seconds / max(_counters["analyzed"], 1)
+        return {
+            **_counters,
+            "seconds_per_sign": average,
+            "saved_seconds": _counters["skipped"] * average,
+        }
+
+
+def reset_sign_gate_stats() -> None:
+    """! Reset the counters of the quality gate."""
+    global _analyzed_seconds
+
+    with _counters_lock:
+        for name in _counters:
+            _counters[name] = 0
+        _analyzed_seconds = 0.0
@@ -11,6 +11,40 @@ import geotrouvetout
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def warm_up():
+    """! Set the thread budget of the worker and load the models before the
+    first request is received."""
+    geotrouvetout.apply_thread_layout()
+    geotrouvetout.warm_up_models()
+
+
+@app.get("/resources")
+async def get_resources():
+    """! Endpoint giving the thread layout of the worker.
+    @return A json containing the number of threads of each library
+    """
+    layout = geotrouvetout.get_applied_thread_layout()
+    if layout is None:
+        layout = geotrouvetout.get_thread_layout()
+
+    return layout._asdict()
+
+
+@app.get("/stats")
+async def get_stats():
+    """! Endpoint giving the counters of the caches of the worker.
+    @return A json containing the hits, misses and size of the road sign
+    cache, the road signs skipped by the quality gate, and the debug images
+    written and dropped
+    """
+    return {
+        "sign_cache": geotrouvetout.get_sign_cache_stats(),
+        "sign_gate": geotrouvetout.get_sign_gate_stats(),
+        "debug": geotrouvetout.get_debug_stats(),
+    }
+
+
 @app.post("/locate")
 async def locate_image(request: Request):
     """! Endpoint for the geoguessr REST API.
@@ -0,0 +1,26 @@
+import numpy as np
+from geotrouvetout.car_detection import (
+    get_proba_car_country,
+    load_car_likelihood,
+)
+
+
+def test_car_likelihood_columns_are_distributions():
+    likelihood = load_car_likelihood()
+
+    assert likelihood.matrix.shape == (
+        len(likelihood.classes),
+        len(likelihood.countries),
+    )
+    assert np.allclose(likelihood.matrix.sum(axis=0), 1)
+    assert "volkswagen" in likelihood.classes
+    assert "vw" not in likelihood.classes
+
+
+def test_car_brand_points_to_its_market():
+    proba = get_proba_car_country({"Dacia": 1.0})
+    best = max(proba, key=proba.get)
+
+    assert best in {"ROU", "MAR", "DZA"}
+    assert proba[best] > proba["JPN"]
+    assert get_proba_car_country({"unknown brand": 1.0}) == {}
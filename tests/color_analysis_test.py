@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+from PIL import Image
+from geotrouvetout import color_analysis
+
+
+def test_country_distances_match_loops():
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(
+        rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    )
+
+    zones = color_analysis.create_zone_images(image)
+    image_histograms = {
+        zone_name: color_analysis.create_histograms(zone_image)
+        for zone_name, zone_image in zones.items()
+    }
+    countries_histograms = color_analysis.load_country_histograms(
+        color_analysis.COUNTRY_HISTOGRAMS_FILE
+    )
+
+    result = color_analysis.get_color_analysis(image)
+
+    assert list(result) == list(countries_histograms)
+    for country_code, country_histograms in countries_histograms.items():
+        distance = color_analysis.compare_histograms(
+            image_histograms, country_histograms
+        )
+        assert np.isclose(
+            result[country_code], 1.0 - distance, rtol=0, atol=1e-12
+        )
+
+
+def test_hsv_bins_match_histograms():
+    # a grid of the RGB cube, with many pixels exactly on a bin edge
+    values = np.arange(0, 256, 3, dtype=np.uint8)
+    pixels = np.stack(np.meshgrid(values, values, values), axis=-1).reshape(
+        -1, 3
+    )
+
+    bins = color_analysis.get_hsv_bins(pixels)
+
+    hsv = color_analysis.color.rgb2hsv(pixels[:, np.newaxis])[:, 0]
+    for channel in range(3):
+        histogram, edges = np.histogram(hsv[:, channel], bins=10, range=(0, 1))
+        assert (
+            np.bincount(bins[:, channel], minlength=10).tolist()
+            == histogram.tolist()
+        )
+
+        # each pixel is in the bin whose edges surround its value
+        assert (edges[bins[:, channel]] <= hsv[:, channel]).all()
+        last = bins[:, channel] == 9
+        assert (hsv[~last, channel] < edges[bins[~last, channel] + 1]).all()
+
+
+@pytest.mark.parametrize("size", [(160, 120), (101, 77), (2, 5)])
+def test_zone_histograms_match_zone_images(size):
+    rng = np.random.default_rng(size[0])
+    image = Image.fromarray(
+        rng.integers(0, 256, size[::-1] + (3,), dtype=np.uint8)
+    )
+
+    histograms = color_analysis.create_zone_histograms(image)
+
+    zones = color_analysis.create_zone_images(image)
+    for zone_index, zone in enumerate(color_analysis.ZONES):
+        expected = color_analysis.create_histograms(zones[zone])
+        for channel_index, channel in enumerate(color_analysis.CHANNELS):
+            assert (
+                histograms[zone_index, channel_index].tolist()
+                == expected[channel]
+            )
+
+
+@pytest.mark.parametrize("sampling", ["stride", "random", "downscale"])
+def test_sampling_drift_is_bounded(sampling):
+    rng = np.random.default_rng(1)
+    # smooth colors, as in a photography
+    noise = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    image = Image.fromarray(noise).resize((320, 240), Image.BILINEAR)
+
+    profiles = color_analysis.get_country_profiles()
+    full = color_analysis.create_zone_histograms(image, "full")
+    sampled = color_analysis.create_zone_histograms(image, sampling, 4)
+
+    drift = np.abs(
+        color_analysis.get_country_distances(full, profiles)
+        - color_analysis.get_country_distances(sampled, profiles)
+    ).max()
+    bound = color_analysis.get_distance_drift_bound(full, sampled)
+    assert drift <= bound + 1e-12
+    assert bound < 0.3
+
+    # a step of 1 counts every pixel
+    assert np.array_equal(
+        color_analysis.create_zone_histograms(image, sampling, 1), full
+    )
+
+
+def test_drift_bound_holds_in_the_worst_case():
+    # the country has all of its pixels in the first bin, and the image moves
+    # a few pixels from the second bin to it
+    weights = color_analysis.get_histogram_weights()
+    country = np.zeros((1, 5, 3, 10))
+    country[..., 0] = 1
+    profiles = color_analysis.CountryProfiles(["AAA"], country, weights)
+    full = np.zeros((5, 3, 10))
+    full[..., 1] = 1000
+    moved = full.copy()
+    moved[..., 0] += 50
+    moved[..., 1] -= 50
+
+    drift = np.abs(
+        color_analysis.get_country_distances(full, profiles)
+        - color_analysis.get_country_distances(moved, profiles)
+    ).max()
+    bound = color_analysis.get_distance_drift_bound(full, moved)
+    assert drift > bound / 2
+    assert drift <= bound + 1e-12
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from geotrouvetout import color_cells
+
+
+@pytest.fixture
+def cells(tmp_path):
+    # the north and the south of a country have different hue histograms
+    rng = np.random.default_rng(0)
+    histograms = rng.integers(0, 100, (300, 5, 3, 10))
+    histograms[:100, :, 0, :5] += 400
+    histograms[100:200, :, 0, 5:] += 400
+    latitudes = np.concatenate(
+        [
+            rng.uniform(60, 62, 100),
+            rng.uniform(46, 48, 100),
+            rng.uniform(35, 37, 100),
+        ]
+    )
+    longitudes = np.concatenate(
+        [rng.uniform(40, 42, 200), rng.uniform(138, 140, 100)]
+    )
+    countries = ["RUS"] * 200 + ["JPN"] * 100
+    color_cells.build_color_cells(
+        histograms, latitudes, longitudes, countries, str(tmp_path), 2
+    )
+    return color_cells.load_color_cells(str(tmp_path)), histograms
+
+
+def test_geohashes_round_trip():
+    assert color_cells.encode_geohashes([57.64911], [10.40744], 11) == [
+        "u4pruydqqvj"
+    ]
+    assert color_cells.encode_geohashes(-25.382708, -49.265506, 5) == ["6gkzw"]
+
+    latitude, longitude = color_cells.decode_geohash("u4pruydqqvj")
+    assert abs(latitude - 57.64911) < 1e-5
+    assert abs(longitude - 10.40744) < 1e-5
+
+
+def test_cells_aggregate_located_images(cells):
+    cells, _ = cells
+
+    assert isinstance(cells.vectors, np.memmap)
+    assert cells.counts.sum() == 300
+    assert len(cells.geohashes) == len(set(cells.geohashes))
+    assert all(len(geohash) == 2 for geohash in cells.geohashes)
+    assert sorted(cells.countries) == ["JPN", "RUS"]
+
+
+def test_heat_map_finds_the_region_of_a_large_country(cells):
+    cells, histograms = cells
+    heat_map = color_cells.get_color_heat_map(cells, histograms[150], 5)
+
+    best = int(np.argmax(heat_map.scores))
+    assert cells.countries[cells.labels[best]] == "RUS"
+    assert 40 < cells.latitudes[best] < 55
+
+    assert heat_map.grid.shape == (36, 72)
+    assert np.nanmax(heat_map.grid) == heat_map.scores.max()
+    assert np.isnan(heat_map.grid[0, 0])
+
+    assert set(heat_map.countries) == {"JPN", "RUS"}
+    assert heat_map.countries["RUS"] == heat_map.scores.max()
+    assert all(0 <= score <= 1 for score in heat_map.countries.values())
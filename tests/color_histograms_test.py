@@ -0,0 +1,31 @@
+import numpy as np
+from geotrouvetout import color_histograms
+
+
+def test_vectors_give_weighted_hellinger_distances():
+    rng = np.random.default_rng(0)
+    histograms = rng.integers(0, 100, (2, 5, 3, 10))
+    vectors = color_histograms.get_histogram_vectors(histograms)
+
+    weights = color_histograms.get_histogram_weights()
+    first, second = (
+        color_histograms.normalize_histograms(histogram)
+        for histogram in histograms
+    )
+    hellinger = ((np.sqrt(first) - np.sqrt(second)) ** 2).sum(axis=-1)
+    expected = (weights * hellinger).sum() / weights.sum()
+
+    assert vectors.shape == (2, 150)
+    assert np.isclose(
+        ((vectors[0] - vectors[1]) ** 2).sum(), expected, rtol=1e-5
+    )
+
+
+def test_empty_histograms_stay_empty():
+    histograms = np.zeros((5, 3, 10))
+    histograms[0, 0, 3] = 4
+
+    normalized = color_histograms.normalize_histograms(histograms)
+
+    assert normalized[0, 0, 3] == 1.0
+    assert normalized.sum() == 1.0
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from geotrouvetout import color_histograms, color_index
+
+
+@pytest.fixture
+def dataset():
+    # two countries whose images have different hue histograms
+    rng = np.random.default_rng(0)
+    histograms = rng.integers(0, 100, (200, 5, 3, 10))
+    countries = ["FRA"] * 100 + ["JPN"] * 100
+    histograms[:100, :, 0, :5] += 400
+    histograms[100:, :, 0, 5:] += 400
+    return histograms, countries
+
+
+@pytest.mark.parametrize("components", [0, 8])
+def test_neighbours_vote_for_their_country(
+    dataset, tmp_path, monkeypatch, components
+):
+    histograms, countries = dataset
+    monkeypatch.setattr(color_index, "SEARCH_CHUNK_SIZE", 64)
+    color_index.build_color_index(
+        histograms, countries, str(tmp_path), components
+    )
+    index = color_index.load_color_index(str(tmp_path))
+
+    assert isinstance(index.vectors, np.memmap)
+    assert (index.tree is not None) == (components > 0)
+
+    query = histograms[150].copy()
+    votes = color_index.get_neighbour_countries(index, query, 10)
+    assert max(votes, key=votes.get) == "JPN"
+    assert np.isclose(sum(votes.values()), 1.0)
+
+
+def test_exact_search_matches_brute_force(dataset, tmp_path, monkeypatch):
+    histograms, countries = dataset
+    monkeypatch.setattr(color_index, "SEARCH_CHUNK_SIZE", 64)
+    color_index.build_color_index(histograms, countries, str(tmp_path))
+    index = color_index.load_color_index(str(tmp_path))
+
+    vector = color_histograms.get_histogram_vectors(histograms[3] + 7)
+    distances, indices = color_index.search_color_index(index, vector, 15)
+
+    expected = np.sqrt(((np.asarray(index.vectors) - vector) ** 2).sum(axis=1))
+    assert sorted(indices.tolist()) == sorted(
+        np.argsort(expected)[:15].tolist()
+    )
+    assert np.allclose(distances, np.sort(expected)[:15], atol=1e-5)
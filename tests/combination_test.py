@@ -0,0 +1,37 @@
+from PIL import Image
+import geotrouvetout
+from geotrouvetout import car_detection, combination
+
+
+def test_countries_without_car_weights(tmp_path, monkeypatch):
+    detected_classes = []
+
+    def detect_objects_batch(images, classes):
+        detected_classes.append(classes)
+        return [{object_class: [] for object_class in classes}] * len(images)
+
+    def car_detection_batch(images, car_images_list):
+        raise AssertionError("the cars must not be analyzed")
+
+    monkeypatch.setattr(
+        car_detection, "CAR_BRAND_WEIGHTS", str(tmp_path / "car_brand.pt")
+    )
+    monkeypatch.setattr(
+        geotrouvetout, "detect_objects_batch", detect_objects_batch
+    )
+    monkeypatch.setattr(
+        combination, "car_detection_batch", car_detection_batch
+    )
+    monkeypatch.setattr(
+        combination,
+        "combine_image_evidence",
+        lambda image, objects, area_dict, country_codes, car_countries: (
+            car_countries
+        ),
+    )
+
+    images = [Image.new("RGB", (64, 64)), Image.new("RGB", (64, 64))]
+
+    assert not car_detection.has_car_models()
+    assert combination.get_countries(images) == [{}, {}]
+    assert detected_classes == [["traffic_sign"]]
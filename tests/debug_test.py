@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from geotrouvetout import (
+    config,
+    debug_request,
+    flush_debug_images,
+    language_detection,
+    save_debug_image,
+)
+
+
+@pytest.fixture
+def debug_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(config, "DEBUG_SAMPLE_RATE", 1.0)
+    return tmp_path
+
+
+def test_images_of_sampled_requests(debug_directory, monkeypatch):
+    with debug_request("first") as scope:
+        save_debug_image("edges", np.ones((10, 10), dtype=np.float32))
+        save_debug_image("sign", np.zeros((10, 10, 3), dtype=np.uint8))
+    # outside of a request
+    save_debug_image("ignored", np.zeros((10, 10), dtype=np.uint8))
+
+    monkeypatch.setattr(config, "DEBUG_SAMPLE_RATE", 0.0)
+    with debug_request("second") as skipped:
+        save_debug_image("edges", np.zeros((10, 10), dtype=np.uint8))
+    flush_debug_images()
+
+    assert skipped is None
+    directories = list(debug_directory.iterdir())
+    assert [directory.name for directory in directories] == [
+        scope.directory.split("/")[-1]
+    ]
+    assert sorted(path.name for path in directories[0].iterdir()) == [
+        "edges.png",
+        "sign.png",
+    ]
+
+
+def test_images_of_each_sign(debug_directory, monkeypatch):
+    def analyze_sign(sign_image):
+        language_detection.save_debug_image("final", sign_image)
+        return {}
+
+    monkeypatch.setattr(language_detection, "analyze_sign", analyze_sign)
+    monkeypatch.setattr(config, "SIGN_EXECUTOR", "thread")
+    monkeypatch.setattr(config, "SIGN_WORKERS", 2)
+    signs = [
+        np.full((20, 20, 3), value, dtype=np.uint8) for value in [50, 150]
+    ]
+
+    with debug_request():
+        assert language_detection.analyze_signs(signs) == [{}, {}]
+    flush_debug_images()
+
+    (directory,) = debug_directory.iterdir()
+    assert sorted(path.name for path in directory.iterdir()) == [
+        "sign_00_final.png",
+        "sign_01_final.png",
+    ]
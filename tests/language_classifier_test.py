@@ -0,0 +1,26 @@
+from geotrouvetout.language_classifier import (
+    classify_languages,
+    get_language_model,
+)
+
+
+def test_model_is_limited_to_country_languages():
+    languages = get_language_model().languages
+
+    assert {"en", "fr", "ru", "zh"} <= set(languages)
+    # catalan and welsh are not official languages of any country
+    assert "ca" not in languages and "cy" not in languages
+    assert "zh-cn" not in languages
+
+
+def test_batch_is_deterministic_and_matches_single():
+    texts = ["avenue du general de gaulle", "Mind the gap", "SORTIE", "12"]
+
+    batch = classify_languages(texts)
+
+    assert batch == classify_languages(texts)
+    assert batch == [classify_languages([text])[0] for text in texts]
+    assert max(batch[0], key=batch[0].get) == "fr"
+    assert max(batch[1], key=batch[1].get) == "en"
+    assert "fr" in batch[2]
+    assert batch[3] == {}
@@ -1,5 +1,17 @@
+import cv2
+import numpy as np
 import pytest
-from geotrouvetout import detect_languages
+from geotrouvetout import (
+    config,
+    detect_languages,
+    get_languages,
+    language_detection,
+    extract_text,
+    fill_holes,
+    get_component_images,
+    crop_text_regions,
+    locate_text_lines,
+)
 
 
 def test_detect_languages_english():
@@ -178,3 +190,233 @@ def test_detect_languages_chinese():
     text_and_confidences = {"Shuangjiang": 1.0}
     languages = detect_languages(text_and_confidences)
     assert "cn" or "zh-cn" in languages
+
+
+# pixel loops of the previous sign preprocessing, used as reference
+def extract_text_loops(image, mask):
+    # the sum and the differences wrap around in uint8
+    with np.errstate(over="ignore"):
+        mean = 0
+        total = 0
+        for j in range(image.shape[0]):
+            for i in range(image.shape[1]):
+                if mask[j, i] != 255:
+                    continue
+                mean = mean + image[j, i]
+                total = total + 1
+        mean = int(np.rint(mean / total))
+        binary = np.zeros_like(image, dtype=np.uint8)
+        for j in range(image.shape[0]):
+            for i in range(image.shape[1]):
+                if mask[j, i] == 255:
+                    continue
+                if abs(image[j, i] - mean) > 50:
+                    binary[j, i] = 255
+    binary = 255 - binary
+    return cv2.morphologyEx(binary, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+
+
+def fill_holes_loops(image):
+    filled = np.zeros_like(image, dtype=np.uint8)
+    for row in range(image.shape[0]):
+        first = np.argmax(image[row, :] == 255)
+        last = image.shape[1] - np.argmax(image[row, ::-1] == 255) - 1
+        if (
+            first < last
+            and image[row, first] == 255
+            and image[row, last] == 255
+        ):
+            filled[row, first:last] = 255
+    for col in range(image.shape[1]):
+        first = np.argmax(image[:, col] == 255)
+        last = image.shape[0] - np.argmax(image[::-1, col] == 255) - 1
+        if (
+            first < last
+            and image[first, col] == 255
+            and image[last, col] == 255
+        ):
+            filled[first:last, col] = 255
+    return filled
+
+
+@pytest.fixture
+def sign():
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(
+        (rng.random((60, 90)) * 255).astype(np.uint8), (3, 3), 1
+    )
+    mask = np.zeros((60, 90), dtype=np.uint8)
+    cv2.circle(mask, (45, 30), 25, 255, -1)
+    return image, mask
+
+
+def test_extract_text_matches_loops(sign):
+    image, mask = sign
+    assert np.array_equal(
+        extract_text(image, mask), extract_text_loops(image, mask)
+    )
+
+    with pytest.raises(ValueError):
+        extract_text(image, np.zeros_like(mask))
+
+
+def test_fill_holes_matches_loops(sign):
+    _, mask = sign
+    rng = np.random.default_rng(1)
+    noisy = np.where(rng.random(mask.shape) < 0.02, 255, mask).astype(np.uint8)
+    for image in [mask, noisy, np.zeros_like(mask), 255 - mask]:
+        assert np.array_equal(fill_holes(image), fill_holes_loops(image))
+
+
+def test_component_image_keeps_large_components():
+    edges = np.ones((40, 60), dtype=np.float32)
+    edges[:, 20] = 0.0
+    edges[:, 50] = 0.0
+
+    component_image = get_component_images(edges)
+
+    # the right strip is less than half of the largest component
+    assert component_image.dtype == np.uint8
+    assert (component_image[:, :20] == 255).all()
+    assert (component_image[:, 21:50] == 255).all()
+    assert (component_image[:, 51:] == 0).all()
+    assert (component_image[:, [20, 50]] == 0).all()
+
+    with pytest.raises(ValueError):
+        get_component_images(np.zeros((10, 10), dtype=np.float32))
+
+
+def test_parallel_signs_match_serial(monkeypatch):
+    # signs of a single color, the black ones cannot be processed
+    signs = [
+        np.full((40, 60, 3), value, dtype=np.uint8)
+        for value in [0, 10, 20, 0, 30, 10]
+    ]
+
+    def analyze_sign(sign_image):
+        if sign_image[0, 0, 0] == 0:
+            return {}
+        return {"fr": sign_image[0, 0, 0] / 100, "en": 0.1}
+
+    monkeypatch.setattr(language_detection, "analyze_sign", analyze_sign)
+    monkeypatch.setattr(config, "SIGN_CACHE_SIZE", 0)
+    monkeypatch.setattr(config, "SIGN_MIN_SHARPNESS", 0)
+    monkeypatch.setattr(config, "SIGN_MIN_EDGE_DENSITY", 0)
+    monkeypatch.setattr(config, "SIGN_WORKERS", 3)
+    monkeypatch.setattr(config, "SIGN_EXECUTOR", "serial")
+    serial = get_languages(None, signs)
+
+    monkeypatch.setattr(config, "SIGN_EXECUTOR", "thread")
+    assert get_languages(None, signs) == serial
+    assert serial == {"fr": (0.1 + 0.2 + 0.3 + 0.1) / 4, "en": 0.1}
+
+
+def test_failing_sign_is_isolated(monkeypatch):
+    def process_image(sign_image):
+        raise ValueError("Failed to approximate polygon with 4 vertices.")
+
+    monkeypatch.setattr(language_detection, "process_image", process_image)
+    monkeypatch.setattr(config, "SIGN_CACHE_SIZE", 0)
+    sign = np.zeros((40, 60, 3), dtype=np.uint8)
+
+    assert language_detection.analyze_sign(sign) == {}
+    assert get_languages(None, [sign, sign]) == {}
+
+
+def test_sign_cache_counts_hits(monkeypatch):
+    analyzed = []
+
+    def analyze_sign(sign_image):
+        analyzed.append(sign_image)
+        return {"fr": 0.5}
+
+    monkeypatch.setattr(language_detection, "analyze_sign", analyze_sign)
+    monkeypatch.setattr(config, "SIGN_CACHE_SIZE", 2)
+    language_detection.clear_sign_cache()
+
+    sign = np.full((40, 60, 3), 220, dtype=np.uint8)
+    cv2.putText(
+        sign, "A7", (5, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (20, 20, 20), 2
+    )
+    other = 255 - sign
+
+    try:
+        assert get_languages(None, [sign]) == {"fr": 0.5}
+        # the same sign in the next request
+        assert get_languages(None, [sign.copy(), other]) == {"fr": 0.5}
+        assert len(analyzed) == 2
+        assert language_detection.get_sign_cache_stats() == {
+            "hits": 1,
+            "misses": 2,
+            "size": 2,
+        }
+    finally:
+        language_detection.clear_sign_cache()
+
+
+def write_key_sign(text, color=(0, 60, 160)):
+    sign = np.full((40, 160, 3), color, dtype=np.uint8)
+    cv2.putText(
+        sign, text, (5, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2
+    )
+    return sign
+
+
+def test_sign_keys_separate_similar_signs():
+    moscow = write_key_sign("Moscow")
+    get_sign_key = language_detection.get_sign_key
+
+    assert get_sign_key(moscow) == get_sign_key(moscow.copy())
+    assert get_sign_key(moscow) != get_sign_key(write_key_sign("Madrid"))
+    assert get_sign_key(moscow) != get_sign_key(write_key_sign("Moscou"))
+    # the same text in a crop twice as large is another sign
+    assert get_sign_key(moscow) != get_sign_key(cv2.resize(moscow, (320, 80)))
+
+
+def test_similar_crops_share_a_cache_entry(monkeypatch):
+    analyzed = []
+
+    def analyze_sign(sign_image):
+        analyzed.append(sign_image)
+        return {"ru": 0.5}
+
+    monkeypatch.setattr(language_detection, "analyze_sign", analyze_sign)
+    monkeypatch.setattr(config, "SIGN_CACHE_SIZE", 4)
+    language_detection.clear_sign_cache()
+
+    # the same sign in the next frame, with some noise
+    moscow = write_key_sign("Moscow")
+    rng = np.random.default_rng(0)
+    noise = rng.integers(-3, 4, moscow.shape)
+    next_frame = np.clip(moscow + noise, 0, 255).astype(np.uint8)
+
+    try:
+        assert get_languages(None, [moscow]) == {"ru": 0.5}
+        assert get_languages(None, [next_frame]) == {"ru": 0.5}
+        assert len(analyzed) == 1
+        assert language_detection.get_sign_cache_stats()["hits"] == 1
+    finally:
+        language_detection.clear_sign_cache()
+
+
+def test_text_lines_skip_pictograms_and_borders():
+    image = np.full((200, 300), 255, dtype=np.uint8)
+    cv2.rectangle(image, (3, 3), (296, 196), 0, 3)
+    cv2.circle(image, (50, 60), 30, 0, -1)
+    cv2.putText(
+        image, "Paris 12", (100, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2
+    )
+    cv2.putText(image, "Lyon", (100, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+
+    lines = locate_text_lines(image)
+    assert len(lines) == 2
+    # the lines are right of the pictogram and inside the border
+    assert (lines[:, 0] > 80).all()
+    assert (lines[:, 2] < 290).all()
+
+    text = crop_text_regions(image)
+    assert text.shape[0] < image.shape[0] and text.shape[1] < image.shape[1]
+    assert (text < 128).any()
+
+    with pytest.raises(ValueError):
+        crop_text_regions(np.full((50, 50), 255, dtype=np.uint8))
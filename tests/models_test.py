@@ -0,0 +1,126 @@
+import pytest
+from geotrouvetout import get_model, evict_model, reload_model, loaded_models
+
+
+def test_get_model_is_shared():
+    model = get_model("yolov8n.yaml")
+    assert get_model("yolov8n.yaml") is model
+    assert "yolov8n.yaml" in loaded_models()
+
+
+def test_evict_and_reload_model():
+    model = get_model("yolov8n.yaml")
+    evict_model("yolov8n.yaml")
+    assert "yolov8n.yaml" not in loaded_models()
+    assert get_model("yolov8n.yaml") is not model
+
+    model = get_model("yolov8n.yaml")
+    reloaded = reload_model("yolov8n.yaml")
+    assert reloaded is not model
+    assert get_model("yolov8n.yaml") is reloaded
+    evict_model()
+    assert loaded_models() == []
+
+
+def run_exported_model(onnx_weights, input_array):
+    onnxruntime = pytest.importorskip("onnxruntime")
+    session = onnxruntime.InferenceSession(
+        onnx_weights, providers=["CPUExecutionProvider"]
+    )
+    input_name = session.get_inputs()[0].name
+    return session.run(None, {input_name: input_array})[0]
+
+
+def test_onnx_boxes_match_torch(tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    import pathlib
+    import shutil
+    import numpy as np
+    import torch
+    from PIL import Image
+    from ultralytics import YOLO
+    from geotrouvetout.models import export_onnx, _letterbox
+
+    # use the real sign detector when available, a random model otherwise
+    weights = tmp_path / "detector.pt"
+    if pathlib.Path("weights/traffic_sign.pt").is_file():
+        shutil.copy("weights/traffic_sign.pt", weights)
+    else:
+        YOLO("yolov8n.yaml").save(str(weights))
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray((rng.random((480, 640, 3)) * 255).astype(np.uint8))
+    input_array = _letterbox(image)
+
+    model = YOLO(str(weights)).model.float().eval()
+    with torch.no_grad():
+        torch_output = model(torch.from_numpy(input_array))
+    if isinstance(torch_output, (list, tuple)):
+        torch_output = torch_output[0]
+    torch_boxes = torch_output.numpy()[:, :4]
+
+    # float model: boxes must match up to float rounding
+    onnx_boxes = run_exported_model(export_onnx(str(weights)), input_array)
+    assert np.abs(onnx_boxes[:, :4] - torch_boxes).max() < 0.1
+
+    # int8 model: boxes must stay within a pixel on average
+    quantized_boxes = run_exported_model(
+        export_onnx(str(weights), "dynamic"), input_array
+    )
+    assert np.abs(quantized_boxes[:, :4] - torch_boxes).mean() < 1.0
+
+
+def create_random_detector(path):
+    # a random yolov8n whose features vanish and whose class scores are all
+    # below the confidence threshold: rescale them so that a few dozen boxes
+    # depend on the image
+    import torch
+    from ultralytics import YOLO
+
+    torch.manual_seed(0)
+    model = YOLO("yolov8n.yaml")
+    for module in model.model.modules():
+        if isinstance(module, torch.nn.Conv2d):
+            torch.nn.init.kaiming_normal_(module.weight)
+    for head in model.model.model[-1].cv3:
+        head[-1].weight.data *= 100
+        head[-1].bias.data.fill_(-6.0)
+    model.save(str(path))
+
+
+def test_onnx_backend_detects_the_torch_boxes(tmp_path, monkeypatch):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    import numpy as np
+    from PIL import Image
+    from geotrouvetout import config
+    from geotrouvetout.models import export_onnx
+    from geotrouvetout.object_detection import detect_crops, predict_batch
+
+    weights = str(tmp_path / "detector.pt")
+    create_random_detector(weights)
+    export_onnx(weights)
+
+    rng = np.random.default_rng(0)
+    frame = (rng.random((480, 640, 3)) * 255).astype(np.uint8)
+    image = Image.fromarray(frame)
+
+    def detect(backend):
+        monkeypatch.setattr(config, "DETECTION_BACKEND", backend)
+        evict_model(weights)
+        boxes = predict_batch(weights, [frame])[0].boxes.xyxy.cpu().numpy()
+        return get_model(weights), boxes, detect_crops(weights, image)
+
+    torch_model, torch_boxes, torch_crops = detect("torch")
+    onnx_model, onnx_boxes, onnx_crops = detect("onnx")
+    evict_model(weights)
+
+    assert not str(torch_model.model).endswith(".onnx")
+    assert str(onnx_model.model).endswith(".onnx")
+    assert len(torch_boxes) > 0
+    assert onnx_boxes.shape == torch_boxes.shape
+    assert np.abs(onnx_boxes - torch_boxes).max() < 0.5
+    assert [crop.shape for crop in onnx_crops] == [
+        crop.shape for crop in torch_crops
+    ]
@@ -0,0 +1,102 @@
+import pytest
+import numpy as np
+from PIL import Image
+from geotrouvetout import config, object_detection
+
+
+@pytest.fixture
+def random_images():
+    rng = np.random.default_rng(0)
+    sizes = [(480, 640), (360, 640), (480, 640), (480, 640)]
+    return [
+        Image.fromarray((rng.random(size + (3,)) * 255).astype(np.uint8))
+        for size in sizes
+    ]
+
+
+def test_batch_detection_matches_single(monkeypatch, random_images):
+    # a random model with no threshold returns many boxes for every image
+    monkeypatch.setattr(object_detection, "DETECTION_CONFIDENCE", 0.0)
+    monkeypatch.setattr(config, "BATCH_SIZE", 2)
+
+    batch_crops = object_detection.detect_crops_batch(
+        "yolov8n.yaml", random_images
+    )
+    assert len(batch_crops) == len(random_images)
+
+    for image, crops in zip(random_images, batch_crops):
+        single_crops = object_detection.detect_crops("yolov8n.yaml", image)
+        assert len(crops) == len(single_crops) > 0
+        assert [crop.shape for crop in crops] == [
+            crop.shape for crop in single_crops
+        ]
+
+
+def test_crop_boxes_are_clipped_views():
+    frame = np.arange(20 * 30 * 3, dtype=np.uint8).reshape(20, 30, 3)
+    boxes = np.array(
+        [
+            [2.7, 3.2, 10.9, 8.5],
+            [-5.0, -1.0, 4.0, 50.0],
+            [12.0, 5.0, 12.0, 9.0],
+        ]
+    )
+
+    crops = object_detection.crop_boxes(frame, boxes)
+
+    assert np.shares_memory(crops[0], frame)
+    assert np.array_equal(crops[0], frame[3:8, 2:10])
+    assert np.array_equal(crops[1], frame[0:20, 0:4])
+    assert crops[2] is None
+    assert object_detection.crop_boxes(frame, np.zeros((0, 4))) == []
+
+
+def test_tiles_fit_in_budget():
+    for budget in [2, 3, 5, 9]:
+        tiles = object_detection.get_tiles(1920, 1080, budget)
+        assert len(tiles) <= budget - 1
+        for x1, y1, x2, y2 in tiles:
+            assert 0 <= x1 < x2 <= 1920 and 0 <= y1 < y2 <= 1080
+        # every tile has the same size so that they run in a single batch
+        assert len({(x2 - x1, y2 - y1) for x1, y1, x2, y2 in tiles}) <= 1
+
+    # the tiles cover the whole image
+    tiles = object_detection.get_tiles(1920, 1080, 9)
+    assert min(x1 for x1, _, _, _ in tiles) == 0
+    assert max(x2 for _, _, x2, _ in tiles) == 1920
+    assert max(y2 for _, _, _, y2 in tiles) == 1080
+
+    # images smaller than a tile are not tiled
+    assert object_detection.get_tiles(640, 480, 9) == []
+
+
+def test_non_max_suppression():
+    boxes = np.array(
+        [[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32
+    )
+    scores = np.array([0.5, 0.9, 0.3], dtype=np.float32)
+    keep = object_detection.non_max_suppression(boxes, scores, 0.5)
+    assert keep.tolist() == [1, 2]
+
+
+def test_merge_overlapping_boxes():
+    boxes = np.array(
+        [
+            [0, 0, 10, 10],
+            [50, 50, 60, 60],
+            [2, 2, 12, 12],
+            [9, 9, 13, 13],
+            [55, 0, 65, 8],
+        ],
+        dtype=np.float32,
+    )
+
+    merged = object_detection.merge_overlapping_boxes(boxes, 0.5)
+
+    # the third box links the first and the fourth
+    assert merged.tolist() == [
+        [0, 0, 13, 13],
+        [50, 50, 60, 60],
+        [55, 0, 65, 8],
+    ]
+    assert object_detection.merge_overlapping_boxes(boxes, 0) is boxes
@@ -0,0 +1,57 @@
+import numpy as np
+from geotrouvetout import config, object_stage
+from geotrouvetout.object_stage import Likelihood, ObjectStage
+
+
+def make_stage(tmp_path):
+    weights = tmp_path / "classifier.pt"
+    weights.touch()
+    return ObjectStage(
+        name=f"test_{tmp_path.name}",
+        object_class="car",
+        classifier_weights=str(weights),
+        load_likelihood=lambda: Likelihood(
+            ["a", "b"],
+            ["FRA", "DEU"],
+            np.array([[1.0, 0.0], [0.5, 0.5]]),
+        ),
+    )
+
+
+def test_run_stage_averages_objects(monkeypatch, tmp_path):
+    calls = []
+
+    def classify_crops(weights, crops):
+        calls.append(len(crops))
+        return [
+            {"A": 1.0} if crop[0, 0, 0] == 0 else {"B": 1.0} for crop in crops
+        ]
+
+    monkeypatch.setattr(object_stage, "classify_crops", classify_crops)
+    monkeypatch.setattr(config, "STAGE_CACHE_SIZE", 8)
+    timings = []
+    hook = lambda *args: timings.append(args)
+    object_stage.add_timing_hook(hook)
+
+    stage = make_stage(tmp_path)
+    black = np.zeros((4, 4, 3), dtype=np.uint8)
+    white = np.full((4, 4, 3), 255, dtype=np.uint8)
+    try:
+        results = object_stage.run_stage(
+            stage, [None, None, None], [[black, white], [], [black]]
+        )
+        cached = object_stage.run_stage(stage, [None], [[white, black]])
+    finally:
+        object_stage.remove_timing_hook(hook)
+        object_stage.clear_stage_cache(stage.name)
+
+    assert results[0] == {"FRA": 0.75, "DEU": 0.25}
+    assert results[1] == {}
+    assert results[2] == {"FRA": 1.0}
+    assert cached[0] == results[0]
+    # the second run only reads the cache
+    assert calls == [3, 0]
+    assert [step for _, step, _, _ in timings[:2]] == [
+        "classify",
+        "likelihood",
+    ]
@@ -0,0 +1,74 @@
+import importlib
+import pytest
+from geotrouvetout import (
+    config,
+    language_detection,
+    ocr_languages,
+    select_ocr_languages,
+)
+from geotrouvetout.ocr import Word
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    monkeypatch.setattr(config, "OCR_SCRIPT_SELECTION", True)
+    monkeypatch.setattr(config, "OCR_TOP_COUNTRIES", 3)
+    monkeypatch.setattr(config, "OCR_SCRIPT_CONFIDENCE", 0.5)
+    monkeypatch.setattr(config, "OCR_MAX_LANGUAGES", 2)
+    monkeypatch.setattr(
+        ocr_languages,
+        "get_installed_languages",
+        lambda: ["eng", "deu", "fra", "rus"],
+    )
+
+
+def test_languages_of_likely_countries(installed):
+    # germany and austria speak german, france french
+    countries = {"DEU": 0.4, "AUT": 0.2, "FRA": 0.3, "USA": 0.1}
+    assert select_ocr_languages(countries) == "deu+fra"
+
+    # ukrainian is read with the cyrillic traineddata
+    assert select_ocr_languages({"UKR": 0.8, "USA": 0.2}) == "rus+eng"
+
+
+def test_broad_languages_when_unsure(installed, monkeypatch):
+    countries = {f"C{index:02}": 1.0 for index in range(20)}
+    countries["DEU"] = 1.0
+    assert select_ocr_languages(countries) is None
+
+    # no traineddata of the script installed
+    assert select_ocr_languages({"JPN": 1.0}) is None
+
+    monkeypatch.setattr(config, "OCR_SCRIPT_SELECTION", False)
+    assert select_ocr_languages({"DEU": 1.0}) is None
+
+
+def test_selection_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("GEOTROUVETOUT_OCR_SCRIPT_SELECTION", raising=False)
+    try:
+        importlib.reload(config)
+        assert not config.OCR_SCRIPT_SELECTION
+        assert select_ocr_languages({"DEU": 1.0}) is None
+    finally:
+        importlib.reload(config)
+
+
+def test_low_confidence_is_read_again(monkeypatch):
+    calls = []
+
+    def recognize_words(image, lang=None):
+        calls.append(lang)
+        if lang == "rus":
+            return [Word("Xq", 20.0, (0, 0, 1, 1))]
+        return [Word("Paris", 90.0, (0, 0, 1, 1))]
+
+    monkeypatch.setattr(config, "OCR_LANGUAGES", "eng")
+    monkeypatch.setattr(config, "OCR_MIN_CONFIDENCE", 60)
+    monkeypatch.setattr(language_detection, "recognize_words", recognize_words)
+
+    assert language_detection.detect_text(None, "rus") == {"Paris": 90.0}
+    assert calls == ["rus", None]
+
+    calls.clear()
+    assert language_detection.detect_text(None, "deu") == {"Paris": 90.0}
+    assert calls == ["deu"]
@@ -0,0 +1,111 @@
+import threading
+import cv2
+import numpy as np
+import pytest
+from geotrouvetout import config, detect_text, ocr
+
+
+@pytest.fixture
+def sign(monkeypatch):
+    pytest.importorskip("tesserocr")
+    monkeypatch.setattr(config, "OCR_BACKEND", "tesserocr")
+    try:
+        ocr.get_ocr_engine(config.OCR_LANGUAGES)
+    except RuntimeError:
+        pytest.skip("no Tesseract language data")
+
+    yield write_sign("Mind the gap")
+    ocr.close_ocr_engines()
+
+
+def write_sign(text):
+    image = np.full((80, 30 * len(text)), 255, dtype=np.uint8)
+    cv2.putText(image, text, (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    return image
+
+
+def test_engine_is_reused_by_its_thread(sign):
+    assert ocr.get_ocr_engine(config.OCR_LANGUAGES) is ocr.get_ocr_engine(
+        config.OCR_LANGUAGES
+    )
+
+    engines = []
+    thread = threading.Thread(
+        target=lambda: engines.append(ocr.get_ocr_engine(config.OCR_LANGUAGES))
+    )
+    thread.start()
+    thread.join()
+    assert engines[0] is not ocr.get_ocr_engine(config.OCR_LANGUAGES)
+
+
+def test_detect_text_in_memory(sign):
+    text_and_confidences = detect_text(sign)
+
+    assert list(text_and_confidences) == ["Mind", "the", "gap"]
+    assert all(0 < conf <= 100 for conf in text_and_confidences.values())
+
+    words = ocr.recognize_words(sign)
+    assert words[0].box[0] < words[1].box[0] < words[2].box[0]
+
+
+def test_montage_offsets():
+    images = [
+        np.zeros((10, 30), dtype=np.uint8),
+        np.zeros((0, 0), dtype=np.uint8),
+        np.zeros((5, 50), dtype=np.uint8),
+    ]
+
+    montage, offsets = ocr.create_montage(images)
+
+    padding = ocr.MONTAGE_PADDING
+    assert montage.shape == (15 + 3 * padding, 50 + 2 * padding)
+    assert offsets == [
+        (padding, padding),
+        (padding, 10 + 2 * padding),
+        (padding, 10 + 2 * padding),
+    ]
+    assert (montage[padding : padding + 10, padding : padding + 30] == 0).all()
+    assert (montage[:padding] == 255).all()
+
+
+def test_montage_words_go_back_to_their_sign(sign):
+    signs = [sign, write_sign("Quai de Garonne"), write_sign("Centre")]
+
+    montage_words = ocr.recognize_montage(signs)
+
+    assert [[word.text for word in words] for words in montage_words] == [
+        ["Mind", "the", "gap"],
+        ["Quai", "de", "Garonne"],
+        ["Centre"],
+    ]
+    # the boxes are in the coordinates of their sign
+    assert [word.box for word in montage_words[0]] == [
+        word.box for word in ocr.recognize_words(sign)
+    ]
+
+
+def test_blank_image_has_no_word(sign):
+    assert ocr.recognize_words(np.full((80, 200), 255, dtype=np.uint8)) == []
+
+
+def test_failed_engine_falls_back_to_pytesseract(monkeypatch, caplog):
+    def fail_to_start(lang):
+        raise RuntimeError("Failed to init API, possibly an invalid tessdata")
+
+    words = [ocr.Word("gap", 90.0, (0, 0, 10, 10))]
+    monkeypatch.setattr(config, "OCR_BACKEND", "auto")
+    monkeypatch.setattr(ocr, "has_tesserocr", lambda: True)
+    monkeypatch.setattr(ocr, "get_ocr_engine", fail_to_start)
+    monkeypatch.setattr(
+        ocr, "recognize_words_pytesseract", lambda image, lang: words
+    )
+    monkeypatch.setattr(ocr, "_failed_languages", set())
+
+    image = write_sign("gap")
+    assert ocr.recognize_words(image, "eng") == words
+    assert ocr.recognize_words(image, "eng") == words
+    assert caplog.text.count("Cannot start the Tesseract API for eng") == 1
+
+    monkeypatch.setattr(config, "OCR_BACKEND", "tesserocr")
+    with pytest.raises(RuntimeError):
+        ocr.recognize_words(image, "fra")
@@ -0,0 +1,82 @@
+import cv2
+import torch
+from geotrouvetout import config, resources
+
+
+def test_thread_layout_splits_cores_between_workers():
+    layout = resources.get_thread_layout(workers=4, cores=16)
+
+    assert layout.torch_threads == layout.opencv_threads == 4
+    assert layout.tesseract_threads == 1
+    assert layout.workers * layout.torch_threads <= layout.cores
+
+    layout = resources.get_thread_layout(workers=8, cores=2)
+    assert layout.torch_threads == layout.opencv_threads == 1
+
+
+def test_thread_layout_overrides(monkeypatch):
+    monkeypatch.setattr(config, "TORCH_THREADS", 3)
+    monkeypatch.setattr(config, "TESSERACT_THREADS", 2)
+
+    layout = resources.get_thread_layout(workers=1, cores=8)
+
+    assert layout.torch_threads == 3
+    assert layout.opencv_threads == 8
+    assert layout.tesseract_threads == 2
+
+
+def test_thread_layout_splits_threads_between_sign_threads(monkeypatch):
+    monkeypatch.setattr(config, "SIGN_EXECUTOR", "thread")
+    monkeypatch.setattr(config, "SIGN_WORKERS", 4)
+
+    layout = resources.get_thread_layout(workers=2, cores=16)
+
+    assert layout.torch_threads == 8
+    assert layout.opencv_threads == 2
+    assert layout.tesseract_threads == 1
+    assert layout.sign_workers * layout.opencv_threads <= 8
+
+
+def test_apply_thread_layout(monkeypatch):
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "")
+    torch_threads = torch.get_num_threads()
+    opencv_threads = cv2.getNumThreads()
+    layout = resources.get_thread_layout(workers=1, cores=1)
+
+    try:
+        assert resources.apply_thread_layout(layout) == layout
+        assert resources.get_applied_thread_layout() == layout
+        assert torch.get_num_threads() == 1
+        assert cv2.getNumThreads() == 1
+    finally:
+        torch.set_num_threads(torch_threads)
+        cv2.setNumThreads(opencv_threads)
+
+
+def test_map_executor_keeps_order():
+    items = [-3, 1, -2, 5]
+
+    for kind in ["serial", "thread", "process"]:
+        assert resources.map_executor(kind, 2, abs, items) == [3, 1, 2, 5]
+
+    resources.shutdown_executors()
+
+
+def get_worker_threads(_):
+    return resources.get_applied_thread_layout(), cv2.getNumThreads()
+
+
+def test_process_pool_applies_split_layout(monkeypatch):
+    layout = resources.get_thread_layout(workers=1, cores=4)
+    monkeypatch.setattr(resources, "_applied_layout", layout)
+    expected = resources.get_pool_thread_layout(layout, 2)
+    assert expected.opencv_threads == 2
+
+    try:
+        for applied, opencv_threads in resources.map_executor(
+            "process", 2, get_worker_threads, [0, 1]
+        ):
+            assert applied == expected
+            assert opencv_threads == expected.opencv_threads
+    finally:
+        resources.shutdown_executors()
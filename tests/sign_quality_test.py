@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+from geotrouvetout import (
+    config,
+    filter_readable_signs,
+    get_sign_gate_stats,
+    get_sign_quality,
+    is_readable_sign,
+    reset_sign_gate_stats,
+)
+
+
+@pytest.fixture
+def sign():
+    image = np.full((60, 120, 3), 220, dtype=np.uint8)
+    cv2.putText(
+        image, "Gare", (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (20, 20, 20), 2
+    )
+    return image
+
+
+def test_sign_quality(sign):
+    quality = get_sign_quality(sign)
+    blurred = get_sign_quality(cv2.GaussianBlur(sign, (0, 0), 4))
+
+    assert quality.min_side == 60
+    assert quality.sharpness > blurred.sharpness
+    assert quality.edge_density > blurred.edge_density
+    assert (
+        get_sign_quality(np.zeros((0, 10, 3), dtype=np.uint8)).sharpness == 0
+    )
+
+
+def test_hopeless_signs_are_rejected(sign, monkeypatch):
+    monkeypatch.setattr(config, "SIGN_MIN_SIZE", 12)
+    monkeypatch.setattr(config, "SIGN_MIN_SHARPNESS", 20)
+    monkeypatch.setattr(config, "SIGN_MIN_EDGE_DENSITY", 0.01)
+
+    assert is_readable_sign(sign)
+    assert not is_readable_sign(cv2.resize(sign, (20, 10)))
+    assert not is_readable_sign(np.full((60, 120, 3), 128, dtype=np.uint8))
+    assert not is_readable_sign(cv2.GaussianBlur(sign, (0, 0), 4))
+
+    # every check disabled
+    monkeypatch.setattr(config, "SIGN_MIN_SIZE", 0)
+    monkeypatch.setattr(config, "SIGN_MIN_SHARPNESS", 0)
+    monkeypatch.setattr(config, "SIGN_MIN_EDGE_DENSITY", 0)
+    assert is_readable_sign(np.full((5, 5, 3), 128, dtype=np.uint8))
+
+
+def test_skipped_signs_are_counted(sign):
+    reset_sign_gate_stats()
+    try:
+        flat = np.full((60, 120, 3), 128, dtype=np.uint8)
+        assert filter_readable_signs([sign, flat, flat]) == [
+            True,
+            False,
+            False,
+        ]
+
+        stats = get_sign_gate_stats()
+        assert stats["checked"] == 3
+        assert stats["skipped"] == 2
+    finally:
+        reset_sign_gate_stats()
@@ -0,0 +1,71 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from geotrouvetout import color_cells
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", default="300000", help="The number of images")
+    parser.add_argument(
+        "-p",
+        nargs="*",
+        default=["2", "3", "4"],
+        help="The precisions of the geohashes of the cells",
+    )
+    parser.add_argument("-q", default="50", help="The number of queries")
+    return parser.parse_args()
+
+
+def create_dataset(rng, count):
+    # the colors of the images change with the latitude and the longitude,
+    # so that the cells of a large country differ from each other
+    latitudes = rng.uniform(-60, 70, count)
+    longitudes = rng.uniform(-180, 180, count)
+    regions = ((latitudes + 90) // 30 * 12 + (longitudes + 180) // 30).astype(
+        int
+    )
+    profiles = rng.dirichlet(np.ones(10), size=(regions.max() + 1, 5, 3))
+    histograms = np.empty((count, 5, 3, 10), dtype=np.int64)
+    for start in range(0, count, 10000):
+        profile = profiles[regions[start : start + 10000]]
+        histograms[start : start + 10000] = rng.poisson(2000 * profile)
+    countries = [f"C{region:03}" for region in regions]
+    return histograms, latitudes, longitudes, countries
+
+
+args = get_args()
+rng = np.random.default_rng(0)
+histograms, latitudes, longitudes, countries = create_dataset(rng, int(args.n))
+queries = histograms[rng.integers(0, len(histograms), int(args.q))]
+
+for precision in (int(p) for p in args.p):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        color_cells.build_color_cells(
+            histograms, latitudes, longitudes, countries, directory, precision
+        )
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        cells = color_cells.load_color_cells(directory)
+        load = time.perf_counter() - start
+
+        # the first query reads the memory-mapped vectors
+        color_cells.get_color_heat_map(cells, queries[0])
+        start = time.perf_counter()
+        for query in queries:
+            color_cells.score_color_cells(cells, query)
+        score = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        for query in queries:
+            color_cells.get_color_heat_map(cells, query)
+        heat_map = (time.perf_counter() - start) / len(queries)
+
+        print(
+            f"precision {precision}: {len(cells.geohashes):6} cells, build "
+            f"{build:6.2f} s, load {load:6.3f} s, score {score * 1000:6.2f} "
+            f"ms/query, heat map {heat_map * 1000:6.2f} ms/query"
+        )
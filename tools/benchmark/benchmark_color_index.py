@@ -0,0 +1,97 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from geotrouvetout import color_index
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        nargs="*",
+        default=["10000", "100000", "300000"],
+        help="The numbers of images of the index",
+    )
+    parser.add_argument(
+        "-p",
+        default="16",
+        help="The number of principal components of the approximate index",
+    )
+    parser.add_argument("-k", default="25", help="The number of neighbours")
+    parser.add_argument("-q", default="50", help="The number of queries")
+    return parser.parse_args()
+
+
+def create_profiles(rng, countries):
+    # each country has its own color profile, around which its images vary
+    return rng.dirichlet(np.ones(10), size=(countries, 5, 3))
+
+
+def create_histograms(rng, count, profiles):
+    labels = rng.integers(0, len(profiles), count)
+    histograms = np.empty((count, 5, 3, 10), dtype=np.int64)
+    for start in range(0, count, 10000):
+        profile = profiles[labels[start : start + 10000]]
+        histograms[start : start + 10000] = rng.poisson(2000 * profile)
+    return histograms, [f"C{label:03}" for label in labels]
+
+
+def evaluate(index, queries, query_countries, k):
+    found = 0
+    start = time.perf_counter()
+    for query, country in zip(queries, query_countries):
+        votes = color_index.get_neighbour_countries(index, query, k)
+        found += max(votes, key=votes.get) == country
+    return (time.perf_counter() - start) / len(queries), found / len(queries)
+
+
+args = get_args()
+k = int(args.k)
+
+for count in (int(n) for n in args.n):
+    rng = np.random.default_rng(0)
+    profiles = create_profiles(rng, 100)
+    histograms, countries = create_histograms(rng, count, profiles)
+    queries, query_countries = create_histograms(rng, int(args.q), profiles)
+
+    with (
+        tempfile.TemporaryDirectory() as exact_directory,
+        tempfile.TemporaryDirectory() as approximate_directory,
+    ):
+        start = time.perf_counter()
+        color_index.build_color_index(histograms, countries, exact_directory)
+        exact_build = time.perf_counter() - start
+        start = time.perf_counter()
+        color_index.build_color_index(
+            histograms, countries, approximate_directory, int(args.p)
+        )
+        approximate_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exact = color_index.load_color_index(exact_directory)
+        exact_load = time.perf_counter() - start
+        start = time.perf_counter()
+        approximate = color_index.load_color_index(approximate_directory)
+        approximate_load = time.perf_counter() - start
+
+        exact_latency, exact_accuracy = evaluate(
+            exact, queries, query_countries, k
+        )
+        approximate_latency, approximate_accuracy = evaluate(
+            approximate, queries, query_countries, k
+        )
+
+        print(f"{count:7} images")
+        print(
+            f"  exact        build {exact_build:6.2f} s, load "
+            f"{exact_load:6.3f} s, {exact_latency * 1000:7.2f} ms/query, "
+            f"accuracy {exact_accuracy:.3f}"
+        )
+        print(
+            f"  approximate  build {approximate_build:6.2f} s, load "
+            f"{approximate_load:6.3f} s, {approximate_latency * 1000:7.2f} "
+            f"ms/query, accuracy {approximate_accuracy:.3f}"
+        )
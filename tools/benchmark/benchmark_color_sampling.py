@@ -0,0 +1,103 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import os
+import time
+import numpy as np
+from PIL import Image
+from geotrouvetout import color_analysis
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", help="The directory of the images")
+    parser.add_argument(
+        "-s",
+        nargs="*",
+        default=["stride", "random", "downscale"],
+        help="The samplings to compare",
+    )
+    parser.add_argument(
+        "-t",
+        nargs="*",
+        default=["2", "4", "8"],
+        help="The sampling steps to compare",
+    )
+    return parser.parse_args()
+
+
+def get_directory(string_path):
+    if not string_path:
+        exit(1)
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    return string_path
+
+
+def load_images(directory):
+    images = []
+    for file in sorted(os.listdir(directory)):
+        if file.endswith((".png", ".jpg", ".jpeg")):
+            images.append(
+                Image.open(os.path.join(directory, file)).convert("RGB")
+            )
+    return images
+
+
+def evaluate(images, profiles, full_results, sampling, step):
+    elapsed, drifts, bounds = 0.0, [], []
+    for image, (full_histograms, full_distances) in zip(images, full_results):
+        start = time.perf_counter()
+        histograms = color_analysis.create_zone_histograms(
+            image, sampling, step
+        )
+        distances = color_analysis.get_country_distances(histograms, profiles)
+        elapsed += time.perf_counter() - start
+        drifts.append(np.abs(distances - full_distances).max())
+        bounds.append(
+            color_analysis.get_distance_drift_bound(
+                full_histograms, histograms
+            )
+        )
+    return (
+        elapsed / len(images),
+        np.mean(drifts),
+        np.max(drifts),
+        np.max(bounds),
+    )
+
+
+args = get_args()
+directory = get_directory(args.d)
+
+images = load_images(directory)
+if not images:
+    print("Error, no image found in '" + directory + "'")
+    exit(1)
+
+profiles = color_analysis.get_country_profiles()
+full_results = []
+start = time.perf_counter()
+for image in images:
+    histograms = color_analysis.create_zone_histograms(image, "full")
+    full_results.append(
+        (
+            histograms,
+            color_analysis.get_country_distances(histograms, profiles),
+        )
+    )
+latency = (time.perf_counter() - start) / len(images)
+
+print(f"{len(images)} images")
+print(f"full                {latency * 1000:7.1f} ms/image")
+for sampling in args.s:
+    for step in args.t:
+        latency, mean_drift, max_drift, max_bound = evaluate(
+            images, profiles, full_results, sampling, int(step)
+        )
+        print(
+            f"{sampling:9} step {int(step):2} {latency * 1000:7.1f} "
+            f"ms/image, drift mean {mean_drift:.5f} max {max_drift:.5f}, "
+            f"bound {max_bound:.5f}"
+        )
@@ -0,0 +1,122 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from PIL import Image
+import geotrouvetout
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", default="20", help="The number of boxes per image"
+    )
+    parser.add_argument("-W", default="1920", help="The width of the image")
+    parser.add_argument("-H", default="1080", help="The height of the image")
+    parser.add_argument("-r", default="50", help="The number of repetitions")
+    return parser.parse_args()
+
+
+def random_boxes(number_boxes, width, height, rng):
+    x1 = rng.uniform(0, width * 0.9, number_boxes)
+    y1 = rng.uniform(0, height * 0.9, number_boxes)
+    x2 = np.minimum(x1 + rng.uniform(20, 300, number_boxes), width)
+    y2 = np.minimum(y1 + rng.uniform(20, 300, number_boxes), height)
+    return np.stack([x1, y1, x2, y2], axis=1).astype(np.float32)
+
+
+# previous path: the detector decodes the image to BGR, then one PIL crop and
+# one numpy copy per box
+def crop_pil(image, boxes):
+    detector_input = np.ascontiguousarray(np.asarray(image)[..., ::-1])
+    crops = []
+    for xyxy in boxes:
+        x1, y1, x2, y2 = xyxy
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        crops.append(np.array(image.crop((x1, y1, x2, y2))))
+    return crops
+
+
+# current path: decode the frame once, the detector is given a BGR view, which
+# ultralytics and cv2 still copy, and the crops are views of the frame
+def crop_views(image, boxes):
+    frame = geotrouvetout.image_to_array(image)
+    detector_input = frame[..., ::-1]
+    return [
+        crop
+        for crop in geotrouvetout.crop_boxes(frame, boxes)
+        if crop is not None
+    ]
+
+
+# buffers of at least this size are counted as pixel buffers
+PIXEL_BUFFER_BYTES = 1024
+
+
+def measure_allocations(crop, image, boxes):
+    # the first call fills the caches of numpy and pil
+    crop(image, boxes)
+
+    # pil allocates its images outside of tracemalloc, but counts them in its
+    # own statistics, numpy buffers are traced
+    pil_before = Image.core.get_stats()["new_count"]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    crops = crop(image, boxes)
+    after, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    pil_images = Image.core.get_stats()["new_count"] - pil_before
+
+    numpy_buffers = sum(
+        1 for trace in snapshot.traces if trace.size >= PIXEL_BUFFER_BYTES
+    )
+    del crops
+    return pil_images, numpy_buffers, after - before, peak - before
+
+
+def measure(crop, image, boxes, repetitions):
+    pil_images, numpy_buffers, retained, peak = measure_allocations(
+        crop, image, boxes
+    )
+
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        crop(image, boxes)
+    elapsed = (time.perf_counter() - start) / repetitions
+
+    return {
+        "time": elapsed,
+        "pil_images": pil_images,
+        "numpy_buffers": numpy_buffers,
+        "retained": retained,
+        "peak": peak,
+    }
+
+
+args = get_args()
+number_boxes, width, height, repetitions = (
+    int(args.n),
+    int(args.W),
+    int(args.H),
+    int(args.r),
+)
+
+rng = np.random.default_rng(0)
+image = Image.fromarray(
+    (rng.random((height, width, 3)) * 255).astype(np.uint8)
+)
+boxes = random_boxes(number_boxes, width, height, rng)
+
+print(f"{width}x{height} image, {number_boxes} boxes")
+for name, crop in [("pil crop + np.array", crop_pil), ("views", crop_views)]:
+    result = measure(crop, image, boxes, repetitions)
+    print(
+        f"{name:20} {result['time'] * 1000:7.3f} ms/image, "
+        f"{result['pil_images']:3} pil images, "
+        f"{result['numpy_buffers']:3} numpy buffers retained, "
+        f"{result['retained'] / 1024:9.1f} KiB retained, "
+        f"{result['peak'] / 1024:9.1f} KiB peak"
+    )
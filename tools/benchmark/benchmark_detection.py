@@ -0,0 +1,110 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import os
+import time
+from PIL import Image
+import torch
+import geotrouvetout
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", help="The directory of images to detect on")
+    parser.add_argument("-r", default="5", help="The number of repetitions")
+    parser.add_argument(
+        "-t",
+        default="0",
+        help="The number of torch threads, 0 for the default",
+    )
+    return parser.parse_args()
+
+
+def get_directory(string_path):
+    if not string_path:
+        exit(1)
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    return string_path
+
+
+def load_images(directory):
+    files = sorted(
+        file
+        for file in os.listdir(directory)
+        if file.endswith((".png", ".jpg", ".jpeg"))
+    )
+    return [
+        Image.open(os.path.join(directory, file)).convert("RGB")
+        for file in files
+    ]
+
+
+def detect_separate(image):
+    return {
+        object_class: geotrouvetout.detect_crops(weights, image)
+        for object_class, weights in geotrouvetout.DETECTOR_WEIGHTS.items()
+    }
+
+
+def detect_combined(image):
+    return geotrouvetout.detect_objects_combined(
+        image, list(geotrouvetout.DETECTOR_WEIGHTS)
+    )
+
+
+def benchmark(detect, images, repetitions):
+    # first pass to load the models and set up the predictors
+    for image in images[:1]:
+        detect(image)
+    start = time.perf_counter()
+    counts = {}
+    for _ in range(repetitions):
+        for image in images:
+            for object_class, crops in detect(image).items():
+                counts[object_class] = counts.get(object_class, 0) + len(crops)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repetitions * len(images)), counts
+
+
+args = get_args()
+directory = get_directory(args.d)
+repetitions = int(args.r)
+if int(args.t) > 0:
+    torch.set_num_threads(int(args.t))
+
+images = load_images(directory)
+if not images:
+    print("Error, no image found in '" + directory + "'")
+    exit(1)
+
+print(
+    f"{len(images)} images, {repetitions} repetitions, "
+    f"{torch.get_num_threads()} torch threads (cpu)"
+)
+
+separate_time, separate_counts = benchmark(
+    detect_separate, images, repetitions
+)
+print(
+    f"separate models: {separate_time * 1000:.1f} ms/image, detections "
+    f"{separate_counts}"
+)
+
+if not geotrouvetout.has_combined_model():
+    print(
+        "Combined weights '"
+        + geotrouvetout.COMBINED_WEIGHTS
+        + "' not found, skipping"
+    )
+    exit(0)
+
+combined_time, combined_counts = benchmark(
+    detect_combined, images, repetitions
+)
+print(
+    f"combined model:  {combined_time * 1000:.1f} ms/image, detections "
+    f"{combined_counts}"
+)
+print(f"speedup: {separate_time / combined_time:.2f}x")
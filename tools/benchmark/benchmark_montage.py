@@ -0,0 +1,111 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import time
+import cv2
+import numpy as np
+import geotrouvetout
+
+WORDS = [
+    "avenue",
+    "gare",
+    "centre",
+    "ville",
+    "parking",
+    "sortie",
+    "station",
+    "street",
+    "road",
+    "north",
+    "bridge",
+    "market",
+    "strasse",
+    "bahnhof",
+    "museum",
+    "hospital",
+    "airport",
+    "plaza",
+    "calle",
+    "norte",
+]
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        nargs="*",
+        default=["5", "15", "30"],
+        help="The numbers of signs per image",
+    )
+    parser.add_argument("-r", default="3", help="The number of repetitions")
+    return parser.parse_args()
+
+
+# a processed sign: black words on a white background, of random size
+def random_sign(rng):
+    words = [
+        WORDS[index]
+        for index in rng.choice(
+            len(WORDS), int(rng.integers(1, 4)), replace=False
+        )
+    ]
+    scale = rng.uniform(0.6, 1.2)
+    (width, height), _ = cv2.getTextSize(
+        " ".join(words), cv2.FONT_HERSHEY_SIMPLEX, scale, 2
+    )
+    sign = np.full((height * 2 + 10, width + 20), 255, dtype=np.uint8)
+    cv2.putText(
+        sign,
+        " ".join(words),
+        (10, height + 10),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        scale,
+        0,
+        2,
+    )
+    return sign, words
+
+
+def per_sign(signs):
+    return [geotrouvetout.detect_text(sign) for sign in signs]
+
+
+def montage(signs):
+    return [
+        geotrouvetout.get_text_and_confidences(words)
+        for words in geotrouvetout.recognize_montage(signs)
+    ]
+
+
+# fraction of the words of each sign found in the text read for that sign
+def accuracy(texts, truths):
+    found = sum(
+        len(set(words) & {text.lower() for text in text_and_confidences})
+        for text_and_confidences, words in zip(texts, truths)
+    )
+    return found / sum(len(words) for words in truths)
+
+
+def measure(read, signs, truths, repetitions):
+    read(signs)
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        texts = read(signs)
+    return accuracy(texts, truths), (time.perf_counter() - start) / repetitions
+
+
+args = get_args()
+repetitions = int(args.r)
+rng = np.random.default_rng(0)
+
+for number_signs in args.n:
+    signs, truths = zip(*(random_sign(rng) for _ in range(int(number_signs))))
+    for name, read in [("per sign", per_sign), ("montage", montage)]:
+        word_accuracy, latency = measure(
+            read, list(signs), list(truths), repetitions
+        )
+        print(
+            f"{int(number_signs):3} signs, {name:9} accuracy "
+            f"{word_accuracy:.3f}, {latency * 1000:8.1f} ms/image"
+        )
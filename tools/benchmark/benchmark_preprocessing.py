@@ -0,0 +1,152 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import time
+import cv2
+import numpy as np
+import geotrouvetout
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        nargs="*",
+        default=["64x48", "128x96", "256x192", "400x300"],
+        help="The sizes of the warped signs, as WIDTHxHEIGHT",
+    )
+    parser.add_argument("-r", default="5", help="The number of repetitions")
+    return parser.parse_args()
+
+
+# previous path: pixel loops for the mean and the threshold of extract_text,
+# whose sums and differences wrap around in uint8
+def extract_text_loops(image, mask):
+    mean = 0
+    total = 0
+    for j in range(image.shape[0]):
+        for i in range(image.shape[1]):
+            if mask[j, i] != 255:
+                continue
+            mean = mean + image[j, i]
+            total = total + 1
+    mean = int(np.rint(mean / total))
+    binary = np.zeros_like(image, dtype=np.uint8)
+    for j in range(image.shape[0]):
+        for i in range(image.shape[1]):
+            if mask[j, i] == 255:
+                continue
+            if abs(image[j, i] - mean) > 50:
+                binary[j, i] = 255
+    binary = 255 - binary
+    kernel = np.ones((3, 3), np.uint8)
+    return cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+
+
+# previous path: one mask per component, then a discarded fill_holes
+def component_images_loops(image):
+    inverted_image = (image * 255).astype(np.uint8)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(inverted_image)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    largest_area = areas.max()
+    component_image = np.zeros_like(inverted_image, dtype=np.uint8)
+    for label, area in enumerate(areas, start=1):
+        if area >= largest_area * 0.5:
+            component_image[labels == label] = 255
+    kernel = np.ones((5, 5), np.uint8)
+    filled = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
+    fill_holes_loops(filled)
+    return component_image
+
+
+def fill_holes_loops(image):
+    filled = np.zeros_like(image, dtype=np.uint8)
+    for row in range(image.shape[0]):
+        first_white = np.argmax(image[row, :] == 255)
+        last_white = image.shape[1] - np.argmax(image[row, ::-1] == 255) - 1
+        if (
+            first_white < last_white
+            and image[row, first_white] == 255
+            and image[row, last_white] == 255
+        ):
+            filled[row, first_white:last_white] = 255
+    for col in range(image.shape[1]):
+        first_white = np.argmax(image[:, col] == 255)
+        last_white = image.shape[0] - np.argmax(image[::-1, col] == 255) - 1
+        if (
+            first_white < last_white
+            and image[first_white, col] == 255
+            and image[last_white, col] == 255
+        ):
+            filled[first_white:last_white, col] = 255
+    return filled
+
+
+def random_sign(width, height, rng):
+    image = np.full((height, width), 230, dtype=np.uint8)
+    for _ in range(6):
+        x, y = int(rng.integers(0, width - 8)), int(
+            rng.integers(0, height - 8)
+        )
+        cv2.putText(
+            image,
+            "AB",
+            (x, y + 8),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            height / 100,
+            20,
+            2,
+        )
+    image = cv2.GaussianBlur(image, (3, 3), 1)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(
+        mask,
+        (width // 20, height // 20),
+        (width - width // 20, height - height // 20),
+        255,
+        -1,
+    )
+    mask[image < 128] = 0
+    edges = geotrouvetout.get_edges(image.astype(np.float32) / 255.0)
+    return image, mask, edges
+
+
+def measure(function, arguments, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        result = function(*arguments)
+    return result, (time.perf_counter() - start) / repetitions
+
+
+args = get_args()
+repetitions = int(args.r)
+rng = np.random.default_rng(0)
+
+for size in args.s:
+    width, height = (int(value) for value in size.split("x"))
+    image, mask, edges = random_sign(width, height, rng)
+
+    old_text, old_text_time = measure(
+        extract_text_loops, (image, mask), repetitions
+    )
+    new_text, new_text_time = measure(
+        geotrouvetout.extract_text, (image, mask), repetitions
+    )
+    old_component, old_component_time = measure(
+        component_images_loops, (edges,), repetitions
+    )
+    new_component, new_component_time = measure(
+        geotrouvetout.get_component_images, (edges,), repetitions
+    )
+
+    identical = np.array_equal(old_text, new_text) and np.array_equal(
+        old_component, new_component
+    )
+    old_time = old_text_time + old_component_time
+    new_time = new_text_time + new_component_time
+    print(
+        f"{size:>8} sign: loops {old_time * 1000:8.2f} ms, "
+        f"arrays {new_time * 1000:6.2f} ms, "
+        f"speedup x{old_time / new_time:6.1f}, "
+        f"identical {identical}"
+    )
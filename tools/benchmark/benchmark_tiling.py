@@ -0,0 +1,153 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import os
+import time
+import numpy as np
+from PIL import Image
+import geotrouvetout
+from geotrouvetout import config
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        help="The dataset directory, with images and labels subdirectories "
+        "in YOLO format",
+    )
+    parser.add_argument(
+        "-w",
+        default=geotrouvetout.DETECTOR_WEIGHTS["traffic_sign"],
+        help="The weights of the detector",
+    )
+    parser.add_argument(
+        "-b",
+        nargs="*",
+        default=["3", "5", "9"],
+        help="The tile budgets to compare",
+    )
+    parser.add_argument(
+        "-i",
+        default="0.5",
+        help="The intersection over union for a box to be found",
+    )
+    return parser.parse_args()
+
+
+def get_directory(string_path):
+    if not string_path:
+        exit(1)
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    return string_path
+
+
+def read_labels(label_file, width, height):
+    boxes = []
+    if os.path.exists(label_file):
+        with open(label_file, "r") as file:
+            for line in file:
+                values = line.split()
+                if len(values) < 5:
+                    continue
+                cx, cy, w, h = (float(value) for value in values[1:5])
+                boxes.append(
+                    [
+                        (cx - w / 2) * width,
+                        (cy - h / 2) * height,
+                        (cx + w / 2) * width,
+                        (cy + h / 2) * height,
+                    ]
+                )
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def load_dataset(directory):
+    image_directory = os.path.join(directory, "images")
+    label_directory = os.path.join(directory, "labels")
+    dataset = []
+    for file in sorted(os.listdir(image_directory)):
+        if not file.endswith((".png", ".jpg", ".jpeg")):
+            continue
+        frame = geotrouvetout.image_to_array(
+            Image.open(os.path.join(image_directory, file))
+        )
+        label_file = os.path.join(
+            label_directory, os.path.splitext(file)[0] + ".txt"
+        )
+        dataset.append(
+            (frame, read_labels(label_file, frame.shape[1], frame.shape[0]))
+        )
+    return dataset
+
+
+def iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / (area + areas - intersection + 1e-9)
+
+
+def count_found(labels, boxes, iou_threshold):
+    if len(boxes) == 0:
+        return 0
+    return sum(
+        1 for label in labels if iou(label, boxes).max() >= iou_threshold
+    )
+
+
+def evaluate(detect, dataset, iou_threshold):
+    # first pass to load the model and set up the predictor
+    detect(dataset[0][0])
+    found, total, elapsed = 0, 0, 0.0
+    for frame, labels in dataset:
+        start = time.perf_counter()
+        boxes = detect(frame)
+        elapsed += time.perf_counter() - start
+        found += count_found(labels, boxes, iou_threshold)
+        total += len(labels)
+    return found / max(total, 1), elapsed / len(dataset), total
+
+
+def detect_full(weights):
+    return (
+        lambda frame: geotrouvetout.predict_batch(weights, [frame])[0]
+        .boxes.xyxy.cpu()
+        .numpy()
+    )
+
+
+def detect_tiled(weights):
+    return lambda frame: geotrouvetout.detect_tiled_batch(weights, [frame])[0][
+        0
+    ]
+
+
+args = get_args()
+directory = get_directory(args.d)
+iou_threshold = float(args.i)
+
+dataset = load_dataset(directory)
+if not dataset:
+    print("Error, no image found in '" + directory + "/images'")
+    exit(1)
+
+recall, latency, total = evaluate(detect_full(args.w), dataset, iou_threshold)
+print(f"{len(dataset)} images, {total} labelled boxes")
+print(
+    f"tiling off           recall {recall:.3f}, {latency * 1000:7.1f} ms/image"
+)
+
+for budget in args.b:
+    config.TILE_BUDGET = int(budget)
+    recall, latency, _ = evaluate(detect_tiled(args.w), dataset, iou_threshold)
+    print(
+        f"tiling budget {int(budget):2}     recall {recall:.3f}, "
+        f"{latency * 1000:7.1f} ms/image"
+    )
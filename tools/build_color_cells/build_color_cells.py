@@ -0,0 +1,142 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from geopy.geocoders import Nominatim
+from geopy.exc import GeocoderTimedOut
+import pycountry
+from tqdm import tqdm
+from geotrouvetout import color_cells, color_histograms
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-j", help="The histogram json, produced by stat_colors"
+    )
+    parser.add_argument(
+        "-c",
+        help="The coordinate file, with the latitude and longitude of each "
+        "image",
+    )
+    parser.add_argument(
+        "-l",
+        help="A csv file with the name of each image and its ISO alpha-3 "
+        "country code, the center of each cell is geolocated when "
+        "there is no label file",
+    )
+    parser.add_argument(
+        "-p",
+        default="3",
+        help="The number of characters of the geohashes of the cells",
+    )
+    parser.add_argument(
+        "-o", default="stats/color_cells", help="The directory of the cells"
+    )
+    return parser.parse_args()
+
+
+def get_file(string_path):
+    if not string_path:
+        exit(1)
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    return string_path
+
+
+def read_labels(label_file):
+    with open(label_file, "r") as csvfile:
+        return {row[0]: row[1] for row in csv.reader(csvfile) if len(row) >= 2}
+
+
+def geolocation_to_country_code(latitude, longitude, geolocator):
+    try:
+        location = geolocator.reverse((latitude, longitude), timeout=10)
+        country_code = location.raw["address"]["country_code"].upper()
+        return pycountry.countries.get(alpha_2=country_code).alpha_3
+    except GeocoderTimedOut:
+        print(
+            f"GeocoderTimedOut: Retrying for coordinates ({latitude}, "
+            f"{longitude})"
+        )
+        return geolocation_to_country_code(latitude, longitude, geolocator)
+    except Exception as e:
+        print(f"Error: {e} for coordinates ({latitude}, {longitude})")
+        return None
+
+
+def geolocate_cells(geohashes):
+    # a single request per cell instead of one per image
+    geolocator = Nominatim(user_agent="gsv_histogram_analysis")
+    return {
+        geohash: geolocation_to_country_code(
+            *color_cells.decode_geohash(geohash), geolocator
+        )
+        for geohash in tqdm(sorted(set(geohashes)))
+    }
+
+
+args = get_args()
+precision = int(args.p)
+with open(get_file(args.j), "r") as infile:
+    image_histograms = json.load(infile)
+with open(get_file(args.c), "r") as csvfile:
+    geolocations = [
+        (float(row[0]), float(row[1])) for row in csv.reader(csvfile)
+    ]
+
+image_filenames = list(image_histograms)
+coordinates = np.array(
+    [
+        geolocations[int(image_filename.split(".")[0])]
+        for image_filename in image_filenames
+    ]
+)
+
+if args.l:
+    labels = read_labels(get_file(args.l))
+else:
+    geohashes = color_cells.encode_geohashes(
+        coordinates[:, 0], coordinates[:, 1], precision
+    )
+    cell_countries = geolocate_cells(geohashes)
+    labels = {
+        image_filename: cell_countries[geohash]
+        for image_filename, geohash in zip(image_filenames, geohashes)
+    }
+
+histograms = []
+countries = []
+located = []
+for image_filename, coordinate in zip(image_filenames, coordinates):
+    country = labels.get(image_filename)
+    if country is None:
+        continue
+    histograms.append(
+        color_histograms.histograms_to_array(image_histograms[image_filename])
+    )
+    countries.append(country)
+    located.append(coordinate)
+
+if not histograms:
+    print("Error, no labelled image found")
+    exit(1)
+
+located = np.array(located)
+color_cells.build_color_cells(
+    np.stack(histograms),
+    located[:, 0],
+    located[:, 1],
+    countries,
+    args.o,
+    precision,
+)
+cells = color_cells.load_color_cells(args.o)
+print(
+    f"{len(countries)} images of {len(set(countries))} countries in "
+    f"{len(cells.geohashes)} cells written to '{args.o}'"
+)
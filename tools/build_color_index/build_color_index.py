@@ -0,0 +1,115 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from geopy.geocoders import Nominatim
+from geopy.exc import GeocoderTimedOut
+import pycountry
+from tqdm import tqdm
+from geotrouvetout import color_histograms, color_index
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-j", help="The histogram json, produced by stat_colors"
+    )
+    parser.add_argument(
+        "-l",
+        help="A csv file with the name of each image and its ISO alpha-3 "
+        "country code",
+    )
+    parser.add_argument(
+        "-c",
+        help="The coordinate file, used to find the country of each image "
+        "when there is no label file",
+    )
+    parser.add_argument(
+        "-p",
+        default="0",
+        help="The number of principal components of an approximate index, 0 "
+        "for an exact index",
+    )
+    parser.add_argument(
+        "-o", default="stats/color_index", help="The directory of the index"
+    )
+    return parser.parse_args()
+
+
+def get_file(string_path):
+    if not string_path:
+        exit(1)
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    return string_path
+
+
+def read_labels(label_file):
+    with open(label_file, "r") as csvfile:
+        return {row[0]: row[1] for row in csv.reader(csvfile) if len(row) >= 2}
+
+
+def geolocation_to_country_code(latitude, longitude, geolocator):
+    try:
+        location = geolocator.reverse((latitude, longitude), timeout=10)
+        country_code = location.raw["address"]["country_code"].upper()
+        return pycountry.countries.get(alpha_2=country_code).alpha_3
+    except GeocoderTimedOut:
+        print(
+            f"GeocoderTimedOut: Retrying for coordinates ({latitude}, "
+            f"{longitude})"
+        )
+        return geolocation_to_country_code(latitude, longitude, geolocator)
+    except Exception as e:
+        print(f"Error: {e} for coordinates ({latitude}, {longitude})")
+        return None
+
+
+def geolocate_labels(coordinate_file, image_filenames):
+    with open(coordinate_file, "r") as csvfile:
+        geolocations = [
+            (float(row[0]), float(row[1])) for row in csv.reader(csvfile)
+        ]
+    geolocator = Nominatim(user_agent="gsv_histogram_analysis")
+    labels = {}
+    for image_filename in tqdm(image_filenames):
+        latitude, longitude = geolocations[int(image_filename.split(".")[0])]
+        labels[image_filename] = geolocation_to_country_code(
+            latitude, longitude, geolocator
+        )
+    return labels
+
+
+args = get_args()
+with open(get_file(args.j), "r") as infile:
+    image_histograms = json.load(infile)
+
+if args.l:
+    labels = read_labels(get_file(args.l))
+else:
+    labels = geolocate_labels(get_file(args.c), list(image_histograms))
+
+histograms = []
+countries = []
+for image_filename, zone_histograms in image_histograms.items():
+    country = labels.get(image_filename)
+    if country is None:
+        continue
+    histograms.append(color_histograms.histograms_to_array(zone_histograms))
+    countries.append(country)
+
+if not histograms:
+    print("Error, no labelled image found")
+    exit(1)
+
+color_index.build_color_index(
+    np.stack(histograms), countries, args.o, int(args.p)
+)
+print(
+    f"{len(countries)} images of {len(set(countries))} countries written to "
+    f"'{args.o}'"
+)
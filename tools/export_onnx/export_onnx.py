@@ -0,0 +1,60 @@
+# David Bret, Paul Chambaz, Feriel Cheggour, Marion Mazaud
+
+import argparse
+import os
+from PIL import Image
+import geotrouvetout
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-w",
+        nargs="*",
+        help="The weights to convert, all the models by default",
+    )
+    parser.add_argument(
+        "-q",
+        default="",
+        choices=["", "dynamic", "static"],
+        help="The int8 quantization to apply",
+    )
+    parser.add_argument(
+        "-c",
+        help="The directory of calibration images for the static quantization",
+    )
+    return parser.parse_args()
+
+
+def get_calibration_images(string_path, number_images=100):
+    if not string_path:
+        return None
+    if not os.path.exists(string_path):
+        print("Error, path '" + string_path + "' does not exists")
+        exit(1)
+    files = sorted(
+        file
+        for file in os.listdir(string_path)
+        if file.endswith((".png", ".jpg", ".jpeg"))
+    )
+    return [
+        Image.open(os.path.join(string_path, file))
+        for file in files[:number_images]
+    ]
+
+
+args = get_args()
+weights_list = args.w or geotrouvetout.MODEL_WEIGHTS + [
+    geotrouvetout.COMBINED_WEIGHTS
+]
+calibration_images = get_calibration_images(args.c)
+
+if args.q == "static" and not calibration_images:
+    print("Error, static quantization needs calibration images (-c)")
+    exit(1)
+
+for weights in weights_list:
+    if not os.path.exists(weights):
+        print("Skipping '" + weights + "', file does not exists")
+        continue
+    print(geotrouvetout.export_onnx(weights, args.q, calibration_images))